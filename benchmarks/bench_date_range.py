@@ -0,0 +1,157 @@
+"""
+日期區間查詢效能測試
+比較舊寫法 date(created_at) >= ? 搭配單欄索引，
+與半開區間 created_at >= date(?) AND created_at < date(?, '+1 day') 搭配 (user_id, created_at) 複合索引
+
+執行：python -m benchmarks.bench_date_range [--rows 1000000] [--users 1000]
+使用本機 SQLite（與 Turso 相同的查詢規劃器），不需要連線到正式資料庫
+"""
+import argparse
+import random
+import sqlite3
+import statistics
+import time
+from datetime import datetime, timedelta
+
+CATEGORIES = ["餐飲", "交通", "娛樂", "購物", "生活", "醫療", "薪水", "其他"]
+
+SCHEMA = """
+    CREATE TABLE transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        type TEXT NOT NULL,
+        amount REAL NOT NULL,
+        category TEXT NOT NULL,
+        description TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+OLD_INDEXES = [
+    "CREATE INDEX idx_transactions_user_id ON transactions(user_id)",
+    "CREATE INDEX idx_transactions_created_at ON transactions(created_at)",
+]
+
+NEW_INDEXES = [
+    "CREATE INDEX idx_transactions_user_created ON transactions(user_id, created_at, type, amount, category)",
+    "CREATE INDEX idx_transactions_created_at ON transactions(created_at)",
+]
+
+OLD_RANGE = "date(created_at) >= ? AND date(created_at) <= ?"
+NEW_RANGE = "created_at >= date(?) AND created_at < date(?, '+1 day')"
+
+QUERIES = {
+    "summary": """
+        SELECT
+            COALESCE(SUM(CASE WHEN type = 'income' THEN amount ELSE 0 END), 0) as total_income,
+            COALESCE(SUM(CASE WHEN type = 'expense' THEN amount ELSE 0 END), 0) as total_expense,
+            COUNT(*) as transaction_count
+        FROM transactions
+        WHERE user_id = ? AND {range}
+    """,
+    "by_category": """
+        SELECT category, type, SUM(amount) as total, COUNT(*) as count
+        FROM transactions
+        WHERE user_id = ? AND {range}
+        GROUP BY category, type
+        ORDER BY total DESC
+    """,
+    "by_date": """
+        SELECT strftime('%Y-%m-%d', created_at) as date,
+               SUM(CASE WHEN type = 'income' THEN amount ELSE 0 END) as income,
+               SUM(CASE WHEN type = 'expense' THEN amount ELSE 0 END) as expense
+        FROM transactions
+        WHERE user_id = ? AND {range}
+        GROUP BY strftime('%Y-%m-%d', created_at)
+        ORDER BY date ASC
+    """,
+    "page": """
+        SELECT * FROM transactions
+        WHERE user_id = ? AND {range}
+        ORDER BY created_at DESC
+        LIMIT 20 OFFSET 0
+    """,
+}
+
+
+def generate_rows(rows: int, users: int, seed: int = 42):
+    """產生合成交易資料（約三年內平均分布）"""
+    rng = random.Random(seed)
+    start = datetime(2022, 1, 1)
+    span = 3 * 365 * 24 * 3600
+    for _ in range(rows):
+        created_at = start + timedelta(seconds=rng.randrange(span))
+        yield (
+            f"U{rng.randrange(users):032x}",
+            "income" if rng.random() < 0.1 else "expense",
+            round(rng.uniform(10, 5000), 0),
+            rng.choice(CATEGORIES),
+            "合成資料",
+            created_at.strftime("%Y-%m-%d %H:%M:%S"),
+        )
+
+
+def build_db(rows: int, users: int, indexes: list) -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:")
+    conn.execute(SCHEMA)
+    conn.executemany(
+        "INSERT INTO transactions (user_id, type, amount, category, description, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        generate_rows(rows, users)
+    )
+    for sql in indexes:
+        conn.execute(sql)
+    conn.execute("ANALYZE")
+    conn.commit()
+    return conn
+
+
+def time_query(conn, sql, params, repeat: int) -> list:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    user_id = f"U{7:032x}"
+    params = (user_id, "2024-03-01", "2024-03-31")
+
+    variants = [
+        ("舊：date(created_at) + 單欄索引", OLD_INDEXES, OLD_RANGE),
+        ("新：半開區間 + 複合索引", NEW_INDEXES, NEW_RANGE),
+    ]
+
+    results = {}
+    for label, indexes, range_sql in variants:
+        print(f"\n=== {label} ===")
+        start = time.perf_counter()
+        conn = build_db(args.rows, args.users, indexes)
+        print(f"建立 {args.rows:,} 筆資料：{time.perf_counter() - start:.1f}s")
+
+        for name, template in QUERIES.items():
+            sql = template.format(range=range_sql)
+            plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+            timings = time_query(conn, sql, params, args.repeat)
+            results.setdefault(name, []).append(statistics.median(timings))
+
+            print(f"\n[{name}] median {statistics.median(timings):.2f} ms, p95 {sorted(timings)[int(len(timings) * 0.95) - 1]:.2f} ms")
+            for row in plan:
+                print(f"  {row[-1]}")
+
+        conn.close()
+
+    print("\n=== 結果 ===")
+    for name, (old, new) in results.items():
+        print(f"{name:<12} 舊 {old:8.2f} ms  新 {new:8.2f} ms  加速 {old / new if new else float('inf'):6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
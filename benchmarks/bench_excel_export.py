@@ -0,0 +1,149 @@
+"""
+Excel 匯出效能測試
+比較舊流程（一般 Workbook，每個儲存格建立新的 Border/Fill/Alignment，存到 BytesIO）
+與 write-only 串流流程（具名樣式 + 分批寫入 + SpooledTemporaryFile）的峰值 RSS 與耗時
+
+每種流程在獨立的子行程中執行，峰值 RSS 才不會互相影響
+執行：python -m benchmarks.bench_excel_export [--rows 100000 1000000] [--chunk-size 1000]
+舊流程在 100 萬列時需要數 GB 記憶體，可用 --skip-legacy-above 略過
+"""
+import argparse
+import io
+import json
+import random
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+CATEGORIES = ["餐飲", "交通", "娛樂", "購物", "生活", "醫療", "薪水", "其他"]
+
+
+def generate_chunks(rows: int, chunk_size: int):
+    """模擬 iter_transactions_for_export 分批產出的交易"""
+    rng = random.Random(20)
+    start = datetime(2020, 1, 1)
+    for offset in range(0, rows, chunk_size):
+        yield [
+            {
+                "id": i,
+                "type": "income" if rng.random() < 0.1 else "expense",
+                "amount": rng.randrange(20, 5000),
+                "category": rng.choice(CATEGORIES),
+                "description": f"{rng.choice(CATEGORIES)} 第 {i} 筆" if rng.random() < 0.8 else None,
+                "created_at": (start + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            for i in range(offset, min(offset + chunk_size, rows))
+        ]
+
+
+def legacy_excel(transactions: list) -> bytes:
+    """原本的 export_excel 寫法"""
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "記帳明細"
+
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="4A90D9", end_color="4A90D9", fill_type="solid")
+    header_alignment = Alignment(horizontal="center", vertical="center")
+    thin_border = Border(
+        left=Side(style="thin"),
+        right=Side(style="thin"),
+        top=Side(style="thin"),
+        bottom=Side(style="thin")
+    )
+
+    headers = ["日期", "類型", "分類", "金額", "描述"]
+    for col, header in enumerate(headers, 1):
+        cell = ws.cell(row=1, column=col, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        cell.border = thin_border
+
+    income_fill = PatternFill(start_color="E8F5E9", end_color="E8F5E9", fill_type="solid")
+    expense_fill = PatternFill(start_color="FFEBEE", end_color="FFEBEE", fill_type="solid")
+
+    for row, t in enumerate(transactions, 2):
+        type_text = "收入" if t["type"] == "income" else "支出"
+        fill = income_fill if t["type"] == "income" else expense_fill
+        data = [t["created_at"], type_text, t["category"], t["amount"], t["description"] or ""]
+        for col, value in enumerate(data, 1):
+            cell = ws.cell(row=row, column=col, value=value)
+            cell.border = thin_border
+            cell.fill = fill
+            if col == 4:
+                cell.alignment = Alignment(horizontal="right")
+
+    for column, width in (("A", 20), ("B", 10), ("C", 15), ("D", 12), ("E", 30)):
+        ws.column_dimensions[column].width = width
+
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+
+def run_variant(variant: str, rows: int, chunk_size: int) -> dict:
+    """在子行程中執行一種流程，回傳耗時、峰值 RSS 與檔案大小"""
+    start = time.perf_counter()
+    if variant == "legacy":
+        transactions = [t for chunk in generate_chunks(rows, chunk_size) for t in chunk]
+        size = len(legacy_excel(transactions))
+    else:
+        from services.export_writers import spooled_excel
+        output = spooled_excel(generate_chunks(rows, chunk_size), 8 * 1024 * 1024)
+        size = output.seek(0, io.SEEK_END)
+        output.close()
+    elapsed = time.perf_counter() - start
+
+    # Linux 的 ru_maxrss 單位是 KB
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"seconds": elapsed, "peak_mb": peak_kb / 1024, "size_mb": size / 1024 / 1024}
+
+
+def spawn(variant: str, rows: int, chunk_size: int) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_excel_export", "--child", variant,
+         "--rows", str(rows), "--chunk-size", str(chunk_size)],
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--skip-legacy-above", type=int, default=None, help="列數超過時不執行舊流程")
+    parser.add_argument("--child", choices=["legacy", "streaming"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_variant(args.child, args.rows[0], args.chunk_size)))
+        return
+
+    for rows in args.rows:
+        print(f"\n=== {rows:,} 列 ===")
+        results = {}
+        for variant, label in (("legacy", "舊：Workbook + BytesIO"), ("streaming", "新：write-only 串流")):
+            if variant == "legacy" and args.skip_legacy_above and rows > args.skip_legacy_above:
+                print(f"{label:<24} 略過")
+                continue
+            result = spawn(variant, rows, args.chunk_size)
+            results[variant] = result
+            print(
+                f"{label:<24} 耗時 {result['seconds']:8.2f} s  峰值 RSS {result['peak_mb']:8.1f} MB  "
+                f"檔案 {result['size_mb']:6.1f} MB"
+            )
+
+        if len(results) == 2:
+            old, new = results["legacy"], results["streaming"]
+            print(f"耗時 {old['seconds'] / new['seconds']:.2f}x，峰值 RSS 降為 {new['peak_mb'] / old['peak_mb']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
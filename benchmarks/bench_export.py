@@ -0,0 +1,194 @@
+"""
+匯出效能測試
+比較舊流程（一次取出全部交易 -> StringIO 組出整個檔案）
+與串流流程（(created_at, id) keyset 分批讀取 -> 每批寫出一段 CSV，可選 gzip）
+的記憶體峰值（tracemalloc）、第一段輸出時間與總時間；
+安裝 pyarrow 時另外比較 Parquet / Arrow IPC 的檔案大小與耗時
+
+執行：python -m benchmarks.bench_export [--rows 200000] [--chunk-size 1000] [--columnar-chunk-size 10000]
+使用本機 SQLite，查詢與 database._iter_export_pages 相同
+"""
+import argparse
+import csv
+import io
+import random
+import sqlite3
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from services.export_writers import (
+    EXPORT_HEADERS,
+    arrow_stream_chunks,
+    columnar_available,
+    csv_chunks,
+    export_row,
+    file_chunks,
+    gzip_chunks,
+    spooled_parquet,
+)
+
+EXPORT_COLUMNS = ("id", "created_at", "type", "category", "amount", "description")
+
+CATEGORIES = ["餐飲", "交通", "娛樂", "購物", "生活", "醫療", "薪水", "其他"]
+
+SCHEMA = """
+    CREATE TABLE transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        type TEXT NOT NULL,
+        amount REAL NOT NULL,
+        category TEXT NOT NULL,
+        description TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX idx_transactions_user_created ON transactions(user_id, created_at, type, amount, category);
+"""
+
+
+def build_db(rows: int) -> sqlite3.Connection:
+    rng = random.Random(19)
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(SCHEMA)
+    start = datetime(2022, 1, 1)
+    conn.executemany(
+        "INSERT INTO transactions (user_id, type, amount, category, description, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            (
+                "U1",
+                "income" if rng.random() < 0.1 else "expense",
+                rng.randrange(20, 5000),
+                rng.choice(CATEGORIES),
+                f"{rng.choice(CATEGORIES)} 第 {i} 筆",
+                # 以分鐘為單位，刻意產生相同 created_at 的資料測試 keyset 的 id 排序
+                (start + timedelta(minutes=rng.randrange(rows // 2))).strftime("%Y-%m-%d %H:%M:%S"),
+            )
+            for i in range(rows)
+        ),
+    )
+    conn.commit()
+    return conn
+
+
+def dict_rows(cursor) -> list:
+    columns = [col[0] for col in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def legacy_export(conn: sqlite3.Connection):
+    """舊流程：全部載入後組出整個檔案"""
+    cursor = conn.execute("SELECT * FROM transactions WHERE user_id = ? ORDER BY created_at DESC", ("U1",))
+    transactions = dict_rows(cursor)
+
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(EXPORT_HEADERS)
+    for t in transactions:
+        writer.writerow(export_row(t))
+    yield output.getvalue().encode("utf-8")
+
+
+def keyset_pages(conn: sqlite3.Connection, chunk_size: int, columns: tuple = ()):
+    """與 database._iter_export_pages 相同的 keyset 分頁，產出 (欄位名稱, rows)"""
+    select_clause = ", ".join(columns) if columns else "*"
+    cursor_key = None
+    while True:
+        keyset_clause, keyset_params = "", []
+        if cursor_key:
+            keyset_clause = "AND created_at <= ? AND (created_at < ? OR id < ?)"
+            keyset_params = [cursor_key[0], cursor_key[0], cursor_key[1]]
+        cursor = conn.execute(f"""
+            SELECT {select_clause} FROM transactions
+            WHERE user_id = ? {keyset_clause}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        """, ["U1"] + keyset_params + [chunk_size])
+        names = [col[0] for col in cursor.description]
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        yield names, rows
+        if len(rows) < chunk_size:
+            return
+        last = dict(zip(names, rows[-1]))
+        cursor_key = (last["created_at"], last["id"])
+
+
+def keyset_chunks(conn: sqlite3.Connection, chunk_size: int):
+    for names, rows in keyset_pages(conn, chunk_size):
+        yield [dict(zip(names, row)) for row in rows]
+
+
+def keyset_columns(conn: sqlite3.Connection, chunk_size: int):
+    for names, rows in keyset_pages(conn, chunk_size, EXPORT_COLUMNS):
+        yield dict(zip(names, map(list, zip(*rows))))
+
+
+def parquet_body(conn: sqlite3.Connection, chunk_size: int):
+    yield from file_chunks(spooled_parquet(keyset_columns(conn, chunk_size), 8 * 1024 * 1024))
+
+
+def consume(body) -> tuple:
+    """逐段讀取（模擬傳送給用戶端），回傳 (第一段時間, 總時間, 位元組數)"""
+    start = time.perf_counter()
+    first = None
+    size = 0
+    for chunk in body:
+        if first is None:
+            first = time.perf_counter() - start
+        size += len(chunk)
+    return first, time.perf_counter() - start, size
+
+
+def measure(name: str, make_body) -> dict:
+    """先計時，再另外跑一次用 tracemalloc 量記憶體峰值（tracemalloc 會讓執行變慢數倍）"""
+    first, elapsed, size = consume(make_body())
+
+    tracemalloc.start()
+    consume(make_body())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        f"{name:<20} 峰值 {peak / 1024 / 1024:8.1f} MB  第一段 {first * 1000:8.1f} ms  "
+        f"總計 {elapsed * 1000:8.1f} ms  輸出 {size / 1024 / 1024:6.1f} MB"
+    )
+    return {"peak": peak, "size": size, "seconds": elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--columnar-chunk-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    conn = build_db(args.rows)
+    print(f"交易：{args.rows:,} 筆，每批 {args.chunk_size} 筆\n")
+
+    # 兩種流程輸出的內容必須完全相同（相同 created_at 時舊流程沒有固定順序，只比對排序後的行）
+    legacy_lines = b"".join(legacy_export(conn)).decode("utf-8").splitlines()
+    stream_lines = b"".join(csv_chunks(keyset_chunks(conn, args.chunk_size))).decode("utf-8").splitlines()
+    assert legacy_lines[0] == stream_lines[0] and sorted(legacy_lines) == sorted(stream_lines), "輸出不一致"
+
+    old = measure("舊：全部載入", lambda: legacy_export(conn))
+    new = measure("新：keyset 串流", lambda: csv_chunks(keyset_chunks(conn, args.chunk_size)))
+    gz = measure("新：串流 + gzip", lambda: gzip_chunks(csv_chunks(keyset_chunks(conn, args.chunk_size))))
+
+    print(f"\n記憶體峰值降為 {new['peak'] / old['peak']:.1%}，gzip 後傳輸量 {gz['size'] / new['size']:.1%}")
+
+    if not columnar_available():
+        print("\n未安裝 pyarrow，略過 Parquet / Arrow")
+        return
+
+    print()
+    parquet = measure("Parquet（zstd）", lambda: parquet_body(conn, args.columnar_chunk_size))
+    arrow = measure("Arrow IPC（zstd）", lambda: arrow_stream_chunks(keyset_columns(conn, args.columnar_chunk_size)))
+
+    print("\n相對於 CSV 串流：")
+    for name, result in (("CSV gzip", gz), ("Parquet", parquet), ("Arrow IPC", arrow)):
+        print(f"  {name:<10} 大小 {result['size'] / new['size']:6.1%}  耗時 {result['seconds'] / new['seconds']:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
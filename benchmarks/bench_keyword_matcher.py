@@ -0,0 +1,105 @@
+"""
+關鍵字比對效能測試
+比較舊寫法（逐分類、逐關鍵字 keyword in text）與 Aho–Corasick 自動機（一次掃描）
+同時驗證兩者在記帳分類與能量幣分類上的結果完全一致
+
+執行：python -m benchmarks.bench_keyword_matcher [--rows 200000]
+"""
+import argparse
+import random
+import time
+
+from energy_coins import COIN_RULES, classify_energy
+from parser import EXPENSE_KEYWORDS, INCOME_KEYWORDS, determine_category
+
+FILLERS = ["今天", "跟朋友", "在公司附近", "週末", "晚上", "順便", "和家人", "臨時", "每月固定", "網路上"]
+
+
+def legacy_determine_category(text: str) -> tuple:
+    """舊版分類：收入優先，依序掃描每個關鍵字"""
+    text_lower = text.lower()
+    for category, keywords in INCOME_KEYWORDS.items():
+        for keyword in keywords:
+            if keyword in text_lower:
+                return "income", category
+    for category, keywords in EXPENSE_KEYWORDS.items():
+        for keyword in keywords:
+            if keyword in text_lower:
+                return "expense", category
+    return "expense", "其他"
+
+
+def legacy_classify_energy(trans_type: str, category: str, description: str) -> list:
+    """舊版能量幣分類：每個幣別各自掃描一次"""
+    combined = (category or '').lower() + ' ' + (description or '').lower()
+    return [
+        coin_type
+        for coin_type, rule_type, keywords in COIN_RULES
+        if trans_type == rule_type and any(keyword in combined for keyword in keywords)
+    ]
+
+
+def generate_corpus(rows: int, seed: int = 42) -> list:
+    """產生合成記帳描述：隨機混入 0~2 個關鍵字，約一成完全不命中"""
+    rng = random.Random(seed)
+    keywords = [kw for kws in INCOME_KEYWORDS.values() for kw in kws]
+    keywords += [kw for kws in EXPENSE_KEYWORDS.values() for kw in kws]
+    keywords += [kw for _, _, kws in COIN_RULES for kw in kws]
+
+    corpus = []
+    for _ in range(rows):
+        parts = [rng.choice(FILLERS)]
+        for _ in range(rng.choice((0, 1, 1, 1, 2, 2))):
+            parts.append(rng.choice(keywords))
+        parts.append(str(rng.randrange(10, 5000)))
+        rng.shuffle(parts)
+        corpus.append("".join(parts))
+    return corpus
+
+
+def time_it(func, corpus) -> float:
+    start = time.perf_counter()
+    for text in corpus:
+        func(text)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.rows)
+    print(f"語料：{len(corpus):,} 筆")
+
+    # 先確認結果一致
+    for text in corpus:
+        expected = legacy_determine_category(text)
+        actual = determine_category(text)
+        if expected != actual:
+            raise SystemExit(f"分類結果不一致：{text!r} 舊 {expected} 新 {actual}")
+        for trans_type in ("income", "expense"):
+            expected = legacy_classify_energy(trans_type, "其他", text)
+            actual = classify_energy(trans_type, "其他", text)
+            if expected != actual:
+                raise SystemExit(f"能量幣結果不一致：{text!r} 舊 {expected} 新 {actual}")
+    print("結果一致")
+
+    cases = [
+        ("記帳分類", legacy_determine_category, determine_category),
+        ("能量幣分類", lambda text: legacy_classify_energy("expense", "其他", text),
+         lambda text: classify_energy("expense", "其他", text)),
+    ]
+
+    print("\n=== 結果 ===")
+    for name, legacy, current in cases:
+        old = time_it(legacy, corpus)
+        new = time_it(current, corpus)
+        print(
+            f"{name:<8} 舊 {len(corpus) / old:12,.0f} 筆/秒  新 {len(corpus) / new:12,.0f} 筆/秒  "
+            f"加速 {old / new:5.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
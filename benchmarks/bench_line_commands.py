@@ -0,0 +1,178 @@
+"""
+文字訊息路由效能測試
+比較舊的 if/elif 流程（一般記帳文字前要先 get_habit_by_name 查一到兩次）
+與指令表 + 習慣名稱索引快取的新路由：每秒處理訊息數、每則訊息的資料庫查詢次數
+
+資料庫以行程內的替代模組模擬（--query-latency-ms 模擬 Turso 往返延遲），
+只量測路由本身與查詢次數，不需要連線到正式資料庫
+
+執行：python -m benchmarks.bench_line_commands [--messages 20000] [--query-latency-ms 0]
+"""
+import argparse
+import random
+import sys
+import time
+import types
+from collections import Counter
+
+
+class FakeDatabase:
+    """記憶體中的替代資料庫，記錄每個函式被呼叫的次數"""
+
+    def __init__(self, habits: dict, latency: float):
+        self.habits = habits
+        self.latency = latency
+        self.calls = Counter()
+        self.checkins = set()
+
+    def _query(self, name: str):
+        self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def module(self) -> types.ModuleType:
+        db = self
+        module = types.ModuleType("database")
+
+        def get_habits(user_id):
+            db._query("get_habits")
+            return list(db.habits.values())
+
+        def get_habit_by_name(user_id, name):
+            db._query("get_habit_by_name")
+            return db.habits.get(name)
+
+        index_cache = {}
+
+        def get_habit_index(user_id):
+            index = index_cache.get(user_id)
+            if index is None:
+                index = {habit["name"]: habit for habit in get_habits(user_id)}
+                index_cache[user_id] = index
+            return index
+
+        def checkin_habit(user_id, habit_id, check_date=None):
+            db._query("checkin_habit")
+            key = (user_id, habit_id, check_date)
+            if key in db.checkins:
+                return False
+            db.checkins.add(key)
+            return True
+
+        def get_habit_streak(user_id, habit_id):
+            db._query("get_habit_streak")
+            return 3
+
+        def add_transaction(**kwargs):
+            db._query("add_transaction")
+            return 1
+
+        def get_summary(user_id, start_date=None, end_date=None):
+            db._query("get_summary")
+            return {"total_income": 0, "total_expense": 150, "balance": -150, "transaction_count": 1}
+
+        def get_habits_with_streaks(user_id):
+            db._query("get_habits_with_streaks")
+            return [dict(habit, checked=False, streak=3) for habit in db.habits.values()]
+
+        def create_habit(user_id, name, emoji="✓"):
+            db._query("create_habit")
+            return 1
+
+        for func in (get_habits, get_habit_by_name, get_habit_index, checkin_habit, get_habit_streak,
+                     add_transaction, get_summary, get_habits_with_streaks, create_habit):
+            setattr(module, func.__name__, func)
+        return module
+
+
+def legacy_route(user_id: str, text: str) -> str:
+    """舊流程的決策順序（與原本 handle_text_message 相同的查詢次數）"""
+    import line_commands as lc
+    from database import get_habit_by_name
+
+    if text in lc.EXACT_COMMANDS:
+        return lc.EXACT_COMMANDS[text](user_id, text)
+    if text.startswith("新增習慣"):
+        habit_name = text.replace("新增習慣", "").strip()
+        if habit_name and get_habit_by_name(user_id, habit_name):
+            return "exists"
+        return lc.add_habit(user_id, text)
+    if text.startswith("打卡 "):
+        habit_name = text.replace("打卡 ", "").strip()
+        habit = get_habit_by_name(user_id, habit_name)
+        return lc.checkin_today(user_id, habit) if habit else "not found"
+
+    dated = lc.parse_dated_checkin(text)
+    if dated and dated[0]:
+        habit_name, check_date, date_display = dated
+        habit = get_habit_by_name(user_id, habit_name)
+        if habit:
+            return lc.backfill_checkin(user_id, habit, habit_name, check_date, date_display)
+
+    habit = get_habit_by_name(user_id, text)
+    if habit:
+        return lc.checkin_today(user_id, habit)
+    return lc.record_transaction(user_id, text)
+
+
+def generate_messages(count: int, habit_names: list, seed: int = 3) -> list:
+    """訊息組成：約 80% 記帳、10% 打卡、5% 指令、5% 補打卡"""
+    rng = random.Random(seed)
+    items = ["午餐", "晚餐", "咖啡", "捷運", "計程車", "電影", "衣服", "房租", "收入 薪水", "看醫生"]
+    messages = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.8:
+            messages.append(f"{rng.choice(items)} {rng.randrange(20, 3000)}")
+        elif roll < 0.9:
+            messages.append(rng.choice(habit_names))
+        elif roll < 0.95:
+            messages.append(rng.choice(["今日收支", "使用說明", "習慣"]))
+        else:
+            messages.append(rng.choice([f"昨天 {rng.choice(habit_names)}", f"3/{rng.randrange(1, 28)} {rng.choice(habit_names)}"]))
+    return messages
+
+
+def run(route, messages: list, fake: FakeDatabase) -> tuple[float, int]:
+    fake.calls.clear()
+    fake.checkins.clear()
+    start = time.perf_counter()
+    for text in messages:
+        route("U1", text)
+    elapsed = time.perf_counter() - start
+    return elapsed, sum(fake.calls.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--habits", type=int, default=8)
+    parser.add_argument("--query-latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    habit_names = ["打拳", "跑步", "閱讀", "冥想", "喝水", "早睡", "背單字", "伸展"][:args.habits]
+    habits = {name: {"id": i + 1, "name": name, "emoji": "✓"} for i, name in enumerate(habit_names)}
+
+    fake = FakeDatabase(habits, args.query_latency_ms / 1000)
+    sys.modules["database"] = fake.module()
+
+    from line_commands import route_text_message
+
+    messages = generate_messages(args.messages, habit_names)
+    print(f"訊息：{len(messages):,} 則，模擬查詢延遲 {args.query_latency_ms} ms\n")
+
+    results = {}
+    for name, route in (("舊：if/elif + 逐次查詢", legacy_route), ("新：指令表 + 習慣索引", route_text_message)):
+        elapsed, queries = run(route, messages, fake)
+        results[name] = elapsed
+        print(
+            f"{name:<20} {len(messages) / elapsed:12,.0f} 則/秒  "
+            f"查詢 {queries:,} 次（每則 {queries / len(messages):.2f}）  {dict(fake.calls.most_common(4))}"
+        )
+
+    old, new = results.values()
+    print(f"\n加速 {old / new:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
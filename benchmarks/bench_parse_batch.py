@@ -0,0 +1,165 @@
+"""
+批次解析效能測試
+比較舊版逐筆解析（每次 re.search 字串樣式、三個樣式依序嘗試、逐一比對關鍵字）、
+parse_transaction 逐筆呼叫，以及 parse_transactions 批次／多 process 解析
+並逐筆比對：批次結果必須與 parse_transaction、舊版實作完全相同
+舊版實作是最佳化前 parser.py 的凍結副本，不引用目前的 chinese_to_number / determine_category，
+熱點函式退步時 speedup_vs_legacy 才會反映出來
+
+執行：python -m benchmarks.bench_parse_batch [--rows 300000] [--workers 4]
+"""
+import argparse
+import os
+import random
+import re
+import time
+
+from parser import (
+    CHINESE_NUMBERS,
+    EXPENSE_KEYWORDS,
+    INCOME_KEYWORDS,
+    ParsedTransaction,
+    parse_transaction,
+    parse_transactions,
+)
+
+from benchmarks.bench_keyword_matcher import legacy_determine_category
+
+FILLERS = ["今天", "跟朋友", "在公司附近", "週末", "晚上", "順便", "和家人", "每月固定"]
+CHINESE_AMOUNTS = ["五十", "一百", "三百五", "兩千", "一萬", "十二", "八十塊"]
+
+
+def legacy_chinese_to_number(text: str):
+    """舊版中文數字轉換"""
+    if not text:
+        return None
+
+    clean_text = text.replace(",", "").replace("，", "")
+    try:
+        return float(clean_text)
+    except ValueError:
+        pass
+
+    result = 0
+    temp = 0
+
+    for char in text:
+        if char in CHINESE_NUMBERS:
+            num = CHINESE_NUMBERS[char]
+            if num >= 10:
+                if temp == 0:
+                    temp = 1
+                if num == 10000:
+                    result = (result + temp) * num
+                    temp = 0
+                else:
+                    temp *= num
+                    result += temp
+                    temp = 0
+            else:
+                temp = temp * 10 + num if temp >= 10 else num
+        elif char in "塊元錢块":
+            continue
+
+    result += temp
+    return result if result > 0 else None
+
+
+def legacy_extract_amount(text: str):
+    """舊版金額擷取（未預先編譯、三個樣式）"""
+    patterns = [
+        r"(\d+(?:,\d{3})*(?:\.\d+)?)\s*(?:塊|元|錢|块)?",
+        r"(?:花了?|用了?|付了?|收到?)\s*(\d+(?:,\d{3})*(?:\.\d+)?)",
+    ]
+    for pattern in patterns:
+        match = re.search(pattern, text)
+        if match:
+            amount_str = match.group(1).replace(",", "")
+            try:
+                return float(amount_str)
+            except ValueError:
+                pass
+
+    chinese_pattern = r"([零一二兩三四五六七八九十百千萬]+)\s*(?:塊|元|錢|块)?"
+    match = re.search(chinese_pattern, text)
+    if match:
+        return legacy_chinese_to_number(match.group(1))
+    return None
+
+
+def legacy_parse_transaction(text: str):
+    if not text:
+        return None
+    amount = legacy_extract_amount(text)
+    if amount is None:
+        return None
+    trans_type, category = legacy_determine_category(text)
+    return ParsedTransaction(type=trans_type, amount=amount, category=category, description=text)
+
+
+def generate_corpus(rows: int, seed: int = 7) -> list:
+    """產生合成記帳訊息：阿拉伯數字、千分位、小數、中文數字、無金額、空字串"""
+    rng = random.Random(seed)
+    keywords = [kw for kws in INCOME_KEYWORDS.values() for kw in kws]
+    keywords += [kw for kws in EXPENSE_KEYWORDS.values() for kw in kws]
+
+    corpus = []
+    for _ in range(rows):
+        roll = rng.random()
+        if roll < 0.5:
+            amount = str(rng.randrange(1, 5000))
+        elif roll < 0.65:
+            amount = f"{rng.randrange(1, 999)},{rng.randrange(0, 1000):03d}"
+        elif roll < 0.75:
+            amount = f"{rng.randrange(1, 500)}.{rng.randrange(0, 100)}"
+        elif roll < 0.9:
+            amount = rng.choice(CHINESE_AMOUNTS)
+        elif roll < 0.98:
+            amount = ""
+        else:
+            corpus.append("")
+            continue
+        parts = [rng.choice(FILLERS), rng.choice(keywords), amount + rng.choice(["", "元", "塊", " 錢"])]
+        rng.shuffle(parts)
+        corpus.append("".join(parts))
+    return corpus
+
+
+def timed(label: str, rows: int, func):
+    start = time.perf_counter()
+    results = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:7.2f}s  {rows / elapsed:12,.0f} 筆/秒")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=300_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--chunksize", type=int, default=2000)
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.rows)
+    print(f"語料：{len(corpus):,} 筆，workers={args.workers}\n")
+
+    legacy = timed("舊版逐筆", len(corpus), lambda: [legacy_parse_transaction(t) for t in corpus])
+    single = timed("parse_transaction 逐筆", len(corpus), lambda: [parse_transaction(t) for t in corpus])
+    batch = timed("parse_transactions", len(corpus), lambda: list(parse_transactions(corpus)))
+    pooled = timed(
+        f"parse_transactions x{args.workers}", len(corpus),
+        lambda: list(parse_transactions(iter(corpus), workers=args.workers, chunksize=args.chunksize)),
+    )
+
+    # 差異比對
+    for name, results in (("逐筆", single), ("批次", batch), ("多 process", pooled)):
+        if len(results) != len(corpus):
+            raise SystemExit(f"{name} 筆數不符：{len(results)} != {len(corpus)}")
+        for text, expected, actual in zip(corpus, legacy, results):
+            if expected != actual:
+                raise SystemExit(f"{name} 結果不一致：{text!r}\n  舊 {expected}\n  新 {actual}")
+    print("\n所有結果與舊版逐筆解析一致")
+
+
+if __name__ == "__main__":
+    main()
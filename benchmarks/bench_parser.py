@@ -0,0 +1,322 @@
+"""
+記帳解析（parser.py）效能與正確率基準測試
+
+以固定亂數種子產生大型黃金語料（中文記帳語句與正確答案），涵蓋：
+  阿拉伯數字、千分位、小數、萬/千/百、「兩」、零、省略單位（兩千五）、
+  結尾的 塊/元、收入/支出/未分類的用語
+報告每秒解析筆數、單筆 p50/p99 延遲，以及各特徵的正確率，
+並與儲存的基準比較，退步即以非零結束碼失敗：
+  - 正確率：任何特徵低於基準
+  - 吞吐量：相對於同一次執行中舊版逐筆解析的倍數低於基準的容許範圍（與機器快慢無關）
+  - 絕對吞吐量（筆/秒）只在 --check-absolute-speed 時比較，適用於與基準相同的機器
+
+執行：python -m benchmarks.bench_parser [--cases 50000] [--update-baseline] [--check-absolute-speed]
+"""
+import argparse
+import hashlib
+import json
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from parser import EXPENSE_KEYWORDS, INCOME_KEYWORDS, ParsedTransaction, parse_transaction, parse_transactions
+
+from benchmarks.bench_parse_batch import legacy_parse_transaction
+
+BASELINE_PATH = Path(__file__).parent / "baselines" / "bench_parser.json"
+
+# 不含任何分類關鍵字與數字的填充詞
+FILLERS = ["今天", "剛剛", "昨天", "這個月", "上週", "早上", "下班後", "跟同事", "和家人", "順路"]
+
+DIGITS = "零一二三四五六七八九"
+
+
+def to_chinese(n: int, liang: bool = False) -> str:
+    """正確的阿拉伯數字轉中文（n < 1 億）；liang=True 時百/千/萬前的 2 寫成「兩」"""
+    def section(value: int, leading: bool) -> str:
+        text = ""
+        zero = False
+        for unit_value, unit in ((1000, "千"), (100, "百"), (10, "十"), (1, "")):
+            digit = value // unit_value % 10
+            if digit == 0:
+                zero = bool(text)
+                continue
+            if zero:
+                text += "零"
+                zero = False
+            if digit == 1 and unit == "十" and not text and leading:
+                text += "十"
+            elif digit == 2 and liang and unit in ("千", "百"):
+                text += "兩" + unit
+            else:
+                text += DIGITS[digit] + unit
+        return text
+
+    wan, rest = divmod(n, 10000)
+    if not wan:
+        return section(rest, leading=True)
+
+    head = "兩" if wan == 2 and liang else section(wan, leading=True)
+    text = head + "萬"
+    if rest:
+        if rest < 1000:
+            text += "零"
+        text += section(rest, leading=False)
+    return text
+
+
+def _keyword_pool():
+    """(類型, 分類, 關鍵字)；排除含數字的關鍵字（如 3c），避免與金額混淆"""
+    pool = []
+    for trans_type, table in (("income", INCOME_KEYWORDS), ("expense", EXPENSE_KEYWORDS)):
+        for category, keywords in table.items():
+            for keyword in keywords:
+                if not any(ch.isdigit() for ch in keyword):
+                    pool.append((trans_type, category, keyword))
+    return pool
+
+
+ALL_KEYWORDS = [keyword for _, _, keyword in _keyword_pool()] + ["3c"]
+
+
+def _leaks_other_keyword(text: str, keyword: str) -> bool:
+    """語句中是否意外出現其他關鍵字（填充詞與中文數字拼接時可能發生）"""
+    lowered = text.lower()
+    return any(other in lowered for other in ALL_KEYWORDS if other != keyword and other not in keyword)
+
+
+def _amount(rng: random.Random):
+    """產生金額文字、正確數值與特徵標籤"""
+    kind = rng.choices(
+        ["arabic", "comma", "decimal", "chinese", "abbrev"],
+        weights=[30, 15, 10, 35, 10],
+    )[0]
+
+    if kind == "arabic":
+        value = rng.randrange(1, 10000)
+        return str(value), float(value), {"arabic"}
+    if kind == "comma":
+        value = rng.randrange(1000, 1_000_000)
+        return f"{value:,}", float(value), {"arabic", "comma"}
+    if kind == "decimal":
+        value = round(rng.randrange(1, 100000) / 100, 2)
+        return f"{value:.2f}".rstrip("0").rstrip("."), value, {"arabic", "decimal"}
+
+    if kind == "abbrev":
+        # 兩千五 = 2500、一百二 = 120、三萬五 = 35000
+        unit_value, unit = rng.choice([(100, "百"), (1000, "千"), (10000, "萬")])
+        head, tail = rng.randrange(1, 10), rng.randrange(1, 10)
+        liang = head == 2 and rng.random() < 0.7
+        text = ("兩" if liang else DIGITS[head]) + unit + DIGITS[tail]
+        tags = {"chinese", "abbrev", {100: "bai", 1000: "qian", 10000: "wan"}[unit_value]}
+        if liang:
+            tags.add("liang")
+        return text, float(head * unit_value + tail * unit_value // 10), tags
+
+    value = rng.choice([
+        rng.randrange(1, 100),
+        rng.randrange(100, 1000),
+        rng.randrange(1000, 10000),
+        rng.randrange(10000, 200000),
+    ])
+    liang = rng.random() < 0.5
+    text = to_chinese(value, liang=liang)
+    tags = {"chinese"}
+    if "萬" in text:
+        tags.add("wan")
+    if "千" in text:
+        tags.add("qian")
+    if "百" in text:
+        tags.add("bai")
+    if "兩" in text:
+        tags.add("liang")
+    if "零" in text:
+        tags.add("zero")
+    return text, float(value), tags
+
+
+def generate_golden(count: int, seed: int = 20240501) -> list:
+    """產生黃金語料：[(語句, 預期 ParsedTransaction, 特徵標籤)]"""
+    rng = random.Random(seed)
+    keywords = _keyword_pool()
+    cases = []
+
+    while len(cases) < count:
+        amount_text, amount, tags = _amount(rng)
+        suffix = rng.choice(["", "", "元", "塊", " 元", "塊錢"])
+        if suffix:
+            tags.add("suffix")
+
+        if rng.random() < 0.1:
+            trans_type, category, keyword = "expense", "其他", ""
+            tags.add("uncategorized")
+        else:
+            trans_type, category, keyword = rng.choice(keywords)
+            tags.add(trans_type)
+
+        filler = rng.choice(FILLERS)
+        layout = rng.randrange(3)
+        if layout == 0:
+            text = f"{filler}{keyword}{amount_text}{suffix}"
+        elif layout == 1:
+            text = f"{keyword} {amount_text}{suffix}"
+        else:
+            text = f"{filler}{keyword}{amount_text}{suffix}" if not keyword else f"{amount_text}{suffix} {keyword}"
+
+        if _leaks_other_keyword(text, keyword):
+            continue
+
+        expected = ParsedTransaction(type=trans_type, amount=amount, category=category, description=text)
+        cases.append((text, expected, sorted(tags)))
+
+    return cases
+
+
+def corpus_digest(cases: list) -> str:
+    """語料指紋；產生器改變時基準需要更新"""
+    digest = hashlib.sha256()
+    for text, expected, _ in cases:
+        digest.update(f"{text}\t{expected.type}\t{expected.amount}\t{expected.category}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def measure_accuracy(cases: list) -> dict:
+    """各特徵的正確率（金額、分類皆須正確）"""
+    hits = defaultdict(int)
+    totals = defaultdict(int)
+
+    for (text, expected, tags), actual in zip(cases, parse_transactions(text for text, _, _ in cases)):
+        correct = actual is not None and (
+            actual.type == expected.type
+            and actual.category == expected.category
+            and abs(actual.amount - expected.amount) < 1e-9
+        )
+        for tag in ["all"] + tags:
+            totals[tag] += 1
+            hits[tag] += correct
+
+    return {tag: round(hits[tag] / totals[tag], 6) for tag in sorted(totals)}
+
+
+def best_seconds(parse_all, rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        parse_all()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def measure_speed(cases: list, rounds: int) -> dict:
+    """吞吐量（取最佳一輪）、相對舊版逐筆解析的倍數與單筆延遲分位數"""
+    texts = [text for text, _, _ in cases]
+
+    best = best_seconds(lambda: all(True for _ in parse_transactions(texts)), rounds)
+    legacy = best_seconds(lambda: [legacy_parse_transaction(text) for text in texts], rounds)
+
+    latencies = []
+    clock = time.perf_counter_ns
+    for text in texts:
+        start = clock()
+        parse_transaction(text)
+        latencies.append(clock() - start)
+    latencies.sort()
+
+    return {
+        "parses_per_sec": round(len(texts) / best),
+        "speedup_vs_legacy": round(legacy / best, 3),
+        "p50_us": round(statistics.median(latencies) / 1000, 2),
+        "p99_us": round(latencies[int(len(latencies) * 0.99) - 1] / 1000, 2),
+    }
+
+
+def compare(result: dict, baseline: dict, tolerance: float, check_absolute_speed: bool = False) -> list:
+    """回傳退步項目"""
+    failures = []
+
+    if baseline.get("corpus") != result["corpus"]:
+        failures.append(
+            f"語料指紋不同（基準 {baseline.get('corpus')}，目前 {result['corpus']}），"
+            "請確認產生器變更後以 --update-baseline 更新"
+        )
+        return failures
+
+    for tag, expected in baseline["accuracy"].items():
+        actual = result["accuracy"].get(tag, 0.0)
+        if actual + 1e-9 < expected:
+            failures.append(f"正確率退步 [{tag}]：{expected:.4%} -> {actual:.4%}")
+
+    floor = baseline["speed"]["speedup_vs_legacy"] * (1 - tolerance)
+    if result["speed"]["speedup_vs_legacy"] < floor:
+        failures.append(
+            f"相對吞吐量退步：舊版的 {result['speed']['speedup_vs_legacy']:.2f} 倍 "
+            f"< 基準 {baseline['speed']['speedup_vs_legacy']:.2f} 倍的 {1 - tolerance:.0%}"
+        )
+
+    floor = baseline["speed"]["parses_per_sec"] * (1 - tolerance)
+    if check_absolute_speed and result["speed"]["parses_per_sec"] < floor:
+        failures.append(
+            f"吞吐量退步：{result['speed']['parses_per_sec']:,} 筆/秒 "
+            f"< 基準 {baseline['speed']['parses_per_sec']:,} 的 {1 - tolerance:.0%}"
+        )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=50_000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=0.3, help="吞吐量容許下降比例（預設 0.3）")
+    parser.add_argument(
+        "--check-absolute-speed", action="store_true",
+        help="另外比較絕對吞吐量（筆/秒），只在與基準相同的機器上使用"
+    )
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="以本次結果覆寫基準")
+    args = parser.parse_args()
+
+    cases = generate_golden(args.cases)
+    result = {
+        "cases": len(cases),
+        "corpus": corpus_digest(cases),
+        "accuracy": measure_accuracy(cases),
+        "speed": measure_speed(cases, args.rounds),
+    }
+
+    print(f"語料：{result['cases']:,} 筆（指紋 {result['corpus']}）")
+    print(
+        f"吞吐量：{result['speed']['parses_per_sec']:,} 筆/秒  "
+        f"（舊版的 {result['speed']['speedup_vs_legacy']:.2f} 倍）  "
+        f"p50 {result['speed']['p50_us']} µs  p99 {result['speed']['p99_us']} µs"
+    )
+    print("\n正確率：")
+    for tag, accuracy in result["accuracy"].items():
+        print(f"  {tag:<14} {accuracy:8.2%}")
+
+    if args.update_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(result, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"\n已更新基準：{args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"\n找不到基準 {args.baseline}，請先以 --update-baseline 建立")
+        return 1
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    failures = compare(result, baseline, args.tolerance, args.check_absolute_speed)
+    if failures:
+        print("\n與基準比較：失敗")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+
+    print("\n與基準比較：通過")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
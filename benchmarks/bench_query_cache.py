@@ -0,0 +1,95 @@
+"""
+查詢結果快取效能測試
+模擬儀表板與「今日收支」的查詢組合（摘要、分類、趨勢、預算、分類列表），
+每次查詢與讀取資料版本都加上固定的網路延遲（Turso 往返），比較：
+- 不快取：每次都查詢
+- 快取：只在交易寫入後重新查詢，其餘請求只讀一次版本（記憶體中的版本過期時）
+
+執行：python -m benchmarks.bench_query_cache [--requests 500] [--write-every 20] [--latency-ms 30]
+"""
+import argparse
+import time
+
+from services.query_cache import QueryCache
+
+
+def build(latency: float, version_ttl: float):
+    """建立模擬查詢；回傳 (查詢清單, 寫入函式, 快取, 計數器)"""
+    versions = {"U1": 0}
+    counter = {"queries": 0, "version_loads": 0}
+
+    def remote(result):
+        counter["queries"] += 1
+        time.sleep(latency)
+        return result
+
+    def load_version(user_id):
+        counter["version_loads"] += 1
+        time.sleep(latency)
+        return versions[user_id]
+
+    cache = QueryCache(load_version, version_ttl=version_ttl)
+
+    def get_summary(user_id, start_date=None, end_date=None):
+        return remote({"total_income": 1000, "total_expense": 400, "balance": 600, "transaction_count": 12})
+
+    def get_stats_by_category(user_id, trans_type=None, start_date=None, end_date=None):
+        return remote([{"category": "餐飲", "type": "expense", "total": 400, "count": 12}])
+
+    def get_stats_by_date(user_id, start_date=None, end_date=None, group_by="day"):
+        return remote([{"date": "2024-01-01", "income": 1000, "expense": 400}])
+
+    def get_categories(user_id):
+        return remote(["餐飲", "薪水"])
+
+    def get_budget_status(user_id):
+        return remote({"monthly_budget": 5000, "spent": 400, "remaining": 4600})
+
+    funcs = [get_summary, get_stats_by_category, get_stats_by_date, get_categories, get_budget_status]
+
+    def write(user_id):
+        versions[user_id] += 1
+        cache.invalidate(user_id)
+
+    return funcs, [cache.cached(func) for func in funcs], write, cache, counter
+
+
+def run(funcs, write, requests: int, write_every: int) -> float:
+    start = time.perf_counter()
+    for i in range(requests):
+        if write_every and i and i % write_every == 0:
+            write("U1")
+        for func in funcs:
+            func("U1")
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--write-every", type=int, default=20, help="每幾次請求寫入一筆交易（0 表示不寫入）")
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--version-ttl", type=float, default=10)
+    args = parser.parse_args()
+
+    latency = args.latency_ms / 1000
+    print(f"請求：{args.requests} 次（每次 5 個查詢），每 {args.write_every} 次寫入一筆，延遲 {args.latency_ms} ms\n")
+
+    funcs, cached_funcs, write, cache, counter = build(latency, args.version_ttl)
+
+    plain = run(funcs, write, args.requests, args.write_every)
+    plain_queries = counter["queries"]
+    counter.update(queries=0, version_loads=0)
+
+    cached = run(cached_funcs, write, args.requests, args.write_every)
+
+    print(f"不快取  總計 {plain:7.2f} s  查詢 {plain_queries:6d} 次")
+    print(
+        f"快取    總計 {cached:7.2f} s  查詢 {counter['queries']:6d} 次  "
+        f"讀取版本 {counter['version_loads']:4d} 次"
+    )
+    print(f"\n命中率 {cache.stats()['hit_rate']:.1%}，耗時降為 {cached / plain:.1%}")
+
+
+if __name__ == "__main__":
+    main()
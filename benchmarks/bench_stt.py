@@ -0,0 +1,131 @@
+"""
+語音辨識後端效能測試
+比較各後端在相同音檔上的延遲與即時率（RTF = 處理時間 / 音檔長度，越小越快）
+
+執行：
+  python -m benchmarks.bench_stt --backends fake,local,openai --clips samples/*.m4a
+未指定 --clips 時會產生幾段合成 WAV（純音，只適合比較延遲，辨識結果沒有意義）
+local 需要安裝 faster-whisper；openai 需要設定 OPENAI_API_KEY
+"""
+import argparse
+import io
+import math
+import statistics
+import struct
+import time
+import wave
+from pathlib import Path
+
+from services.stt import create_backend
+
+SAMPLE_RATE = 16000
+
+
+def synth_clip(seconds: float) -> bytes:
+    """產生單聲道 16kHz 的合成 WAV"""
+    frames = int(seconds * SAMPLE_RATE)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(b"".join(
+            struct.pack("<h", int(8000 * math.sin(2 * math.pi * 440 * i / SAMPLE_RATE)))
+            for i in range(frames)
+        ))
+    return buffer.getvalue()
+
+
+def clip_duration(data: bytes):
+    """音檔長度（秒）；WAV 直接讀取，其他格式需要 PyAV，無法判斷時回傳 None"""
+    try:
+        with wave.open(io.BytesIO(data), "rb") as wav:
+            return wav.getnframes() / wav.getframerate()
+    except (wave.Error, EOFError):
+        pass
+
+    try:
+        import av
+    except ImportError:
+        return None
+    with av.open(io.BytesIO(data)) as container:
+        return container.duration / 1_000_000 if container.duration else None
+
+
+def load_clips(paths: list) -> list:
+    """[(名稱, bytes, 長度秒數)]"""
+    if not paths:
+        return [(f"synth-{seconds}s", synth_clip(seconds), float(seconds)) for seconds in (2, 5, 10)]
+
+    clips = []
+    for path in paths:
+        data = Path(path).read_bytes()
+        clips.append((Path(path).name, data, clip_duration(data)))
+    return clips
+
+
+def percentile(values: list, ratio: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(len(ordered) * ratio) - 1)]
+
+
+def bench_backend(name: str, clips: list, repeat: int, language: str):
+    backend = create_backend(name)
+    try:
+        warmup = backend.start()
+        print(f"\n=== {name}（{backend.model}）啟動 {warmup:.2f}s ===")
+
+        latencies = []
+        factors = []
+        for clip_name, data, duration in clips:
+            clip_latencies = []
+            text = ""
+            for _ in range(repeat):
+                start = time.perf_counter()
+                text = backend.transcribe(io.BytesIO(data), language)
+                clip_latencies.append(time.perf_counter() - start)
+
+            latencies.extend(clip_latencies)
+            median = statistics.median(clip_latencies)
+            rtf = median / duration if duration else None
+            if rtf is not None:
+                factors.append(rtf)
+
+            rtf_text = f"RTF {rtf:.3f}" if rtf is not None else "RTF -"
+            print(f"  {clip_name:<24} median {median * 1000:9.1f} ms  {rtf_text}  「{text[:30]}」")
+
+        return {
+            "p50_ms": statistics.median(latencies) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "rtf": statistics.mean(factors) if factors else None,
+        }
+    finally:
+        backend.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default="fake", help="以逗號分隔：openai,local,fake")
+    parser.add_argument("--clips", nargs="*", default=[], help="音檔路徑")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--language", default="zh")
+    args = parser.parse_args()
+
+    clips = load_clips(args.clips)
+    print(f"音檔：{len(clips)} 段，每段重複 {args.repeat} 次")
+
+    results = {}
+    for name in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        try:
+            results[name] = bench_backend(name, clips, args.repeat, args.language)
+        except Exception as e:
+            print(f"\n=== {name} 無法執行：{e} ===")
+
+    print("\n=== 結果 ===")
+    for name, result in results.items():
+        rtf = f"{result['rtf']:.3f}" if result["rtf"] is not None else "-"
+        print(f"{name:<8} p50 {result['p50_ms']:9.1f} ms  p95 {result['p95_ms']:9.1f} ms  平均 RTF {rtf}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import os
+import secrets
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -19,6 +20,68 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 TURSO_DATABASE_URL = os.getenv("TURSO_DATABASE_URL")
 TURSO_AUTH_TOKEN = os.getenv("TURSO_AUTH_TOKEN")
 
+# Database connection pool
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_POOL_MAX_IDLE_SECONDS = float(os.getenv("DB_POOL_MAX_IDLE_SECONDS", "300"))
+DB_POOL_HEALTH_CHECK_SECONDS = float(os.getenv("DB_POOL_HEALTH_CHECK_SECONDS", "30"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "10"))
+
 # Session
 SESSION_EXPIRE_DAYS = 7
 SESSION_COOKIE_NAME = "session_id"
+SESSION_SECRET = os.getenv("SESSION_SECRET") or LINE_LOGIN_CHANNEL_SECRET
+if not SESSION_SECRET:
+    # 不可用空字串簽章（任何人都能偽造 token）：改用本行程隨機產生的金鑰
+    SESSION_SECRET = secrets.token_urlsafe(32)
+    print("警告：未設定 SESSION_SECRET 或 LINE_LOGIN_CHANNEL_SECRET，session 改用隨機金鑰簽章（重啟後需重新登入，多個 worker 之間不通用）")
+SESSION_CACHE_TTL_SECONDS = float(os.getenv("SESSION_CACHE_TTL_SECONDS", "60"))
+SESSION_CACHE_MAXSIZE = int(os.getenv("SESSION_CACHE_MAXSIZE", "10000"))
+
+# Webhook 工作佇列
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "100"))
+WEBHOOK_ENQUEUE_TIMEOUT_SECONDS = float(os.getenv("WEBHOOK_ENQUEUE_TIMEOUT_SECONDS", "2"))
+WEBHOOK_DRAIN_TIMEOUT_SECONDS = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT_SECONDS", "25"))
+
+# Webhook 事件去重
+WEBHOOK_DEDUP_TTL_HOURS = float(os.getenv("WEBHOOK_DEDUP_TTL_HOURS", "24"))
+WEBHOOK_DEDUP_MEMORY_SIZE = int(os.getenv("WEBHOOK_DEDUP_MEMORY_SIZE", "10000"))
+
+# 語音轉文字快取
+TRANSCRIPTION_CACHE_MEMORY_SIZE = int(os.getenv("TRANSCRIPTION_CACHE_MEMORY_SIZE", "512"))
+TRANSCRIPTION_CACHE_MAX_ENTRIES = int(os.getenv("TRANSCRIPTION_CACHE_MAX_ENTRIES", "20000"))
+
+# 語音處理
+VOICE_SPOOL_THRESHOLD_BYTES = int(os.getenv("VOICE_SPOOL_THRESHOLD_BYTES", str(4 * 1024 * 1024)))
+VOICE_HTTP_TIMEOUT_SECONDS = float(os.getenv("VOICE_HTTP_TIMEOUT_SECONDS", "30"))
+VOICE_HTTP_MAX_CONNECTIONS = int(os.getenv("VOICE_HTTP_MAX_CONNECTIONS", "10"))
+
+# 語音轉文字後端：openai / local / fake
+STT_BACKEND = os.getenv("STT_BACKEND", "openai")
+STT_FALLBACK_BACKEND = os.getenv("STT_FALLBACK_BACKEND", "")
+STT_LANGUAGE = os.getenv("STT_LANGUAGE", "zh")
+STT_OPENAI_MODEL = os.getenv("STT_OPENAI_MODEL", "whisper-1")
+STT_LOCAL_MODEL = os.getenv("STT_LOCAL_MODEL", "small")
+STT_LOCAL_COMPUTE_TYPE = os.getenv("STT_LOCAL_COMPUTE_TYPE", "int8")
+STT_LOCAL_CPU_THREADS = int(os.getenv("STT_LOCAL_CPU_THREADS", "0"))
+
+# 習慣名稱索引快取（文字訊息判斷是否為打卡）
+HABIT_INDEX_CACHE_TTL_SECONDS = float(os.getenv("HABIT_INDEX_CACHE_TTL_SECONDS", "300"))
+HABIT_INDEX_CACHE_MAXSIZE = int(os.getenv("HABIT_INDEX_CACHE_MAXSIZE", "10000"))
+
+# 匯出（每次從資料庫讀取的筆數；Excel 暫存檔超過此大小才寫到磁碟）
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+EXPORT_COLUMNAR_CHUNK_SIZE = int(os.getenv("EXPORT_COLUMNAR_CHUNK_SIZE", "10000"))
+EXPORT_SPOOL_THRESHOLD_BYTES = int(os.getenv("EXPORT_SPOOL_THRESHOLD_BYTES", str(8 * 1024 * 1024)))
+
+# 背景匯出工作（未設定目錄時使用暫存目錄，關閉時清除）
+EXPORT_JOB_WORKERS = int(os.getenv("EXPORT_JOB_WORKERS", "2"))
+EXPORT_ARTIFACT_DIR = os.getenv("EXPORT_ARTIFACT_DIR", "")
+EXPORT_ARTIFACT_MAX = int(os.getenv("EXPORT_ARTIFACT_MAX", "50"))
+EXPORT_ARTIFACT_TTL_SECONDS = float(os.getenv("EXPORT_ARTIFACT_TTL_SECONDS", "3600"))
+
+# 統計查詢結果快取（QUERY_CACHE_REDIS_URL 設定且安裝 redis 套件時，多個 worker 共用計算結果）
+QUERY_CACHE_MAXSIZE = int(os.getenv("QUERY_CACHE_MAXSIZE", "10000"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "600"))
+QUERY_CACHE_VERSION_TTL_SECONDS = float(os.getenv("QUERY_CACHE_VERSION_TTL_SECONDS", "10"))
+QUERY_CACHE_REDIS_URL = os.getenv("QUERY_CACHE_REDIS_URL", "")
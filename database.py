@@ -1,12 +1,42 @@
 import libsql_experimental as libsql
+import base64
+import json
 import secrets
-from datetime import datetime, timedelta
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
 from typing import Optional
-from config import TURSO_DATABASE_URL, TURSO_AUTH_TOKEN, SESSION_EXPIRE_DAYS
-
-
-def get_connection():
-    """取得資料庫連線"""
+from config import (
+    TURSO_DATABASE_URL,
+    TURSO_AUTH_TOKEN,
+    SESSION_EXPIRE_DAYS,
+    DB_POOL_SIZE,
+    DB_POOL_MAX_IDLE_SECONDS,
+    DB_POOL_HEALTH_CHECK_SECONDS,
+    DB_POOL_TIMEOUT_SECONDS,
+    SESSION_CACHE_TTL_SECONDS,
+    SESSION_CACHE_MAXSIZE,
+    HABIT_INDEX_CACHE_TTL_SECONDS,
+    HABIT_INDEX_CACHE_MAXSIZE,
+    QUERY_CACHE_MAXSIZE,
+    QUERY_CACHE_TTL_SECONDS,
+    QUERY_CACHE_VERSION_TTL_SECONDS,
+    QUERY_CACHE_REDIS_URL,
+)
+from services.cache import TTLCache
+from services.query_cache import QueryCache, create_backend
+from energy_coins import classify_energy, coins_for_amount, summarize_coins, rules_fingerprint
+from services.session_token import (
+    sign_session,
+    verify_session_token,
+    is_signed_token,
+    session_id_from_token,
+)
+
+
+def create_connection():
+    """建立新的資料庫連線（僅供連線池使用）"""
     conn = libsql.connect(
         TURSO_DATABASE_URL,
         auth_token=TURSO_AUTH_TOKEN
@@ -14,6 +44,162 @@ def get_connection():
     return conn
 
 
+class ConnectionPool:
+    """
+    資料庫連線池
+    - 重複使用連線，避免每次查詢都重新連到 Turso
+    - 閒置太久的連線會被回收
+    - 閒置一段時間後再取出的連線會先做健康檢查
+    """
+
+    def __init__(
+        self,
+        factory,
+        size: int = 5,
+        max_idle: float = 300.0,
+        health_check_interval: float = 30.0,
+        timeout: float = 10.0
+    ):
+        self._factory = factory
+        self.size = size
+        self.max_idle = max_idle
+        self.health_check_interval = health_check_interval
+        self.timeout = timeout
+
+        self._idle = []  # [(conn, last_used)]，尾端為最近歸還的連線
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except Exception:
+            return False
+
+    def _evict_idle_locked(self) -> list:
+        """移除閒置過久的連線（需持有鎖），回傳待關閉的連線"""
+        now = time.monotonic()
+        expired = [conn for conn, last_used in self._idle if now - last_used > self.max_idle]
+        if expired:
+            self._idle = [(conn, last_used) for conn, last_used in self._idle if now - last_used <= self.max_idle]
+        return expired
+
+    def acquire(self):
+        """取出一條連線，連線池已滿時等待至逾時"""
+        deadline = time.monotonic() + self.timeout
+        conn = None
+        last_used = None
+
+        with self._cond:
+            while True:
+                expired = self._evict_idle_locked()
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self._in_use < self.size:
+                    self._in_use += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("資料庫連線池已滿，等待逾時")
+                self._cond.wait(remaining)
+
+        for expired_conn in expired:
+            self._close(expired_conn)
+
+        try:
+            if conn is not None and time.monotonic() - last_used > self.health_check_interval:
+                if not self._is_healthy(conn):
+                    self._close(conn)
+                    conn = None
+            if conn is None:
+                conn = self._factory()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        return conn
+
+    def release(self, conn, discard: bool = False):
+        """歸還連線；discard=True 時直接關閉"""
+        if not discard and getattr(conn, "in_transaction", False):
+            # 沒有 commit 的交易不能帶回連線池
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+
+        if discard:
+            self._close(conn)
+
+        with self._cond:
+            self._in_use -= 1
+            if not discard:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """以 with 取用連線，離開區塊時自動歸還"""
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+        except BaseException:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def close_all(self):
+        """關閉所有閒置連線（應用程式關閉時呼叫）"""
+        with self._cond:
+            idle = self._idle
+            self._idle = []
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats(self) -> dict:
+        """取得連線池狀態"""
+        with self._cond:
+            return {
+                "size": self.size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+            }
+
+
+pool = ConnectionPool(
+    create_connection,
+    size=DB_POOL_SIZE,
+    max_idle=DB_POOL_MAX_IDLE_SECONDS,
+    health_check_interval=DB_POOL_HEALTH_CHECK_SECONDS,
+    timeout=DB_POOL_TIMEOUT_SECONDS
+)
+
+
+def get_connection():
+    """
+    從連線池取得資料庫連線
+    用法：with get_connection() as conn: ...
+    """
+    return pool.connection()
+
+
 def dict_row(cursor, row):
     """將 row 轉換為 dict"""
     if row is None:
@@ -22,210 +208,412 @@ def dict_row(cursor, row):
     return dict(zip(columns, row))
 
 
+def add_date_range(
+    conditions: list,
+    params: list,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    column: str = "created_at"
+):
+    """
+    加入日期區間條件（YYYY-MM-DD，含頭含尾）
+    改寫成半開區間 start_date <= column < end_date 隔天，
+    欄位本身不套用函式，才能使用 (user_id, created_at) 索引
+    """
+    if start_date:
+        conditions.append(f"{column} >= date(?)")
+        params.append(start_date)
+
+    if end_date:
+        conditions.append(f"{column} < date(?, '+1 day')")
+        params.append(end_date)
+
+
 def init_db():
     """初始化資料庫，建立表格"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    # 交易記錄表
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            type TEXT NOT NULL,
-            amount REAL NOT NULL,
-            category TEXT NOT NULL,
-            description TEXT,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
+        # 交易記錄表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS transactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                type TEXT NOT NULL,
+                amount REAL NOT NULL,
+                category TEXT NOT NULL,
+                description TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        # 用戶 Session 表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS user_sessions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT UNIQUE NOT NULL,
+                user_id TEXT NOT NULL,
+                display_name TEXT,
+                picture_url TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                expires_at DATETIME NOT NULL
+            )
+        """)
+
+        # 預算設定表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS budgets (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                monthly_budget REAL NOT NULL DEFAULT 0,
+                category TEXT,
+                category_budget REAL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        # 固定收支表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS recurring_transactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                type TEXT NOT NULL,
+                amount REAL NOT NULL,
+                category TEXT NOT NULL,
+                description TEXT,
+                day_of_month INTEGER NOT NULL DEFAULT 1,
+                is_active INTEGER NOT NULL DEFAULT 1,
+                last_executed DATE,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        # 習慣表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS habits (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                emoji TEXT DEFAULT '✓',
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        # 習慣打卡表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS habit_checkins (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                habit_id INTEGER NOT NULL,
+                check_date DATE NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(user_id, habit_id, check_date)
+            )
+        """)
+
+        # 建立索引
+        # (user_id, created_at) 複合索引，並涵蓋統計常用欄位，日期區間查詢不必回表
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_transactions_user_created
+            ON transactions(user_id, created_at, type, amount, category)
+        """)
+        # 單欄 user_id 索引已被複合索引取代
+        cursor.execute("""
+            DROP INDEX IF EXISTS idx_transactions_user_id
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_transactions_created_at
+            ON transactions(created_at)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_sessions_session_id
+            ON user_sessions(session_id)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_budgets_user_id
+            ON budgets(user_id)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_recurring_user_id
+            ON recurring_transactions(user_id)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_habits_user_id
+            ON habits(user_id)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_habit_checkins_user_habit
+            ON habit_checkins(user_id, habit_id)
+        """)
+
+        # 習慣的連續天數計數（打卡時增量更新）
+        cursor.execute("PRAGMA table_info(habits)")
+        habit_columns = {row[1] for row in cursor.fetchall()}
+        habit_counters_added = False
+        for column, definition in (
+            ("current_streak", "INTEGER NOT NULL DEFAULT 0"),
+            ("longest_streak", "INTEGER NOT NULL DEFAULT 0"),
+            ("last_checkin_date", "DATE"),
+        ):
+            if column not in habit_columns:
+                cursor.execute(f"ALTER TABLE habits ADD COLUMN {column} {definition}")
+                habit_counters_added = True
+
+        # 習慣每月打卡天數
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS habit_monthly_counts (
+                user_id TEXT NOT NULL,
+                habit_id INTEGER NOT NULL,
+                month TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, habit_id, month)
+            )
+        """)
+
+        if habit_counters_added:
+            _rebuild_habit_counters(cursor)
+
+        # 固定支出提醒表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS expense_reminders (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                amount REAL NOT NULL,
+                day_of_month INTEGER NOT NULL,
+                is_active INTEGER DEFAULT 1,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_expense_reminders_user_id
+            ON expense_reminders(user_id)
+        """)
 
-    # 用戶 Session 表
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS user_sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id TEXT UNIQUE NOT NULL,
-            user_id TEXT NOT NULL,
-            display_name TEXT,
-            picture_url TEXT,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            expires_at DATETIME NOT NULL
-        )
-    """)
+        # OAuth State 暫存表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS oauth_states (
+                state TEXT PRIMARY KEY,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
 
-    # 預算設定表
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS budgets (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            monthly_budget REAL NOT NULL DEFAULT 0,
-            category TEXT,
-            category_budget REAL,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
+        # 每日彙總表（統計 API 直接讀取，隨交易寫入同步更新）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS daily_user_rollups (
+                user_id TEXT NOT NULL,
+                day DATE NOT NULL,
+                type TEXT NOT NULL,
+                category TEXT NOT NULL,
+                total REAL NOT NULL DEFAULT 0,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, day, type, category)
+            )
+        """)
+
+        # 第一次建立彙總表時，從既有交易回填
+        cursor.execute("SELECT EXISTS(SELECT 1 FROM daily_user_rollups)")
+        if not cursor.fetchone()[0]:
+            _rebuild_daily_rollups(cursor)
+
+        # 能量幣明細（交易寫入時分類）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS energy_ledger (
+                transaction_id INTEGER NOT NULL,
+                user_id TEXT NOT NULL,
+                coin_type TEXT NOT NULL,
+                coins INTEGER NOT NULL,
+                amount REAL NOT NULL,
+                created_at DATETIME NOT NULL,
+                PRIMARY KEY (transaction_id, coin_type)
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_energy_ledger_user_created
+            ON energy_ledger(user_id, created_at)
+        """)
 
-    # 固定收支表
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS recurring_transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            type TEXT NOT NULL,
-            amount REAL NOT NULL,
-            category TEXT NOT NULL,
-            description TEXT,
-            day_of_month INTEGER NOT NULL DEFAULT 1,
-            is_active INTEGER NOT NULL DEFAULT 1,
-            last_executed DATE,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
+        # 能量幣累計（每用戶每幣別一列）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS energy_totals (
+                user_id TEXT NOT NULL,
+                coin_type TEXT NOT NULL,
+                amount REAL NOT NULL DEFAULT 0,
+                transaction_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, coin_type)
+            )
+        """)
+
+        # 系統設定（記錄資料版本等）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS app_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        """)
 
-    # 習慣表
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS habits (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            name TEXT NOT NULL,
-            emoji TEXT DEFAULT '✓',
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
+        # 已處理的 Webhook 事件（去除 LINE 重送造成的重複處理）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS webhook_events (
+                event_id TEXT PRIMARY KEY,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_webhook_events_created_at
+            ON webhook_events(created_at)
+        """)
 
-    # 習慣打卡表
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS habit_checkins (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            habit_id INTEGER NOT NULL,
-            check_date DATE NOT NULL,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(user_id, habit_id, check_date)
-        )
-    """)
+        # 語音轉文字快取（以音檔內容雜湊為鍵）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS transcription_cache (
+                cache_key TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                audio_size INTEGER NOT NULL DEFAULT 0,
+                hits INTEGER NOT NULL DEFAULT 0,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                last_used_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_transcription_cache_last_used
+            ON transcription_cache(last_used_at)
+        """)
 
-    # 建立索引
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_transactions_user_id
-        ON transactions(user_id)
-    """)
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_transactions_created_at
-        ON transactions(created_at)
-    """)
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_sessions_session_id
-        ON user_sessions(session_id)
-    """)
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_budgets_user_id
-        ON budgets(user_id)
-    """)
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_recurring_user_id
-        ON recurring_transactions(user_id)
-    """)
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_habits_user_id
-        ON habits(user_id)
-    """)
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_habit_checkins_user_habit
-        ON habit_checkins(user_id, habit_id)
-    """)
+        # 每個用戶的資料版本（任何資料寫入時遞增，作為 ETag 與匯出檔等快取的鍵）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS user_data_versions (
+                user_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
 
-    # 固定支出提醒表
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS expense_reminders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            name TEXT NOT NULL,
-            amount REAL NOT NULL,
-            day_of_month INTEGER NOT NULL,
-            is_active INTEGER DEFAULT 1,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_expense_reminders_user_id
-        ON expense_reminders(user_id)
-    """)
+        cursor.execute("SELECT value FROM app_meta WHERE key = 'energy_rules'")
+        row = cursor.fetchone()
+        energy_rules_changed = row is None or row[0] != rules_fingerprint()
 
-    # OAuth State 暫存表
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS oauth_states (
-            state TEXT PRIMARY KEY,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
+        conn.commit()
+
+    # 能量幣規則改變（或第一次建立明細表）時重新分類
+    if energy_rules_changed:
+        reclassify_energy_ledger()
 
-    conn.commit()
 
 
 # ============ Session 相關函式 ============
 
+# 已驗證的 session 快取（session_id -> session）
+# 登出時會立即移除；其他 worker 最多延遲 SESSION_CACHE_TTL_SECONDS 才看到撤銷
+_session_cache = TTLCache(maxsize=SESSION_CACHE_MAXSIZE, ttl=SESSION_CACHE_TTL_SECONDS)
+
 def create_session(user_id: str, display_name: str, picture_url: Optional[str] = None) -> str:
-    """建立新的 session"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    """建立新的 session，回傳帶簽章的 session token"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    session_id = secrets.token_urlsafe(32)
-    expires_at = (datetime.now() + timedelta(days=SESSION_EXPIRE_DAYS)).strftime("%Y-%m-%d %H:%M:%S")
+        session_id = secrets.token_urlsafe(32)
+        expires = datetime.now() + timedelta(days=SESSION_EXPIRE_DAYS)
+        expires_at = expires.strftime("%Y-%m-%d %H:%M:%S")
 
-    cursor.execute("""
-        INSERT INTO user_sessions (session_id, user_id, display_name, picture_url, expires_at)
-        VALUES (?, ?, ?, ?, ?)
-    """, (session_id, user_id, display_name, picture_url or "", expires_at))
+        cursor.execute("""
+            INSERT INTO user_sessions (session_id, user_id, display_name, picture_url, expires_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (session_id, user_id, display_name, picture_url or "", expires_at))
+
+        conn.commit()
 
-    conn.commit()
+    # 登入後馬上會有多個 API 請求，先放進快取
+    _cache_session({
+        "session_id": session_id,
+        "user_id": user_id,
+        "display_name": display_name,
+        "picture_url": picture_url or "",
+        "expires_at": expires_at
+    })
 
-    return session_id
+    return sign_session(session_id, user_id, int(expires.timestamp()))
+
+
+def _cache_session(session: dict):
+    """將驗證過的 session 放入快取，存活時間不超過 session 到期時間"""
+    expires = datetime.strptime(session["expires_at"], "%Y-%m-%d %H:%M:%S")
+    remaining = (expires - datetime.now()).total_seconds()
+    if remaining > 0:
+        _session_cache.set(session["session_id"], session, ttl=min(SESSION_CACHE_TTL_SECONDS, remaining))
 
 
 def get_session(session_id: str) -> Optional[dict]:
-    """取得 session 資料"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    """
+    取得 session 資料
+    帶簽章的 token 先在本機驗證簽章與到期時間，再查快取，都沒有才查資料庫
+    舊版 cookie（只有 session_id）直接查資料庫
+    """
+    token = None
+    if is_signed_token(session_id):
+        token = verify_session_token(session_id)
+        if token is None:
+            return None
+        session_id = token.session_id
+
+    cached = _session_cache.get(session_id)
+    if cached is not None:
+        return cached
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        cursor.execute("""
+            SELECT * FROM user_sessions
+            WHERE session_id = ? AND expires_at > ?
+        """, (session_id, now_str))
 
-    now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        row = cursor.fetchone()
+        result = dict_row(cursor, row)
 
-    cursor.execute("""
-        SELECT * FROM user_sessions
-        WHERE session_id = ? AND expires_at > ?
-    """, (session_id, now_str))
+    if result is None:
+        return None
 
-    row = cursor.fetchone()
-    result = dict_row(cursor, row)
+    # 簽章內的 user_id 必須與資料庫一致
+    if token is not None and token.user_id != result["user_id"]:
+        return None
+
+    _cache_session(result)
 
     return result
 
 
 def delete_session(session_id: str) -> bool:
-    """刪除 session"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    """刪除 session（同時移除快取，讓登出立即生效）"""
+    session_id = session_id_from_token(session_id)
+    _session_cache.pop(session_id)
 
-    cursor.execute("""
-        DELETE FROM user_sessions WHERE session_id = ?
-    """, (session_id,))
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    deleted = cursor.rowcount > 0
-    conn.commit()
+        cursor.execute("""
+            DELETE FROM user_sessions WHERE session_id = ?
+        """, (session_id,))
 
-    return deleted
+        deleted = cursor.rowcount > 0
+        conn.commit()
+
+        return deleted
 
 
 def cleanup_expired_sessions():
     """清理過期的 sessions"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("""
-        DELETE FROM user_sessions WHERE expires_at <= datetime('now')
-    """)
+        cursor.execute("""
+            DELETE FROM user_sessions WHERE expires_at <= datetime('now')
+        """)
 
-    conn.commit()
+        conn.commit()
 
 
 # ============ Transaction 相關函式 ============
@@ -238,36 +626,41 @@ def add_transaction(
     description: Optional[str] = None
 ) -> int:
     """新增一筆交易記錄"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("""
-        INSERT INTO transactions (user_id, type, amount, category, description)
-        VALUES (?, ?, ?, ?, ?)
-    """, (user_id, trans_type, amount, category, description))
-
-    transaction_id = cursor.lastrowid
-    conn.commit()
+        created_at = _utc_timestamp()
+        cursor.execute("""
+            INSERT INTO transactions (user_id, type, amount, category, description, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (user_id, trans_type, amount, category, description, created_at))
+
+        transaction_id = cursor.lastrowid
+        _apply_rollup(cursor, user_id, created_at, trans_type, category, amount, 1)
+        _record_energy(cursor, transaction_id, user_id, trans_type, amount, category, description)
+        _bump_data_version(cursor, user_id)
+        conn.commit()
+        query_cache.invalidate(user_id)
 
-    return transaction_id
+        return transaction_id
 
 
 def get_transactions(user_id: str, limit: int = 10) -> list:
     """取得用戶的交易記錄"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("""
-        SELECT * FROM transactions
-        WHERE user_id = ?
-        ORDER BY created_at DESC
-        LIMIT ?
-    """, (user_id, limit))
+        cursor.execute("""
+            SELECT * FROM transactions
+            WHERE user_id = ?
+            ORDER BY created_at DESC
+            LIMIT ?
+        """, (user_id, limit))
 
-    rows = cursor.fetchall()
-    result = [dict_row(cursor, row) for row in rows]
+        rows = cursor.fetchall()
+        result = [dict_row(cursor, row) for row in rows]
 
-    return result
+        return result
 
 
 def get_transactions_paginated(
@@ -280,10 +673,84 @@ def get_transactions_paginated(
     end_date: Optional[str] = None
 ) -> dict:
     """取得分頁的交易記錄"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        # 建構查詢條件
+        conditions = ["user_id = ?"]
+        params = [user_id]
+
+        if trans_type:
+            conditions.append("type = ?")
+            params.append(trans_type)
+
+        if category:
+            conditions.append("category = ?")
+            params.append(category)
+
+        add_date_range(conditions, params, start_date, end_date)
+
+        where_clause = " AND ".join(conditions)
+
+        # 計算總數
+        cursor.execute(f"""
+            SELECT COUNT(*) as total FROM transactions WHERE {where_clause}
+        """, tuple(params))
+        total_row = cursor.fetchone()
+        total = dict_row(cursor, total_row)["total"]
+
+        # 取得分頁資料
+        offset = (page - 1) * per_page
+        cursor.execute(f"""
+            SELECT * FROM transactions
+            WHERE {where_clause}
+            ORDER BY created_at DESC
+            LIMIT ? OFFSET ?
+        """, (*params, per_page, offset))
+
+        rows = cursor.fetchall()
 
-    # 建構查詢條件
+        return {
+            "items": [dict_row(cursor, row) for row in rows],
+            "total": total,
+            "page": page,
+            "per_page": per_page,
+            "total_pages": (total + per_page - 1) // per_page
+        }
+
+
+def encode_cursor(row: dict, direction: str) -> str:
+    """將 (created_at, id) 位置編碼成不透明的游標字串"""
+    payload = json.dumps({"c": row["created_at"], "i": row["id"], "d": direction}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """解析游標字串，格式錯誤時拋出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = json.loads(raw)
+        if position["d"] not in ("next", "prev"):
+            raise ValueError
+        return {"c": str(position["c"]), "i": int(position["i"]), "d": position["d"]}
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("無效的分頁游標")
+
+
+def get_transactions_by_cursor(
+    user_id: str,
+    cursor: Optional[str] = None,
+    per_page: int = 20,
+    trans_type: Optional[str] = None,
+    category: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    include_total: bool = False
+) -> dict:
+    """
+    以游標（keyset）分頁取得交易記錄，依 (created_at, id) 由新到舊
+    不使用 OFFSET，深頁的查詢成本和第一頁相同；總數只在 include_total 時提供（快取的近似值）
+    """
     conditions = ["user_id = ?"]
     params = [user_id]
 
@@ -295,56 +762,99 @@ def get_transactions_paginated(
         conditions.append("category = ?")
         params.append(category)
 
-    if start_date:
-        conditions.append("date(created_at) >= ?")
-        params.append(start_date)
+    add_date_range(conditions, params, start_date, end_date)
 
-    if end_date:
-        conditions.append("date(created_at) <= ?")
-        params.append(end_date)
+    filter_conditions = list(conditions)
+    filter_params = list(params)
+
+    direction = "next"
+    order = "DESC"
+    if cursor:
+        position = decode_cursor(cursor)
+        direction = position["d"]
+        if direction == "prev":
+            conditions.append("created_at >= ? AND (created_at > ? OR id > ?)")
+            order = "ASC"
+        else:
+            conditions.append("created_at <= ? AND (created_at < ? OR id < ?)")
+        params.extend([position["c"], position["c"], position["i"]])
 
     where_clause = " AND ".join(conditions)
 
-    # 計算總數
-    cursor.execute(f"""
-        SELECT COUNT(*) as total FROM transactions WHERE {where_clause}
-    """, params)
-    total_row = cursor.fetchone()
-    total = dict_row(cursor, total_row)["total"]
+    with get_connection() as conn:
+        db_cursor = conn.cursor()
 
-    # 取得分頁資料
-    offset = (page - 1) * per_page
-    cursor.execute(f"""
-        SELECT * FROM transactions
-        WHERE {where_clause}
-        ORDER BY created_at DESC
-        LIMIT ? OFFSET ?
-    """, params + [per_page, offset])
+        # 多取一筆判斷是否還有下一頁
+        db_cursor.execute(f"""
+            SELECT * FROM transactions
+            WHERE {where_clause}
+            ORDER BY created_at {order}, id {order}
+            LIMIT ?
+        """, (*params, per_page + 1))
 
-    rows = cursor.fetchall()
+        rows = db_cursor.fetchall()
+        items = [dict_row(db_cursor, row) for row in rows]
 
-    return {
-        "items": [dict_row(cursor, row) for row in rows],
-        "total": total,
-        "page": page,
+    has_more = len(items) > per_page
+    items = items[:per_page]
+
+    if direction == "prev":
+        items.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, cursor is not None
+
+    result = {
+        "items": items,
         "per_page": per_page,
-        "total_pages": (total + per_page - 1) // per_page
+        "next_cursor": encode_cursor(items[-1], "next") if items and has_next else None,
+        "prev_cursor": encode_cursor(items[0], "prev") if items and has_prev else None,
     }
 
+    if include_total:
+        result["total"] = _get_approximate_total(filter_conditions, filter_params)
+
+    return result
+
+
+# 篩選條件 -> 筆數，短暫快取，數字可能略為落後
+_total_cache = TTLCache(maxsize=4096, ttl=60)
+
+
+def _get_approximate_total(conditions: list, params: list) -> int:
+    """取得符合條件的交易筆數（快取的近似值）"""
+    where_clause = " AND ".join(conditions)
+    params = tuple(params)
+    cache_key = (where_clause, params)
+
+    total = _total_cache.get(cache_key)
+    if total is not None:
+        return total
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT COUNT(*) as total FROM transactions WHERE {where_clause}
+        """, params)
+        total = dict_row(cursor, cursor.fetchone())["total"]
+
+    _total_cache.set(cache_key, total)
+    return total
+
 
 def get_transaction_by_id(transaction_id: int, user_id: str) -> Optional[dict]:
     """取得單筆交易記錄"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("""
-        SELECT * FROM transactions
-        WHERE id = ? AND user_id = ?
-    """, (transaction_id, user_id))
+        cursor.execute("""
+            SELECT * FROM transactions
+            WHERE id = ? AND user_id = ?
+        """, (transaction_id, user_id))
 
-    row = cursor.fetchone()
+        row = cursor.fetchone()
 
-    return dict_row(cursor, row) if row else None
+        return dict_row(cursor, row) if row else None
 
 
 def update_transaction(
@@ -356,110 +866,305 @@ def update_transaction(
     description: Optional[str] = None
 ) -> bool:
     """更新交易記錄"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    # 先確認記錄存在且屬於該用戶
-    cursor.execute("""
-        SELECT id FROM transactions WHERE id = ? AND user_id = ?
-    """, (transaction_id, user_id))
+        # 先確認記錄存在且屬於該用戶
+        cursor.execute("""
+            SELECT type, amount, category, description, created_at FROM transactions WHERE id = ? AND user_id = ?
+        """, (transaction_id, user_id))
 
-    if not cursor.fetchone():
+        old = dict_row(cursor, cursor.fetchone())
+        if not old:
             return False
 
-    # 建構更新語句
-    updates = []
-    params = []
+        # 建構更新語句
+        updates = []
+        params = []
 
-    if trans_type is not None:
-        updates.append("type = ?")
-        params.append(trans_type)
+        if trans_type is not None:
+            updates.append("type = ?")
+            params.append(trans_type)
 
-    if amount is not None:
-        updates.append("amount = ?")
-        params.append(amount)
+        if amount is not None:
+            updates.append("amount = ?")
+            params.append(amount)
 
-    if category is not None:
-        updates.append("category = ?")
-        params.append(category)
+        if category is not None:
+            updates.append("category = ?")
+            params.append(category)
 
-    if description is not None:
-        updates.append("description = ?")
-        params.append(description)
+        if description is not None:
+            updates.append("description = ?")
+            params.append(description)
 
-    if not updates:
+        if not updates:
             return True
 
-    params.extend([transaction_id, user_id])
-    cursor.execute(f"""
-        UPDATE transactions
-        SET {", ".join(updates)}
-        WHERE id = ? AND user_id = ?
-    """, params)
-
-    conn.commit()
-    return True
+        params.extend([transaction_id, user_id])
+        cursor.execute(f"""
+            UPDATE transactions
+            SET {", ".join(updates)}
+            WHERE id = ? AND user_id = ?
+        """, tuple(params))
+
+        # 同步每日彙總：扣掉舊值、加上新值
+        new_type = trans_type if trans_type is not None else old["type"]
+        new_amount = amount if amount is not None else old["amount"]
+        new_category = category if category is not None else old["category"]
+        if (new_type, new_amount, new_category) != (old["type"], old["amount"], old["category"]):
+            _apply_rollup(cursor, user_id, old["created_at"], old["type"], old["category"], -old["amount"], -1)
+            _apply_rollup(cursor, user_id, old["created_at"], new_type, new_category, new_amount, 1)
+
+        # 重新分類能量幣
+        new_description = description if description is not None else old["description"]
+        if (new_type, new_amount, new_category, new_description) != (old["type"], old["amount"], old["category"], old["description"]):
+            _remove_energy(cursor, transaction_id, user_id)
+            _record_energy(cursor, transaction_id, user_id, new_type, new_amount, new_category, new_description)
+
+        _bump_data_version(cursor, user_id)
+        conn.commit()
+        query_cache.invalidate(user_id)
+        return True
 
 
 def delete_transaction(transaction_id: int, user_id: str) -> bool:
     """刪除交易記錄"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT type, amount, category, created_at FROM transactions WHERE id = ? AND user_id = ?
+        """, (transaction_id, user_id))
+
+        old = dict_row(cursor, cursor.fetchone())
+        if not old:
+            return False
+
+        cursor.execute("""
+            DELETE FROM transactions WHERE id = ? AND user_id = ?
+        """, (transaction_id, user_id))
+
+        deleted = cursor.rowcount > 0
+        if deleted:
+            _apply_rollup(cursor, user_id, old["created_at"], old["type"], old["category"], -old["amount"], -1)
+            _remove_energy(cursor, transaction_id, user_id)
+            _bump_data_version(cursor, user_id)
+        conn.commit()
+
+        if deleted:
+            query_cache.invalidate(user_id)
+        return deleted
 
+
+def _bump_data_version(cursor, user_id: str):
+    """
+    遞增用戶的資料版本，需與資料寫入在同一個交易中執行
+    所有會改變用戶可見資料的寫入函式都要呼叫，否則 ETag 會讓用戶端繼續使用舊資料
+    """
     cursor.execute("""
-        DELETE FROM transactions WHERE id = ? AND user_id = ?
-    """, (transaction_id, user_id))
+        INSERT INTO user_data_versions (user_id, version, updated_at)
+        VALUES (?, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT(user_id) DO UPDATE SET
+            version = version + 1,
+            updated_at = excluded.updated_at
+    """, (user_id,))
 
-    deleted = cursor.rowcount > 0
-    conn.commit()
 
-    return deleted
+def _bump_data_versions(cursor, user_id: Optional[str], source_table: str):
+    """
+    維護工作（重建、重新分類）用：遞增指定用戶，或 source_table 中所有用戶的資料版本
+    """
+    if user_id:
+        _bump_data_version(cursor, user_id)
+        return
+
+    # WHERE 1 讓 SQLite 正確解析 INSERT ... SELECT ... ON CONFLICT
+    cursor.execute(f"""
+        INSERT INTO user_data_versions (user_id, version, updated_at)
+        SELECT DISTINCT user_id, 1, CURRENT_TIMESTAMP FROM {source_table} WHERE 1
+        ON CONFLICT(user_id) DO UPDATE SET
+            version = version + 1,
+            updated_at = excluded.updated_at
+    """)
+
+
+def get_data_version(user_id: str) -> int:
+    """取得用戶目前的資料版本（從未寫入過為 0）"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT version FROM user_data_versions WHERE user_id = ?
+        """, (user_id,))
+
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+
+# 統計、分類、預算狀態的查詢結果快取，鍵含資料版本
+# 只有交易、每日彙總、預算的寫入會改變這些結果，需在 commit 後呼叫 query_cache.invalidate()；
+# 習慣、提醒等寫入也會遞增資料版本，記憶體中的版本過期後才重新計算
+query_cache = QueryCache(
+    get_data_version,
+    maxsize=QUERY_CACHE_MAXSIZE,
+    ttl=QUERY_CACHE_TTL_SECONDS,
+    version_ttl=QUERY_CACHE_VERSION_TTL_SECONDS,
+    backend=create_backend(QUERY_CACHE_REDIS_URL)
+)
 
 
 # ============ 統計相關函式 ============
+# 統計查詢讀取 daily_user_rollups（每用戶每天每分類一列），成本與天數成正比，與交易筆數無關
+
+def _utc_timestamp() -> str:
+    """
+    與 CURRENT_TIMESTAMP 相同格式的 UTC 時間
+    新增交易時寫入 created_at 並用同一個值更新每日彙總，跨午夜的寫入兩邊也會是同一天
+    """
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
 
+def _apply_rollup(
+    cursor,
+    user_id: str,
+    created_at: str,
+    trans_type: str,
+    category: str,
+    amount: float,
+    count: int
+):
+    """更新每日彙總（amount/count 為增量，可為負），需與交易寫入在同一個連線中執行"""
+    cursor.execute("""
+        INSERT INTO daily_user_rollups (user_id, day, type, category, total, count)
+        VALUES (?, date(?), ?, ?, ?, ?)
+        ON CONFLICT(user_id, day, type, category) DO UPDATE SET
+            total = total + excluded.total,
+            count = count + excluded.count
+    """, (user_id, created_at, trans_type, category, amount, count))
+
+    if count < 0:
+        cursor.execute("""
+            DELETE FROM daily_user_rollups
+            WHERE user_id = ? AND day = date(?) AND type = ? AND category = ? AND count <= 0
+        """, (user_id, created_at, trans_type, category))
+
+
+def _rebuild_daily_rollups(cursor, user_id: Optional[str] = None):
+    """從 transactions 重新計算每日彙總"""
+    where_clause = "WHERE user_id = ?" if user_id else ""
+    params = (user_id,) if user_id else ()
+
+    cursor.execute(f"DELETE FROM daily_user_rollups {where_clause}", params)
+    cursor.execute(f"""
+        INSERT INTO daily_user_rollups (user_id, day, type, category, total, count)
+        SELECT user_id, date(created_at), type, category, SUM(amount), COUNT(*)
+        FROM transactions
+        {where_clause}
+        GROUP BY user_id, date(created_at), type, category
+    """, params)
+
+
+def rebuild_daily_rollups(user_id: Optional[str] = None):
+    """重建每日彙總（不指定 user_id 時重建全部）"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        _rebuild_daily_rollups(cursor, user_id)
+        _bump_data_versions(cursor, user_id, "transactions")
+        conn.commit()
+
+    if user_id:
+        query_cache.invalidate(user_id)
+    else:
+        query_cache.invalidate_all()
+
+
+def verify_daily_rollups(user_id: Optional[str] = None) -> list:
+    """比對每日彙總與原始交易，回傳不一致的項目"""
+    where_clause = "WHERE user_id = ?" if user_id else ""
+    params = (user_id,) if user_id else ()
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute(f"""
+            SELECT user_id, date(created_at) as day, type, category, SUM(amount) as total, COUNT(*) as count
+            FROM transactions
+            {where_clause}
+            GROUP BY user_id, date(created_at), type, category
+        """, params)
+        expected = {
+            (r["user_id"], r["day"], r["type"], r["category"]): (r["total"], r["count"])
+            for r in (dict_row(cursor, row) for row in cursor.fetchall())
+        }
+
+        cursor.execute(f"""
+            SELECT user_id, day, type, category, total, count
+            FROM daily_user_rollups
+            {where_clause}
+        """, params)
+        actual = {
+            (r["user_id"], r["day"], r["type"], r["category"]): (r["total"], r["count"])
+            for r in (dict_row(cursor, row) for row in cursor.fetchall())
+        }
+
+    mismatches = []
+    for key in expected.keys() | actual.keys():
+        exp_total, exp_count = expected.get(key, (0, 0))
+        act_total, act_count = actual.get(key, (0, 0))
+        if exp_count != act_count or abs(exp_total - act_total) > 0.005:
+            mismatches.append({
+                "user_id": key[0],
+                "day": key[1],
+                "type": key[2],
+                "category": key[3],
+                "expected_total": exp_total,
+                "expected_count": exp_count,
+                "actual_total": act_total,
+                "actual_count": act_count
+            })
+
+    return mismatches
+
+
+@query_cache.cached
 def get_summary(
     user_id: str,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None
 ) -> dict:
     """取得收入支出總計"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    conditions = ["user_id = ?"]
-    params = [user_id]
+        conditions = ["user_id = ?"]
+        params = [user_id]
 
-    if start_date:
-        conditions.append("date(created_at) >= ?")
-        params.append(start_date)
+        add_date_range(conditions, params, start_date, end_date, column="day")
 
-    if end_date:
-        conditions.append("date(created_at) <= ?")
-        params.append(end_date)
+        where_clause = " AND ".join(conditions)
 
-    where_clause = " AND ".join(conditions)
+        cursor.execute(f"""
+            SELECT
+                COALESCE(SUM(CASE WHEN type = 'income' THEN total ELSE 0 END), 0) as total_income,
+                COALESCE(SUM(CASE WHEN type = 'expense' THEN total ELSE 0 END), 0) as total_expense,
+                COALESCE(SUM(count), 0) as transaction_count
+            FROM daily_user_rollups
+            WHERE {where_clause}
+        """, tuple(params))
 
-    cursor.execute(f"""
-        SELECT
-            COALESCE(SUM(CASE WHEN type = 'income' THEN amount ELSE 0 END), 0) as total_income,
-            COALESCE(SUM(CASE WHEN type = 'expense' THEN amount ELSE 0 END), 0) as total_expense,
-            COUNT(*) as transaction_count
-        FROM transactions
-        WHERE {where_clause}
-    """, params)
+        row = cursor.fetchone()
+        result = dict_row(cursor, row)
 
-    row = cursor.fetchone()
-    result = dict_row(cursor, row)
-
-    return {
-        "total_income": result["total_income"],
-        "total_expense": result["total_expense"],
-        "balance": result["total_income"] - result["total_expense"],
-        "transaction_count": result["transaction_count"]
-    }
+        return {
+            "total_income": result["total_income"],
+            "total_expense": result["total_expense"],
+            "balance": result["total_income"] - result["total_expense"],
+            "transaction_count": result["transaction_count"]
+        }
 
 
+@query_cache.cached
 def get_stats_by_category(
     user_id: str,
     trans_type: Optional[str] = None,
@@ -467,43 +1172,38 @@ def get_stats_by_category(
     end_date: Optional[str] = None
 ) -> list:
     """取得分類統計"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    conditions = ["user_id = ?"]
-    params = [user_id]
+        conditions = ["user_id = ?"]
+        params = [user_id]
 
-    if trans_type:
-        conditions.append("type = ?")
-        params.append(trans_type)
+        if trans_type:
+            conditions.append("type = ?")
+            params.append(trans_type)
 
-    if start_date:
-        conditions.append("date(created_at) >= ?")
-        params.append(start_date)
+        add_date_range(conditions, params, start_date, end_date, column="day")
 
-    if end_date:
-        conditions.append("date(created_at) <= ?")
-        params.append(end_date)
+        where_clause = " AND ".join(conditions)
 
-    where_clause = " AND ".join(conditions)
+        cursor.execute(f"""
+            SELECT
+                category,
+                type,
+                SUM(total) as total,
+                SUM(count) as count
+            FROM daily_user_rollups
+            WHERE {where_clause}
+            GROUP BY category, type
+            ORDER BY total DESC
+        """, tuple(params))
 
-    cursor.execute(f"""
-        SELECT
-            category,
-            type,
-            SUM(amount) as total,
-            COUNT(*) as count
-        FROM transactions
-        WHERE {where_clause}
-        GROUP BY category, type
-        ORDER BY total DESC
-    """, params)
+        rows = cursor.fetchall()
 
-    rows = cursor.fetchall()
-
-    return [dict_row(cursor, row) for row in rows]
+        return [dict_row(cursor, row) for row in rows]
 
 
+@query_cache.cached
 def get_stats_by_date(
     user_id: str,
     start_date: Optional[str] = None,
@@ -511,144 +1211,207 @@ def get_stats_by_date(
     group_by: str = "day"  # day, week, month
 ) -> list:
     """取得日期趨勢統計"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    conditions = ["user_id = ?"]
-    params = [user_id]
+        conditions = ["user_id = ?"]
+        params = [user_id]
 
-    if start_date:
-        conditions.append("date(created_at) >= ?")
-        params.append(start_date)
-
-    if end_date:
-        conditions.append("date(created_at) <= ?")
-        params.append(end_date)
+        add_date_range(conditions, params, start_date, end_date, column="day")
 
-    where_clause = " AND ".join(conditions)
+        where_clause = " AND ".join(conditions)
 
-    # 根據 group_by 設定日期格式
-    if group_by == "month":
-        date_format = "%Y-%m"
-    elif group_by == "week":
-        date_format = "%Y-%W"
-    else:  # day
-        date_format = "%Y-%m-%d"
+        # 根據 group_by 設定日期格式
+        if group_by == "month":
+            date_format = "%Y-%m"
+        elif group_by == "week":
+            date_format = "%Y-%W"
+        else:  # day
+            date_format = "%Y-%m-%d"
 
-    cursor.execute(f"""
-        SELECT
-            strftime('{date_format}', created_at) as date,
-            SUM(CASE WHEN type = 'income' THEN amount ELSE 0 END) as income,
-            SUM(CASE WHEN type = 'expense' THEN amount ELSE 0 END) as expense
-        FROM transactions
-        WHERE {where_clause}
-        GROUP BY strftime('{date_format}', created_at)
-        ORDER BY date ASC
-    """, params)
+        cursor.execute(f"""
+            SELECT
+                strftime('{date_format}', day) as date,
+                SUM(CASE WHEN type = 'income' THEN total ELSE 0 END) as income,
+                SUM(CASE WHEN type = 'expense' THEN total ELSE 0 END) as expense
+            FROM daily_user_rollups
+            WHERE {where_clause}
+            GROUP BY strftime('{date_format}', day)
+            ORDER BY date ASC
+        """, tuple(params))
 
-    rows = cursor.fetchall()
+        rows = cursor.fetchall()
 
-    return [dict_row(cursor, row) for row in rows]
+        return [dict_row(cursor, row) for row in rows]
 
 
+@query_cache.cached
 def get_categories(user_id: str) -> list:
     """取得用戶使用過的所有分類"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("""
-        SELECT DISTINCT category FROM transactions
-        WHERE user_id = ?
-        ORDER BY category
-    """, (user_id,))
+        cursor.execute("""
+            SELECT DISTINCT category FROM transactions
+            WHERE user_id = ?
+            ORDER BY category
+        """, (user_id,))
 
-    rows = cursor.fetchall()
+        rows = cursor.fetchall()
 
-    return [dict_row(cursor, row)["category"] for row in rows]
+        return [dict_row(cursor, row)["category"] for row in rows]
 
 
-def get_all_transactions_for_export(
+def count_transactions_for_export(
     user_id: str,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None
-) -> list:
-    """取得所有交易記錄（用於匯出）"""
-    conn = get_connection()
-    cursor = conn.cursor()
+) -> int:
+    """匯出範圍內的交易筆數（用於顯示匯出進度）"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        conditions = ["user_id = ?"]
+        params = [user_id]
+        add_date_range(conditions, params, start_date, end_date)
+        where_clause = " AND ".join(conditions)
+
+        cursor.execute(f"""
+            SELECT COUNT(*) FROM transactions WHERE {where_clause}
+        """, tuple(params))
+
+        return cursor.fetchone()[0]
 
+
+# 欄位式匯出（Parquet / Arrow）讀取的欄位；id 與 created_at 供 keyset 分頁使用
+EXPORT_COLUMNS = ("id", "created_at", "type", "category", "amount", "description")
+
+
+def _iter_export_pages(
+    user_id: str,
+    start_date: Optional[str],
+    end_date: Optional[str],
+    chunk_size: int,
+    columns: tuple
+):
+    """
+    以 (created_at, id) 做 keyset 分頁，每次產出 (欄位名稱, 原始 row 列表)
+    每批只借用連線池的連線一次，不會因為下載端讀得慢而長時間佔用連線，
+    記憶體用量與總筆數無關
+    """
     conditions = ["user_id = ?"]
     params = [user_id]
+    add_date_range(conditions, params, start_date, end_date)
+    where_clause = " AND ".join(conditions)
+    select_clause = ", ".join(columns) if columns else "*"
 
-    if start_date:
-        conditions.append("date(created_at) >= ?")
-        params.append(start_date)
+    cursor_key = None
+    while True:
+        keyset_clause = ""
+        keyset_params = ()
+        if cursor_key:
+            # 寫成 created_at <= ? 才能用 (user_id, created_at) 索引做範圍查詢
+            keyset_clause = "AND created_at <= ? AND (created_at < ? OR id < ?)"
+            keyset_params = (cursor_key[0], cursor_key[0], cursor_key[1])
 
-    if end_date:
-        conditions.append("date(created_at) <= ?")
-        params.append(end_date)
+        with get_connection() as conn:
+            cursor = conn.cursor()
 
-    where_clause = " AND ".join(conditions)
+            cursor.execute(f"""
+                SELECT {select_clause} FROM transactions
+                WHERE {where_clause} {keyset_clause}
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            """, (*params, *keyset_params, chunk_size))
 
-    cursor.execute(f"""
-        SELECT * FROM transactions
-        WHERE {where_clause}
-        ORDER BY created_at DESC
-    """, params)
+            names = [col[0] for col in cursor.description]
+            rows = cursor.fetchall()
+
+        if not rows:
+            return
+
+        yield names, rows
+
+        if len(rows) < chunk_size:
+            return
+        last = dict(zip(names, rows[-1]))
+        cursor_key = (last["created_at"], last["id"])
+
+
+def iter_transactions_for_export(
+    user_id: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    chunk_size: int = 1000
+):
+    """分批取得交易記錄（用於串流匯出），每次產出一批 dict"""
+    for names, rows in _iter_export_pages(user_id, start_date, end_date, chunk_size, ()):
+        yield [dict(zip(names, row)) for row in rows]
 
-    rows = cursor.fetchall()
 
-    return [dict_row(cursor, row) for row in rows]
+def iter_transaction_columns_for_export(
+    user_id: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    chunk_size: int = 10000
+):
+    """分批取得交易記錄的欄位資料（用於 Parquet / Arrow 匯出），每次產出 {欄位: 值列表}"""
+    for names, rows in _iter_export_pages(user_id, start_date, end_date, chunk_size, EXPORT_COLUMNS):
+        yield dict(zip(names, map(list, zip(*rows))))
 
 
 # ============ 預算相關函式 ============
 
 def get_budget(user_id: str) -> Optional[dict]:
     """取得用戶的預算設定"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("""
-        SELECT * FROM budgets
-        WHERE user_id = ? AND category IS NULL
-    """, (user_id,))
+        cursor.execute("""
+            SELECT * FROM budgets
+            WHERE user_id = ? AND category IS NULL
+        """, (user_id,))
 
-    row = cursor.fetchone()
+        row = cursor.fetchone()
 
-    return dict_row(cursor, row) if row else None
+        return dict_row(cursor, row) if row else None
 
 
 def set_budget(user_id: str, monthly_budget: float) -> int:
     """設定每月總預算"""
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    # 檢查是否已有預算設定
-    cursor.execute("""
-        SELECT id FROM budgets WHERE user_id = ? AND category IS NULL
-    """, (user_id,))
-
-    existing_row = cursor.fetchone()
-    existing = dict_row(cursor, existing_row) if existing_row else None
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    if existing:
-        cursor.execute("""
-            UPDATE budgets
-            SET monthly_budget = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        """, (monthly_budget, existing["id"]))
-        budget_id = existing["id"]
-    else:
+        # 檢查是否已有預算設定
         cursor.execute("""
-            INSERT INTO budgets (user_id, monthly_budget)
-            VALUES (?, ?)
-        """, (user_id, monthly_budget))
-        budget_id = cursor.lastrowid
+            SELECT id FROM budgets WHERE user_id = ? AND category IS NULL
+        """, (user_id,))
+
+        existing_row = cursor.fetchone()
+        existing = dict_row(cursor, existing_row) if existing_row else None
+
+        if existing:
+            cursor.execute("""
+                UPDATE budgets
+                SET monthly_budget = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (monthly_budget, existing["id"]))
+            budget_id = existing["id"]
+        else:
+            cursor.execute("""
+                INSERT INTO budgets (user_id, monthly_budget)
+                VALUES (?, ?)
+            """, (user_id, monthly_budget))
+            budget_id = cursor.lastrowid
 
-    conn.commit()
+        _bump_data_version(cursor, user_id)
+        conn.commit()
+        query_cache.invalidate(user_id)
 
-    return budget_id
+        return budget_id
 
 
+@query_cache.cached
 def get_budget_status(user_id: str) -> dict:
     """取得預算使用狀況"""
     # 取得預算設定
@@ -686,463 +1449,894 @@ def add_recurring_transaction(
     day_of_month: int = 1
 ) -> int:
     """新增固定收支"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("""
-        INSERT INTO recurring_transactions
-        (user_id, type, amount, category, description, day_of_month)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (user_id, trans_type, amount, category, description, day_of_month))
+        cursor.execute("""
+            INSERT INTO recurring_transactions
+            (user_id, type, amount, category, description, day_of_month)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (user_id, trans_type, amount, category, description, day_of_month))
 
-    recurring_id = cursor.lastrowid
-    conn.commit()
+        recurring_id = cursor.lastrowid
+        _bump_data_version(cursor, user_id)
+        conn.commit()
 
-    return recurring_id
+        return recurring_id
 
 
 def get_recurring_transactions(user_id: str) -> list:
     """取得用戶的固定收支列表"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("""
-        SELECT * FROM recurring_transactions
-        WHERE user_id = ? AND is_active = 1
-        ORDER BY day_of_month ASC
-    """, (user_id,))
+        cursor.execute("""
+            SELECT * FROM recurring_transactions
+            WHERE user_id = ? AND is_active = 1
+            ORDER BY day_of_month ASC
+        """, (user_id,))
+
+        rows = cursor.fetchall()
+
+        return [dict_row(cursor, row) for row in rows]
 
-    rows = cursor.fetchall()
 
-    return [dict_row(cursor, row) for row in rows]
+def get_recurring_transaction_by_id(recurring_id: int, user_id: str) -> Optional[dict]:
+    """取得單筆固定收支"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT * FROM recurring_transactions
+            WHERE id = ? AND user_id = ?
+        """, (recurring_id, user_id))
+
+        row = cursor.fetchone()
+
+        return dict_row(cursor, row) if row else None
+
+
+def update_recurring_transaction(
+    recurring_id: int,
+    user_id: str,
+    trans_type: Optional[str] = None,
+    amount: Optional[float] = None,
+    category: Optional[str] = None,
+    description: Optional[str] = None,
+    day_of_month: Optional[int] = None,
+    is_active: Optional[int] = None
+) -> bool:
+    """更新固定收支"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        # 確認記錄存在
+        cursor.execute("""
+            SELECT id FROM recurring_transactions WHERE id = ? AND user_id = ?
+        """, (recurring_id, user_id))
+
+        if not cursor.fetchone():
+            return False
+
+        updates = []
+        params = []
+
+        if trans_type is not None:
+            updates.append("type = ?")
+            params.append(trans_type)
+        if amount is not None:
+            updates.append("amount = ?")
+            params.append(amount)
+        if category is not None:
+            updates.append("category = ?")
+            params.append(category)
+        if description is not None:
+            updates.append("description = ?")
+            params.append(description)
+        if day_of_month is not None:
+            updates.append("day_of_month = ?")
+            params.append(day_of_month)
+        if is_active is not None:
+            updates.append("is_active = ?")
+            params.append(is_active)
+
+        if not updates:
+            return True
+
+        params.extend([recurring_id, user_id])
+        cursor.execute(f"""
+            UPDATE recurring_transactions
+            SET {", ".join(updates)}
+            WHERE id = ? AND user_id = ?
+        """, tuple(params))
+
+        _bump_data_version(cursor, user_id)
+        conn.commit()
+        return True
+
+
+def delete_recurring_transaction(recurring_id: int, user_id: str) -> bool:
+    """刪除固定收支"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            DELETE FROM recurring_transactions WHERE id = ? AND user_id = ?
+        """, (recurring_id, user_id))
+
+        deleted = cursor.rowcount > 0
+        if deleted:
+            _bump_data_version(cursor, user_id)
+        conn.commit()
+
+        return deleted
+
+
+def execute_recurring_transactions():
+    """執行今天應該執行的固定收支（由排程呼叫）"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        today = datetime.now()
+        today_str = today.strftime("%Y-%m-%d")
+        day_of_month = today.day
+
+        # 找出今天要執行的固定收支
+        cursor.execute("""
+            SELECT * FROM recurring_transactions
+            WHERE is_active = 1
+            AND day_of_month = ?
+            AND (last_executed IS NULL OR last_executed < ?)
+        """, (day_of_month, today_str))
+
+        rows = cursor.fetchall()
+        # 先轉換所有 rows 為 dict
+        rows_dict = [dict_row(cursor, row) for row in rows]
+        executed_count = 0
+
+        for row in rows_dict:
+            # 新增交易
+            description = f"[固定] {row['description'] or row['category']}"
+            created_at = _utc_timestamp()
+            cursor.execute("""
+                INSERT INTO transactions (user_id, type, amount, category, description, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (row["user_id"], row["type"], row["amount"], row["category"], description, created_at))
+            transaction_id = cursor.lastrowid
+            _apply_rollup(cursor, row["user_id"], created_at, row["type"], row["category"], row["amount"], 1)
+            _record_energy(cursor, transaction_id, row["user_id"], row["type"], row["amount"], row["category"], description)
+            _bump_data_version(cursor, row["user_id"])
+
+            # 更新最後執行日期
+            cursor.execute("""
+                UPDATE recurring_transactions
+                SET last_executed = ?
+                WHERE id = ?
+            """, (today_str, row["id"]))
+
+            executed_count += 1
+
+        conn.commit()
+
+        for user_id in {row["user_id"] for row in rows_dict}:
+            query_cache.invalidate(user_id)
+
+        return executed_count
+
+
+# ============ 能量幣相關函式 ============
+
+def _record_energy(
+    cursor,
+    transaction_id: int,
+    user_id: str,
+    trans_type: str,
+    amount: float,
+    category: str,
+    description: Optional[str]
+):
+    """分類一筆交易並寫入能量幣明細與累計，需與交易寫入在同一個連線中執行"""
+    for coin_type in classify_energy(trans_type, category, description):
+        cursor.execute("""
+            INSERT INTO energy_ledger (transaction_id, user_id, coin_type, coins, amount, created_at)
+            SELECT id, user_id, ?, ?, amount, created_at FROM transactions WHERE id = ?
+        """, (coin_type, coins_for_amount(amount), transaction_id))
+        _apply_energy_total(cursor, user_id, coin_type, amount, 1)
+
 
+def _remove_energy(cursor, transaction_id: int, user_id: str):
+    """移除一筆交易的能量幣明細並扣回累計"""
+    cursor.execute("""
+        SELECT coin_type, amount FROM energy_ledger WHERE transaction_id = ?
+    """, (transaction_id,))
+    entries = cursor.fetchall()
 
-def get_recurring_transaction_by_id(recurring_id: int, user_id: str) -> Optional[dict]:
-    """取得單筆固定收支"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    if not entries:
+        return
 
     cursor.execute("""
-        SELECT * FROM recurring_transactions
-        WHERE id = ? AND user_id = ?
-    """, (recurring_id, user_id))
+        DELETE FROM energy_ledger WHERE transaction_id = ?
+    """, (transaction_id,))
+    for coin_type, amount in entries:
+        _apply_energy_total(cursor, user_id, coin_type, -amount, -1)
 
-    row = cursor.fetchone()
 
-    return dict_row(cursor, row) if row else None
+def _apply_energy_total(cursor, user_id: str, coin_type: str, amount: float, count: int):
+    """更新能量幣累計（增量）"""
+    cursor.execute("""
+        INSERT INTO energy_totals (user_id, coin_type, amount, transaction_count)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(user_id, coin_type) DO UPDATE SET
+            amount = amount + excluded.amount,
+            transaction_count = transaction_count + excluded.transaction_count
+    """, (user_id, coin_type, amount, count))
 
 
-def update_recurring_transaction(
-    recurring_id: int,
+def get_energy_summary(
     user_id: str,
-    trans_type: Optional[str] = None,
-    amount: Optional[float] = None,
-    category: Optional[str] = None,
-    description: Optional[str] = None,
-    day_of_month: Optional[int] = None,
-    is_active: Optional[int] = None
-) -> bool:
-    """更新固定收支"""
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    # 確認記錄存在
-    cursor.execute("""
-        SELECT id FROM recurring_transactions WHERE id = ? AND user_id = ?
-    """, (recurring_id, user_id))
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+) -> dict:
+    """取得能量幣統計（無日期區間時直接讀累計表）"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    if not cursor.fetchone():
-            return False
+        if start_date or end_date:
+            conditions = ["user_id = ?"]
+            params = [user_id]
 
-    updates = []
-    params = []
+            add_date_range(conditions, params, start_date, end_date)
 
-    if trans_type is not None:
-        updates.append("type = ?")
-        params.append(trans_type)
-    if amount is not None:
-        updates.append("amount = ?")
-        params.append(amount)
-    if category is not None:
-        updates.append("category = ?")
-        params.append(category)
-    if description is not None:
-        updates.append("description = ?")
-        params.append(description)
-    if day_of_month is not None:
-        updates.append("day_of_month = ?")
-        params.append(day_of_month)
-    if is_active is not None:
-        updates.append("is_active = ?")
-        params.append(is_active)
-
-    if not updates:
-            return True
+            where_clause = " AND ".join(conditions)
 
-    params.extend([recurring_id, user_id])
-    cursor.execute(f"""
-        UPDATE recurring_transactions
-        SET {", ".join(updates)}
-        WHERE id = ? AND user_id = ?
-    """, params)
+            cursor.execute(f"""
+                SELECT coin_type, SUM(amount) as amount, COUNT(*) as transaction_count
+                FROM energy_ledger
+                WHERE {where_clause}
+                GROUP BY coin_type
+            """, tuple(params))
+        else:
+            cursor.execute("""
+                SELECT coin_type, amount, transaction_count
+                FROM energy_totals
+                WHERE user_id = ?
+            """, (user_id,))
 
-    conn.commit()
-    return True
+        rows = cursor.fetchall()
 
+    totals = {coin_type: (amount, count) for coin_type, amount, count in rows}
+    return summarize_coins(totals)
 
-def delete_recurring_transaction(recurring_id: int, user_id: str) -> bool:
-    """刪除固定收支"""
-    conn = get_connection()
-    cursor = conn.cursor()
 
-    cursor.execute("""
-        DELETE FROM recurring_transactions WHERE id = ? AND user_id = ?
-    """, (recurring_id, user_id))
+def get_energy_history(user_id: str, coin_type: str = "all", limit: int = 20) -> list:
+    """取得能量幣相關交易記錄（每筆交易只列出優先順序最高的幣別）"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    deleted = cursor.rowcount > 0
-    conn.commit()
+        conditions = ["l.user_id = ?", "l.coins > 0"]
+        params = [user_id]
 
-    return deleted
+        if coin_type != "all":
+            conditions.append("l.coin_type = ?")
+            params.append(coin_type)
 
+        where_clause = " AND ".join(conditions)
 
-def execute_recurring_transactions():
-    """執行今天應該執行的固定收支（由排程呼叫）"""
-    conn = get_connection()
-    cursor = conn.cursor()
+        # 同一筆交易最多兩種幣別（金幣 + 銀幣），多取一倍再去重
+        cursor.execute(f"""
+            SELECT t.*, l.coin_type as coin_type, l.coins as coins
+            FROM energy_ledger l
+            JOIN transactions t ON t.id = l.transaction_id
+            WHERE {where_clause}
+            ORDER BY l.created_at DESC, l.transaction_id DESC,
+                     CASE l.coin_type WHEN 'gold' THEN 0 WHEN 'silver' THEN 1 ELSE 2 END
+            LIMIT ?
+        """, (*params, limit * 2))
 
-    today = datetime.now()
-    today_str = today.strftime("%Y-%m-%d")
-    day_of_month = today.day
+        rows = [dict_row(cursor, row) for row in cursor.fetchall()]
 
-    # 找出今天要執行的固定收支
-    cursor.execute("""
-        SELECT * FROM recurring_transactions
-        WHERE is_active = 1
-        AND day_of_month = ?
-        AND (last_executed IS NULL OR last_executed < ?)
-    """, (day_of_month, today_str))
+    result = []
+    seen = set()
+    for row in rows:
+        if row["id"] in seen:
+            continue
+        seen.add(row["id"])
 
-    rows = cursor.fetchall()
-    # 先轉換所有 rows 為 dict
-    rows_dict = [dict_row(cursor, row) for row in rows]
-    executed_count = 0
+        row["coin"] = {"type": row.pop("coin_type"), "amount": row.pop("coins")}
+        result.append(row)
 
-    for row in rows_dict:
-        # 新增交易
-        cursor.execute("""
-            INSERT INTO transactions (user_id, type, amount, category, description)
-            VALUES (?, ?, ?, ?, ?)
-        """, (row["user_id"], row["type"], row["amount"], row["category"],
-              f"[固定] {row['description'] or row['category']}"))
+        if len(result) >= limit:
+            break
 
-        # 更新最後執行日期
-        cursor.execute("""
-            UPDATE recurring_transactions
-            SET last_executed = ?
-            WHERE id = ?
-        """, (today_str, row["id"]))
+    return result
 
-        executed_count += 1
 
-    conn.commit()
+def reclassify_energy_ledger(user_id: Optional[str] = None, chunk_size: int = 1000) -> int:
+    """
+    依目前的關鍵字規則重新分類所有交易（關鍵字清單改變時執行）
+    回傳寫入的明細筆數
+    """
+    scope_clause = "WHERE user_id = ?" if user_id else ""
+    scope_params = (user_id,) if user_id else ()
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute(f"DELETE FROM energy_ledger {scope_clause}", scope_params)
+        cursor.execute(f"DELETE FROM energy_totals {scope_clause}", scope_params)
+
+        written = 0
+        last_id = 0
+        while True:
+            cursor.execute(f"""
+                SELECT id, user_id, type, amount, category, description, created_at
+                FROM transactions
+                WHERE id > ? {"AND user_id = ?" if user_id else ""}
+                ORDER BY id
+                LIMIT ?
+            """, (last_id, *scope_params, chunk_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            entries = [
+                (trans_id, row_user_id, coin_type, coins_for_amount(amount), amount, created_at)
+                for trans_id, row_user_id, trans_type, amount, category, description, created_at in rows
+                for coin_type in classify_energy(trans_type, category, description)
+            ]
+            if entries:
+                cursor.executemany("""
+                    INSERT INTO energy_ledger (transaction_id, user_id, coin_type, coins, amount, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, entries)
+                written += len(entries)
+
+            last_id = rows[-1][0]
+
+        cursor.execute(f"""
+            INSERT INTO energy_totals (user_id, coin_type, amount, transaction_count)
+            SELECT user_id, coin_type, SUM(amount), COUNT(*)
+            FROM energy_ledger
+            {scope_clause}
+            GROUP BY user_id, coin_type
+        """, scope_params)
+
+        if not user_id:
+            cursor.execute("""
+                INSERT INTO app_meta (key, value) VALUES ('energy_rules', ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value
+            """, (rules_fingerprint(),))
+
+        _bump_data_versions(cursor, user_id, "transactions")
+        conn.commit()
 
-    return executed_count
+    return written
 
 
 # ============ 習慣打卡相關函式 ============
 
+# 每位用戶的習慣名稱索引（判斷文字訊息是否為打卡），建立/修改/刪除習慣時清除
+# 其他 worker 最多延遲 HABIT_INDEX_CACHE_TTL_SECONDS 才看到變更
+_habit_index_cache = TTLCache(maxsize=HABIT_INDEX_CACHE_MAXSIZE, ttl=HABIT_INDEX_CACHE_TTL_SECONDS)
+
+
+def get_habit_index(user_id: str) -> dict:
+    """取得用戶的所有習慣，以名稱為鍵（有快取）"""
+    index = _habit_index_cache.get(user_id)
+    if index is None:
+        index = {habit["name"]: habit for habit in get_habits(user_id)}
+        _habit_index_cache.set(user_id, index)
+    return index
+
+
 def create_habit(user_id: str, name: str, emoji: str = '✓') -> int:
     """建立新習慣"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("""
-        INSERT INTO habits (user_id, name, emoji)
-        VALUES (?, ?, ?)
-    """, (user_id, name, emoji))
+        cursor.execute("""
+            INSERT INTO habits (user_id, name, emoji)
+            VALUES (?, ?, ?)
+        """, (user_id, name, emoji))
 
-    habit_id = cursor.lastrowid
-    conn.commit()
+        habit_id = cursor.lastrowid
+        _bump_data_version(cursor, user_id)
+        conn.commit()
 
+    _habit_index_cache.pop(user_id)
     return habit_id
 
 
 def get_habits(user_id: str) -> list:
     """取得用戶的所有習慣"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("""
-        SELECT * FROM habits
-        WHERE user_id = ?
-        ORDER BY created_at ASC
-    """, (user_id,))
+        cursor.execute("""
+            SELECT * FROM habits
+            WHERE user_id = ?
+            ORDER BY created_at ASC
+        """, (user_id,))
 
-    rows = cursor.fetchall()
+        rows = cursor.fetchall()
 
-    return [dict_row(cursor, row) for row in rows]
+        return [dict_row(cursor, row) for row in rows]
 
 
 def get_habit_by_id(habit_id: int, user_id: str) -> Optional[dict]:
     """取得單一習慣"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("""
-        SELECT * FROM habits
-        WHERE id = ? AND user_id = ?
-    """, (habit_id, user_id))
+        cursor.execute("""
+            SELECT * FROM habits
+            WHERE id = ? AND user_id = ?
+        """, (habit_id, user_id))
 
-    row = cursor.fetchone()
+        row = cursor.fetchone()
 
-    return dict_row(cursor, row) if row else None
+        return dict_row(cursor, row) if row else None
 
 
 def get_habit_by_name(user_id: str, name: str) -> Optional[dict]:
     """根據名稱取得習慣"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("""
-        SELECT * FROM habits
-        WHERE user_id = ? AND name = ?
-    """, (user_id, name))
+        cursor.execute("""
+            SELECT * FROM habits
+            WHERE user_id = ? AND name = ?
+        """, (user_id, name))
 
-    row = cursor.fetchone()
+        row = cursor.fetchone()
 
-    return dict_row(cursor, row) if row else None
+        return dict_row(cursor, row) if row else None
 
 
 def update_habit(habit_id: int, user_id: str, name: str = None, emoji: str = None) -> bool:
     """更新習慣"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    updates = []
-    params = []
+        updates = []
+        params = []
 
-    if name is not None:
-        updates.append("name = ?")
-        params.append(name)
-    if emoji is not None:
-        updates.append("emoji = ?")
-        params.append(emoji)
+        if name is not None:
+            updates.append("name = ?")
+            params.append(name)
+        if emoji is not None:
+            updates.append("emoji = ?")
+            params.append(emoji)
 
-    if not updates:
+        if not updates:
             return True
 
-    params.extend([habit_id, user_id])
-    cursor.execute(f"""
-        UPDATE habits
-        SET {", ".join(updates)}
-        WHERE id = ? AND user_id = ?
-    """, params)
+        params.extend([habit_id, user_id])
+        cursor.execute(f"""
+            UPDATE habits
+            SET {", ".join(updates)}
+            WHERE id = ? AND user_id = ?
+        """, tuple(params))
 
-    updated = cursor.rowcount > 0
-    conn.commit()
+        updated = cursor.rowcount > 0
+        _bump_data_version(cursor, user_id)
+        conn.commit()
 
+    _habit_index_cache.pop(user_id)
     return updated
 
 
 def delete_habit(habit_id: int, user_id: str) -> bool:
     """刪除習慣（同時刪除打卡記錄）"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    # 刪除打卡記錄
-    cursor.execute("""
-        DELETE FROM habit_checkins WHERE habit_id = ? AND user_id = ?
-    """, (habit_id, user_id))
+        # 刪除打卡記錄與每月計數
+        cursor.execute("""
+            DELETE FROM habit_checkins WHERE habit_id = ? AND user_id = ?
+        """, (habit_id, user_id))
+        cursor.execute("""
+            DELETE FROM habit_monthly_counts WHERE habit_id = ? AND user_id = ?
+        """, (habit_id, user_id))
 
-    # 刪除習慣
-    cursor.execute("""
-        DELETE FROM habits WHERE id = ? AND user_id = ?
-    """, (habit_id, user_id))
+        # 刪除習慣
+        cursor.execute("""
+            DELETE FROM habits WHERE id = ? AND user_id = ?
+        """, (habit_id, user_id))
 
-    deleted = cursor.rowcount > 0
-    conn.commit()
+        deleted = cursor.rowcount > 0
+        if deleted:
+            _bump_data_version(cursor, user_id)
+        conn.commit()
 
+    _habit_index_cache.pop(user_id)
     return deleted
 
 
 def checkin_habit(user_id: str, habit_id: int, check_date: str = None) -> bool:
-    """習慣打卡"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    """習慣打卡（同時更新連續天數與每月計數）"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    if check_date is None:
-        check_date = datetime.now().strftime("%Y-%m-%d")
+        if check_date is None:
+            check_date = datetime.now().strftime("%Y-%m-%d")
 
-    try:
         cursor.execute("""
-            INSERT INTO habit_checkins (user_id, habit_id, check_date)
+            INSERT OR IGNORE INTO habit_checkins (user_id, habit_id, check_date)
             VALUES (?, ?, ?)
         """, (user_id, habit_id, check_date))
+
+        if cursor.rowcount == 0:
+            # 已經打卡過了：不更新連續天數與每月計數
+            return False
+
+        _apply_checkin(cursor, user_id, habit_id, check_date)
+        _bump_data_version(cursor, user_id)
         conn.commit()
-        success = True
-    except Exception:
-        # 已經打卡過了
-        success = False
 
-    return success
+        return True
 
 
 def uncheckin_habit(user_id: str, habit_id: int, check_date: str = None) -> bool:
-    """取消習慣打卡"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    """取消習慣打卡（同時更新連續天數與每月計數）"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        if check_date is None:
+            check_date = datetime.now().strftime("%Y-%m-%d")
+
+        cursor.execute("""
+            DELETE FROM habit_checkins
+            WHERE user_id = ? AND habit_id = ? AND check_date = ?
+        """, (user_id, habit_id, check_date))
+
+        deleted = cursor.rowcount > 0
+        if deleted:
+            _apply_uncheckin(cursor, user_id, habit_id, check_date)
+            _bump_data_version(cursor, user_id)
+        conn.commit()
+
+        return deleted
+
+
+def _run_length(cursor, user_id: str, habit_id: int, start_date: str, step: str) -> int:
+    """
+    從 start_date（含）往 step 方向（'-1 day' / '+1 day'）連續打卡的天數
+    沿唯一索引逐日查找，成本與該段連續天數成正比
+    """
+    cursor.execute("""
+        WITH RECURSIVE run(check_date) AS (
+            SELECT check_date FROM habit_checkins
+            WHERE user_id = ? AND habit_id = ? AND check_date = ?
+
+            UNION ALL
+
+            SELECT c.check_date
+            FROM run r
+            JOIN habit_checkins c
+                ON c.user_id = ? AND c.habit_id = ? AND c.check_date = date(r.check_date, ?)
+        )
+        SELECT COUNT(*) FROM run
+    """, (user_id, habit_id, start_date, user_id, habit_id, step))
+    return cursor.fetchone()[0]
+
+
+def _longest_run(cursor, user_id: str, habit_id: int) -> int:
+    """全部打卡記錄中最長的連續天數（連續日期的 julianday - 序號相同）"""
+    cursor.execute("""
+        SELECT COALESCE(MAX(run), 0) FROM (
+            SELECT COUNT(*) as run FROM (
+                SELECT julianday(check_date) - ROW_NUMBER() OVER (ORDER BY check_date) as grp
+                FROM habit_checkins
+                WHERE user_id = ? AND habit_id = ?
+            )
+            GROUP BY grp
+        )
+    """, (user_id, habit_id))
+    return cursor.fetchone()[0]
+
+
+def _apply_monthly_count(cursor, user_id: str, habit_id: int, check_date: str, delta: int):
+    cursor.execute("""
+        INSERT INTO habit_monthly_counts (user_id, habit_id, month, count)
+        VALUES (?, ?, substr(?, 1, 7), ?)
+        ON CONFLICT(user_id, habit_id, month) DO UPDATE SET
+            count = count + excluded.count
+    """, (user_id, habit_id, check_date, delta))
+
+
+def _apply_checkin(cursor, user_id: str, habit_id: int, check_date: str):
+    """
+    新增一筆打卡後更新計數（與打卡寫入在同一個交易中）
+    current_streak 是「以 last_checkin_date 結尾」的連續天數；補打卡可能把兩段連續區間接起來
+    """
+    cursor.execute("""
+        SELECT current_streak, longest_streak, last_checkin_date FROM habits
+        WHERE id = ? AND user_id = ?
+    """, (habit_id, user_id))
+    row = cursor.fetchone()
+    if not row:
+        return
+    current, longest, last = row
+
+    before = _run_length(cursor, user_id, habit_id, _shift_date(check_date, -1), '-1 day')
+    after = _run_length(cursor, user_id, habit_id, _shift_date(check_date, 1), '+1 day')
+    merged = before + 1 + after
+
+    if last is None or check_date > last:
+        last, current = check_date, before + 1
+    elif _shift_date(check_date, after) == last:
+        # 新的打卡與最後一段連續區間相接
+        current = merged
+
+    cursor.execute("""
+        UPDATE habits
+        SET current_streak = ?, longest_streak = ?, last_checkin_date = ?
+        WHERE id = ? AND user_id = ?
+    """, (current, max(longest, merged), last, habit_id, user_id))
+
+    _apply_monthly_count(cursor, user_id, habit_id, check_date, 1)
+
+
+def _apply_uncheckin(cursor, user_id: str, habit_id: int, check_date: str):
+    """取消一筆打卡後更新計數（與刪除在同一個交易中）"""
+    cursor.execute("""
+        SELECT current_streak, longest_streak, last_checkin_date FROM habits
+        WHERE id = ? AND user_id = ?
+    """, (habit_id, user_id))
+    row = cursor.fetchone()
+    if not row:
+        return
+    current, longest, last = row
+
+    before = _run_length(cursor, user_id, habit_id, _shift_date(check_date, -1), '-1 day')
+    after = _run_length(cursor, user_id, habit_id, _shift_date(check_date, 1), '+1 day')
+
+    if check_date == last:
+        cursor.execute("""
+            SELECT MAX(check_date) FROM habit_checkins
+            WHERE user_id = ? AND habit_id = ?
+        """, (user_id, habit_id))
+        last = cursor.fetchone()[0]
+        current = before if last == _shift_date(check_date, -1) else (
+            _run_length(cursor, user_id, habit_id, last, '-1 day') if last else 0
+        )
+    elif last and _shift_date(check_date, after) == last:
+        # 最後一段連續區間從中間斷開
+        current = after
+
+    # 只有刪除的日期屬於最長的那段時，最長紀錄才可能變短
+    if before + 1 + after >= longest:
+        longest = _longest_run(cursor, user_id, habit_id)
 
-    if check_date is None:
-        check_date = datetime.now().strftime("%Y-%m-%d")
+    cursor.execute("""
+        UPDATE habits
+        SET current_streak = ?, longest_streak = ?, last_checkin_date = ?
+        WHERE id = ? AND user_id = ?
+    """, (current, longest, last, habit_id, user_id))
 
+    _apply_monthly_count(cursor, user_id, habit_id, check_date, -1)
     cursor.execute("""
-        DELETE FROM habit_checkins
-        WHERE user_id = ? AND habit_id = ? AND check_date = ?
+        DELETE FROM habit_monthly_counts
+        WHERE user_id = ? AND habit_id = ? AND month = substr(?, 1, 7) AND count <= 0
     """, (user_id, habit_id, check_date))
 
-    deleted = cursor.rowcount > 0
-    conn.commit()
 
-    return deleted
+def _shift_date(check_date: str, days: int) -> str:
+    return (datetime.strptime(check_date, "%Y-%m-%d") + timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+def _rebuild_habit_counters(cursor, user_id: Optional[str] = None):
+    """從打卡記錄重新計算連續天數與每月計數"""
+    scope_clause = "WHERE user_id = ?" if user_id else ""
+    scope_params = (user_id,) if user_id else ()
+
+    cursor.execute(f"DELETE FROM habit_monthly_counts {scope_clause}", scope_params)
+    cursor.execute(f"""
+        INSERT INTO habit_monthly_counts (user_id, habit_id, month, count)
+        SELECT user_id, habit_id, substr(check_date, 1, 7), COUNT(*)
+        FROM habit_checkins
+        {scope_clause}
+        GROUP BY user_id, habit_id, substr(check_date, 1, 7)
+    """, scope_params)
+
+    cursor.execute(f"SELECT id, user_id FROM habits {scope_clause}", scope_params)
+    for habit_id, habit_user_id in cursor.fetchall():
+        cursor.execute("""
+            SELECT MAX(check_date) FROM habit_checkins
+            WHERE user_id = ? AND habit_id = ?
+        """, (habit_user_id, habit_id))
+        last = cursor.fetchone()[0]
+        current = _run_length(cursor, habit_user_id, habit_id, last, '-1 day') if last else 0
+        longest = _longest_run(cursor, habit_user_id, habit_id)
+
+        cursor.execute("""
+            UPDATE habits
+            SET current_streak = ?, longest_streak = ?, last_checkin_date = ?
+            WHERE id = ?
+        """, (current, longest, last, habit_id))
+
+
+def rebuild_habit_counters(user_id: Optional[str] = None):
+    """重建習慣連續天數與每月計數（全部或指定用戶）"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        _rebuild_habit_counters(cursor, user_id)
+        _bump_data_versions(cursor, user_id, "habits")
+        conn.commit()
 
 
 def get_habit_checkins(user_id: str, habit_id: int, start_date: str = None, end_date: str = None) -> list:
     """取得習慣的打卡記錄"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    conditions = ["user_id = ?", "habit_id = ?"]
-    params = [user_id, habit_id]
+        conditions = ["user_id = ?", "habit_id = ?"]
+        params = [user_id, habit_id]
 
-    if start_date:
-        conditions.append("check_date >= ?")
-        params.append(start_date)
+        if start_date:
+            conditions.append("check_date >= ?")
+            params.append(start_date)
 
-    if end_date:
-        conditions.append("check_date <= ?")
-        params.append(end_date)
+        if end_date:
+            conditions.append("check_date <= ?")
+            params.append(end_date)
 
-    where_clause = " AND ".join(conditions)
+        where_clause = " AND ".join(conditions)
 
-    cursor.execute(f"""
-        SELECT check_date FROM habit_checkins
-        WHERE {where_clause}
-        ORDER BY check_date DESC
-    """, params)
+        cursor.execute(f"""
+            SELECT check_date FROM habit_checkins
+            WHERE {where_clause}
+            ORDER BY check_date DESC
+        """, tuple(params))
 
-    rows = cursor.fetchall()
+        rows = cursor.fetchall()
 
-    return [dict_row(cursor, row)["check_date"] for row in rows]
+        return [dict_row(cursor, row)["check_date"] for row in rows]
 
 
 def get_today_checkins(user_id: str) -> list:
     """取得今日所有習慣的打卡狀態"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    today = datetime.now().strftime("%Y-%m-%d")
+        today = datetime.now().strftime("%Y-%m-%d")
 
-    cursor.execute("""
-        SELECT h.*,
-               CASE WHEN c.id IS NOT NULL THEN 1 ELSE 0 END as checked
-        FROM habits h
-        LEFT JOIN habit_checkins c
-            ON h.id = c.habit_id AND c.check_date = ? AND c.user_id = h.user_id
-        WHERE h.user_id = ?
-        ORDER BY h.created_at ASC
-    """, (today, user_id))
+        cursor.execute("""
+            SELECT h.*,
+                   CASE WHEN c.id IS NOT NULL THEN 1 ELSE 0 END as checked
+            FROM habits h
+            LEFT JOIN habit_checkins c
+                ON h.id = c.habit_id AND c.check_date = ? AND c.user_id = h.user_id
+            WHERE h.user_id = ?
+            ORDER BY h.created_at ASC
+        """, (today, user_id))
+
+        rows = cursor.fetchall()
+
+        return [dict_row(cursor, row) for row in rows]
+
+
+def _current_streak(cursor, user_id: str, habit: dict, today: str, yesterday: str) -> int:
+    """
+    由儲存的計數推算目前連續天數：最後打卡是今天或昨天時連續仍有效，否則為 0
+    有未來日期的打卡（補打錯日期）時才沿索引從今天／昨天往前數
+    """
+    last = habit.get("last_checkin_date")
+    if not last or last < yesterday:
+        return 0
+    if last <= today:
+        return habit.get("current_streak") or 0
+
+    habit_id = habit["id"]
+    return (
+        _run_length(cursor, user_id, habit_id, today, '-1 day')
+        or _run_length(cursor, user_id, habit_id, yesterday, '-1 day')
+    )
 
-    rows = cursor.fetchall()
 
-    return [dict_row(cursor, row) for row in rows]
+def _today_and_yesterday() -> tuple:
+    today = datetime.now().date()
+    return today.isoformat(), (today - timedelta(days=1)).isoformat()
 
 
 def get_habit_streak(user_id: str, habit_id: int) -> int:
-    """計算連續打卡天數"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    """取得連續打卡天數（今天尚未打卡時從昨天起算）"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("""
-        SELECT check_date FROM habit_checkins
-        WHERE user_id = ? AND habit_id = ?
-        ORDER BY check_date DESC
-    """, (user_id, habit_id))
+        cursor.execute("""
+            SELECT id, current_streak, last_checkin_date FROM habits
+            WHERE id = ? AND user_id = ?
+        """, (habit_id, user_id))
 
-    rows = cursor.fetchall()
-    rows_dict = [dict_row(cursor, row) for row in rows]
+        row = cursor.fetchone()
+        if not row:
+            return 0
 
-    if not rows_dict:
-        return 0
+        today, yesterday = _today_and_yesterday()
+        return _current_streak(cursor, user_id, dict_row(cursor, row), today, yesterday)
 
-    streak = 0
-    today = datetime.now().date()
 
-    for row in rows_dict:
-        check_date = datetime.strptime(row["check_date"], "%Y-%m-%d").date()
-        expected_date = today - timedelta(days=streak)
+def get_habits_with_streaks(user_id: str) -> list:
+    """一次取得所有習慣、今日打卡狀態與連續天數"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-        # 允許今天還沒打卡的情況
-        if streak == 0 and check_date == today - timedelta(days=1):
-            expected_date = today - timedelta(days=1)
+        today, yesterday = _today_and_yesterday()
+        cursor.execute("""
+            SELECT h.*,
+                   CASE WHEN t.id IS NOT NULL THEN 1 ELSE 0 END as checked
+            FROM habits h
+            LEFT JOIN habit_checkins t
+                ON t.user_id = h.user_id AND t.habit_id = h.id AND t.check_date = ?
+            WHERE h.user_id = ?
+            ORDER BY h.created_at ASC
+        """, (today, user_id))
 
-        if check_date == expected_date:
-            streak += 1
-        elif streak == 0 and check_date == today:
-            streak += 1
-        else:
-            break
+        habits = [dict_row(cursor, row) for row in cursor.fetchall()]
+        for habit in habits:
+            habit["streak"] = _current_streak(cursor, user_id, habit, today, yesterday)
 
-    return streak
+        return habits
 
 
 def get_habit_stats(user_id: str, habit_id: int, year: int = None, month: int = None) -> dict:
     """取得習慣統計"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    if year is None:
-        year = datetime.now().year
-    if month is None:
-        month = datetime.now().month
+        if year is None:
+            year = datetime.now().year
+        if month is None:
+            month = datetime.now().month
 
-    # 計算該月的天數
-    if month == 12:
-        next_month = datetime(year + 1, 1, 1)
-    else:
-        next_month = datetime(year, month + 1, 1)
-    days_in_month = (next_month - datetime(year, month, 1)).days
-
-    start_date = f"{year}-{month:02d}-01"
-    end_date = f"{year}-{month:02d}-{days_in_month:02d}"
-
-    # 取得該月打卡天數
-    cursor.execute("""
-        SELECT COUNT(*) as count FROM habit_checkins
-        WHERE user_id = ? AND habit_id = ? AND check_date >= ? AND check_date <= ?
-    """, (user_id, habit_id, start_date, end_date))
+        # 計算該月的天數
+        if month == 12:
+            next_month = datetime(year + 1, 1, 1)
+        else:
+            next_month = datetime(year, month + 1, 1)
+        days_in_month = (next_month - datetime(year, month, 1)).days
 
-    row = cursor.fetchone()
-    result = dict_row(cursor, row)
+        # 取得該月打卡天數（每月計數表）
+        cursor.execute("""
+            SELECT count FROM habit_monthly_counts
+            WHERE user_id = ? AND habit_id = ? AND month = ?
+        """, (user_id, habit_id, f"{year}-{month:02d}"))
 
-    checked_days = result["count"]
+        row = cursor.fetchone()
+        checked_days = row[0] if row else 0
 
-    # 計算到今天為止的天數（如果是當月）
-    today = datetime.now()
-    if year == today.year and month == today.month:
-        days_passed = today.day
-    else:
-        days_passed = days_in_month
+        # 連續天數（習慣上儲存的計數）
+        cursor.execute("""
+            SELECT id, current_streak, longest_streak, last_checkin_date FROM habits
+            WHERE id = ? AND user_id = ?
+        """, (habit_id, user_id))
+        row = cursor.fetchone()
+        habit = dict_row(cursor, row) if row else {"id": habit_id}
+        today_str, yesterday_str = _today_and_yesterday()
+        streak = _current_streak(cursor, user_id, habit, today_str, yesterday_str)
+
+        # 計算到今天為止的天數（如果是當月）
+        today = datetime.now()
+        if year == today.year and month == today.month:
+            days_passed = today.day
+        else:
+            days_passed = days_in_month
 
-    completion_rate = (checked_days / days_passed * 100) if days_passed > 0 else 0
+        completion_rate = (checked_days / days_passed * 100) if days_passed > 0 else 0
 
-    return {
-        "year": year,
-        "month": month,
-        "checked_days": checked_days,
-        "days_in_month": days_in_month,
-        "days_passed": days_passed,
-        "completion_rate": round(completion_rate, 1)
-    }
+        return {
+            "year": year,
+            "month": month,
+            "checked_days": checked_days,
+            "days_in_month": days_in_month,
+            "days_passed": days_passed,
+            "completion_rate": round(completion_rate, 1),
+            "streak": streak,
+            "longest_streak": habit.get("longest_streak") or 0,
+            "last_checkin_date": habit.get("last_checkin_date")
+        }
 
 
 # ============ 固定支出提醒相關函式 ============
@@ -1154,49 +2348,50 @@ def create_expense_reminder(
     day_of_month: int
 ) -> int:
     """建立固定支出提醒"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("""
-        INSERT INTO expense_reminders (user_id, name, amount, day_of_month)
-        VALUES (?, ?, ?, ?)
-    """, (user_id, name, amount, day_of_month))
+        cursor.execute("""
+            INSERT INTO expense_reminders (user_id, name, amount, day_of_month)
+            VALUES (?, ?, ?, ?)
+        """, (user_id, name, amount, day_of_month))
 
-    reminder_id = cursor.lastrowid
-    conn.commit()
+        reminder_id = cursor.lastrowid
+        _bump_data_version(cursor, user_id)
+        conn.commit()
 
-    return reminder_id
+        return reminder_id
 
 
 def get_expense_reminders(user_id: str) -> list:
     """取得用戶的所有固定支出提醒"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("""
-        SELECT * FROM expense_reminders
-        WHERE user_id = ? AND is_active = 1
-        ORDER BY day_of_month ASC
-    """, (user_id,))
+        cursor.execute("""
+            SELECT * FROM expense_reminders
+            WHERE user_id = ? AND is_active = 1
+            ORDER BY day_of_month ASC
+        """, (user_id,))
 
-    rows = cursor.fetchall()
+        rows = cursor.fetchall()
 
-    return [dict_row(cursor, row) for row in rows]
+        return [dict_row(cursor, row) for row in rows]
 
 
 def get_expense_reminder_by_id(reminder_id: int, user_id: str) -> Optional[dict]:
     """取得單筆固定支出提醒"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("""
-        SELECT * FROM expense_reminders
-        WHERE id = ? AND user_id = ?
-    """, (reminder_id, user_id))
+        cursor.execute("""
+            SELECT * FROM expense_reminders
+            WHERE id = ? AND user_id = ?
+        """, (reminder_id, user_id))
 
-    row = cursor.fetchone()
+        row = cursor.fetchone()
 
-    return dict_row(cursor, row) if row else None
+        return dict_row(cursor, row) if row else None
 
 
 def update_expense_reminder(
@@ -1208,112 +2403,225 @@ def update_expense_reminder(
     is_active: Optional[int] = None
 ) -> bool:
     """更新固定支出提醒"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    # 確認記錄存在
-    cursor.execute("""
-        SELECT id FROM expense_reminders WHERE id = ? AND user_id = ?
-    """, (reminder_id, user_id))
+        # 確認記錄存在
+        cursor.execute("""
+            SELECT id FROM expense_reminders WHERE id = ? AND user_id = ?
+        """, (reminder_id, user_id))
 
-    if not cursor.fetchone():
+        if not cursor.fetchone():
             return False
 
-    updates = []
-    params = []
-
-    if name is not None:
-        updates.append("name = ?")
-        params.append(name)
-    if amount is not None:
-        updates.append("amount = ?")
-        params.append(amount)
-    if day_of_month is not None:
-        updates.append("day_of_month = ?")
-        params.append(day_of_month)
-    if is_active is not None:
-        updates.append("is_active = ?")
-        params.append(is_active)
-
-    if not updates:
+        updates = []
+        params = []
+
+        if name is not None:
+            updates.append("name = ?")
+            params.append(name)
+        if amount is not None:
+            updates.append("amount = ?")
+            params.append(amount)
+        if day_of_month is not None:
+            updates.append("day_of_month = ?")
+            params.append(day_of_month)
+        if is_active is not None:
+            updates.append("is_active = ?")
+            params.append(is_active)
+
+        if not updates:
             return True
 
-    params.extend([reminder_id, user_id])
-    cursor.execute(f"""
-        UPDATE expense_reminders
-        SET {", ".join(updates)}
-        WHERE id = ? AND user_id = ?
-    """, params)
+        params.extend([reminder_id, user_id])
+        cursor.execute(f"""
+            UPDATE expense_reminders
+            SET {", ".join(updates)}
+            WHERE id = ? AND user_id = ?
+        """, tuple(params))
 
-    conn.commit()
-    return True
+        _bump_data_version(cursor, user_id)
+        conn.commit()
+        return True
 
 
 def delete_expense_reminder(reminder_id: int, user_id: str) -> bool:
     """刪除固定支出提醒"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("""
-        DELETE FROM expense_reminders WHERE id = ? AND user_id = ?
-    """, (reminder_id, user_id))
+        cursor.execute("""
+            DELETE FROM expense_reminders WHERE id = ? AND user_id = ?
+        """, (reminder_id, user_id))
 
-    deleted = cursor.rowcount > 0
-    conn.commit()
+        deleted = cursor.rowcount > 0
+        if deleted:
+            _bump_data_version(cursor, user_id)
+        conn.commit()
 
-    return deleted
+        return deleted
 
 
 # ============ OAuth State 相關函式 ============
 
 def save_oauth_state(state: str) -> bool:
     """儲存 OAuth state"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("""
+                INSERT INTO oauth_states (state) VALUES (?)
+            """, (state,))
+            conn.commit()
+            return True
+        except Exception:
+            return False
 
-    try:
+
+def verify_oauth_state(state: str) -> bool:
+    """驗證並刪除 OAuth state"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        # 先檢查是否存在
+        cursor.execute("""
+            SELECT state FROM oauth_states WHERE state = ?
+        """, (state,))
+
+        row = cursor.fetchone()
+        if not row:
+            return False
+
+        # 刪除已使用的 state
         cursor.execute("""
-            INSERT INTO oauth_states (state) VALUES (?)
+            DELETE FROM oauth_states WHERE state = ?
         """, (state,))
         conn.commit()
+
         return True
-    except Exception:
-        return False
 
 
-def verify_oauth_state(state: str) -> bool:
-    """驗證並刪除 OAuth state"""
-    conn = get_connection()
-    cursor = conn.cursor()
+def cleanup_expired_states():
+    """清理超過 10 分鐘的 state"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    # 先檢查是否存在
-    cursor.execute("""
-        SELECT state FROM oauth_states WHERE state = ?
-    """, (state,))
+        cursor.execute("""
+            DELETE FROM oauth_states
+            WHERE created_at < datetime('now', '-10 minutes')
+        """)
+        conn.commit()
 
-    row = cursor.fetchone()
-    if not row:
-        return False
 
-    # 刪除已使用的 state
-    cursor.execute("""
-        DELETE FROM oauth_states WHERE state = ?
-    """, (state,))
-    conn.commit()
+# ============ Webhook 事件相關函式 ============
+
+def claim_webhook_event(event_id: str) -> bool:
+    """
+    登記一個 Webhook 事件，第一次登記回傳 True，已處理過（重送）回傳 False
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            INSERT OR IGNORE INTO webhook_events (event_id) VALUES (?)
+        """, (event_id,))
+        conn.commit()
 
-    return True
+        return cursor.rowcount > 0
 
 
-def cleanup_expired_states():
-    """清理超過 10 分鐘的 state"""
-    conn = get_connection()
-    cursor = conn.cursor()
+def release_webhook_event(event_id: str) -> bool:
+    """處理失敗時取消登記，讓 LINE 重送時可以重新處理"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("""
-        DELETE FROM oauth_states
-        WHERE created_at < datetime('now', '-10 minutes')
-    """)
-    conn.commit()
+        cursor.execute("""
+            DELETE FROM webhook_events WHERE event_id = ?
+        """, (event_id,))
+        conn.commit()
+
+        return cursor.rowcount > 0
+
+
+def cleanup_webhook_events(ttl_hours: float) -> int:
+    """清理超過保存時間的 Webhook 事件記錄"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            DELETE FROM webhook_events
+            WHERE created_at < datetime('now', ?)
+        """, (f"-{ttl_hours} hours",))
+        conn.commit()
+
+        return cursor.rowcount
+
+
+# ============ 語音轉文字快取相關函式 ============
+
+def get_cached_transcription(cache_key: str) -> Optional[str]:
+    """取得快取的轉文字結果（只讀取；命中次數與使用時間由 touch_transcriptions 批次更新）"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT text FROM transcription_cache WHERE cache_key = ?
+        """, (cache_key,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+
+def touch_transcriptions(hits: dict):
+    """批次更新命中次數與使用時間（hits：cache_key -> 命中次數）"""
+    if not hits:
+        return
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.executemany("""
+            UPDATE transcription_cache
+            SET hits = hits + ?, last_used_at = CURRENT_TIMESTAMP
+            WHERE cache_key = ?
+        """, [(count, cache_key) for cache_key, count in hits.items()])
+        conn.commit()
+
+
+def save_transcription(cache_key: str, text: str, audio_size: int, max_entries: int) -> int:
+    """
+    儲存轉文字結果；超過 max_entries 筆時淘汰最久未使用的項目
+    依筆數而非位元組淘汰：每筆只存轉出的文字（語音訊息通常數十到數百字），
+    筆數上限即大致決定了資料表大小
+    回傳淘汰的筆數
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            INSERT INTO transcription_cache (cache_key, text, audio_size)
+            VALUES (?, ?, ?)
+            ON CONFLICT(cache_key) DO UPDATE SET
+                text = excluded.text,
+                last_used_at = CURRENT_TIMESTAMP
+        """, (cache_key, text, audio_size))
+
+        cursor.execute("SELECT COUNT(*) FROM transcription_cache")
+        overflow = cursor.fetchone()[0] - max_entries
+        evicted = 0
+        if overflow > 0:
+            cursor.execute("""
+                DELETE FROM transcription_cache
+                WHERE cache_key IN (
+                    SELECT cache_key FROM transcription_cache
+                    ORDER BY last_used_at ASC
+                    LIMIT ?
+                )
+            """, (overflow,))
+            evicted = cursor.rowcount
+
+        conn.commit()
+        return evicted
 
 
 # 初始化資料庫
@@ -0,0 +1,77 @@
+"""
+能量幣分類規則
+- 金幣：還債/還貸款/還錢 - 每100元 = 1金幣
+- 銀幣：捐款 - 每100元 = 1銀幣
+- 銅幣：打工收入 - 每100元 = 1銅幣
+交易寫入時分類一次，結果存在 energy_ledger，讀取時不必再掃描全部交易
+"""
+import hashlib
+import json
+from keyword_matcher import KeywordMatcher
+
+# 關鍵字定義
+GOLD_KEYWORDS = ['還債', '還貸', '還款', '還錢', '償還', '貸款', '債務', '借款', '還清']
+SILVER_KEYWORDS = ['捐款', '捐贈', '慈善', '公益', '愛心', '捐助', '樂捐']
+COPPER_KEYWORDS = ['打工', '兼職', '時薪', '工讀', '臨時工', '零工', '外快', '副業']
+
+# 幣別規則（依優先順序）：(幣別, 交易類型, 關鍵字)
+COIN_RULES = [
+    ('gold', 'expense', GOLD_KEYWORDS),
+    ('silver', 'expense', SILVER_KEYWORDS),
+    ('copper', 'income', COPPER_KEYWORDS),
+]
+
+COIN_MATCHER = KeywordMatcher([(coin_type, keywords) for coin_type, _, keywords in COIN_RULES])
+COIN_TRANS_TYPES = {coin_type: rule_type for coin_type, rule_type, _ in COIN_RULES}
+
+
+def coins_for_amount(amount: float) -> int:
+    """每100元 = 1幣"""
+    return int(amount // 100)
+
+
+def classify_energy(trans_type: str, category: str, description: str) -> list:
+    """
+    判斷一筆交易可得的能量幣種類
+    一筆支出可能同時符合金幣與銀幣，回傳符合的幣別列表（依優先順序）
+    """
+    combined = (category or '').lower() + ' ' + (description or '').lower()
+
+    return [
+        coin_type
+        for coin_type in COIN_MATCHER.all_matches(combined)
+        if COIN_TRANS_TYPES[coin_type] == trans_type
+    ]
+
+
+def summarize_coins(totals: dict) -> dict:
+    """
+    將各幣別累計金額與筆數整理成 API 回傳格式
+    totals: {coin_type: (amount, transaction_count)}
+    """
+    gold_amount, gold_count = totals.get('gold', (0, 0))
+    silver_amount, silver_count = totals.get('silver', (0, 0))
+    copper_amount, copper_count = totals.get('copper', (0, 0))
+
+    gold = coins_for_amount(gold_amount)
+    silver = coins_for_amount(silver_amount)
+    copper = coins_for_amount(copper_amount)
+
+    return {
+        'gold': gold,
+        'silver': silver,
+        'copper': copper,
+        'gold_amount': gold_amount,
+        'silver_amount': silver_amount,
+        'copper_amount': copper_amount,
+        'total_coins': gold + silver + copper,
+        'gold_transactions_count': gold_count,
+        'silver_transactions_count': silver_count,
+        'copper_transactions_count': copper_count,
+    }
+
+
+def rules_fingerprint() -> str:
+    """分類規則的指紋，關鍵字改變時需要重新分類"""
+    payload = json.dumps(COIN_RULES, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
@@ -0,0 +1,88 @@
+"""
+多關鍵字比對（Aho–Corasick）
+一次掃描文字即可找出所有命中的關鍵字群組，供記帳分類與能量幣分類共用
+"""
+from collections import deque
+from typing import Hashable, Iterable, Optional
+
+
+class KeywordMatcher:
+    """
+    將多組關鍵字編譯成 Aho–Corasick 自動機
+    groups 依優先順序排列：[(標籤, [關鍵字, ...]), ...]
+    比對結果以位元遮罩表示，第 i 組命中則第 i 個位元為 1
+    """
+
+    def __init__(self, groups: Iterable[tuple[Hashable, Iterable[str]]]):
+        self.labels = []
+        goto = [{}]      # 狀態 -> {字元: 下一個狀態}
+        outputs = [0]    # 狀態 -> 命中群組的位元遮罩
+
+        for index, (label, keywords) in enumerate(groups):
+            self.labels.append(label)
+            for keyword in keywords:
+                if not keyword:
+                    continue
+                state = 0
+                for char in keyword:
+                    next_state = goto[state].get(char)
+                    if next_state is None:
+                        next_state = len(goto)
+                        goto[state][char] = next_state
+                        goto.append({})
+                        outputs.append(0)
+                    state = next_state
+                outputs[state] |= 1 << index
+
+        # 以 BFS 建立失敗連結，並把轉移補成完整的 DFA（掃描時每個字元只查一次表）
+        fail = [0] * len(goto)
+        transitions = [dict(edges) for edges in goto]
+        queue = deque(goto[0].values())
+
+        while queue:
+            state = queue.popleft()
+            outputs[state] |= outputs[fail[state]]
+            for char, next_state in goto[state].items():
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                target = goto[fallback].get(char, 0)
+                fail[next_state] = target if target != next_state else 0
+                queue.append(next_state)
+
+            # 沒有直接轉移的字元，沿用失敗狀態的轉移
+            for char, target in transitions[fail[state]].items():
+                transitions[state].setdefault(char, target)
+
+        self._transitions = transitions
+        self._outputs = outputs
+
+    def scan(self, text: str) -> int:
+        """掃描文字，回傳所有命中群組的位元遮罩"""
+        transitions = self._transitions
+        outputs = self._outputs
+        state = 0
+        mask = 0
+
+        for char in text:
+            state = transitions[state].get(char, 0)
+            mask |= outputs[state]
+
+        return mask
+
+    def first_match(self, text: str) -> Optional[Hashable]:
+        """回傳優先順序最高的命中群組標籤，沒有命中時回傳 None"""
+        mask = self.scan(text)
+        if not mask:
+            return None
+        return self.labels[(mask & -mask).bit_length() - 1]
+
+    def all_matches(self, text: str) -> list:
+        """回傳所有命中群組的標籤（依優先順序）"""
+        mask = self.scan(text)
+        labels = []
+        while mask:
+            lowest = mask & -mask
+            labels.append(self.labels[lowest.bit_length() - 1])
+            mask ^= lowest
+        return labels
@@ -0,0 +1,299 @@
+"""
+LINE 文字訊息指令路由
+1. 完全相符的指令（使用說明、今日收支...）查表
+2. 前綴指令（新增習慣、打卡）依序比對
+3. 用戶的習慣名稱索引（有快取）判斷補打卡／直接打卡
+4. 其餘文字直接交給記帳解析，不需要任何習慣查詢
+"""
+import re
+from datetime import date, datetime, timedelta
+from typing import Callable, Optional
+
+from parser import parse_transaction
+
+WEB_URL = "https://line-voice-accounting.onrender.com"
+
+# 補打卡日期格式：M/D、MM/DD、YYYY/M/D + 習慣名稱
+DATED_CHECKIN_PATTERN = re.compile(r'^(\d{4}/)?(\d{1,2})/(\d{1,2})\s+(.+)$')
+
+# 補打卡相對日期：前綴 -> 往前天數（前綴同時作為顯示文字）
+RELATIVE_DAYS = {
+    "昨天": 1,
+    "前天": 2,
+}
+
+
+# ============ 完全相符的指令 ============
+
+def show_help(user_id: str, text: str) -> str:
+    """使用說明"""
+    return (
+        f"📝 語音記帳使用說明\n"
+        f"━━━━━━━━━━━━━━\n"
+        f"【記帳方式】\n"
+        f"• 語音：直接說「午餐 150」\n"
+        f"• 文字：輸入「午餐 150」\n"
+        f"• 收入：輸入「收入 薪水 50000」\n\n"
+        f"【查看記錄】\n"
+        f"• 輸入「今日收支」\n"
+        f"• 網頁版：\n"
+        f"line-voice-accounting.onrender.com"
+    )
+
+
+def show_today_summary(user_id: str, text: str) -> str:
+    """今日收支查詢"""
+    from database import get_summary
+
+    today = date.today().isoformat()
+    summary = get_summary(user_id, start_date=today, end_date=today)
+
+    return (
+        f"📊 今日收支報告\n"
+        f"━━━━━━━━━━━━━━\n"
+        f"💰 收入：${summary['total_income']:,.0f}\n"
+        f"💸 支出：${summary['total_expense']:,.0f}\n"
+        f"━━━━━━━━━━━━━━\n"
+        f"📈 結餘：${summary['balance']:,.0f}\n"
+        f"📝 筆數：{summary['transaction_count']} 筆\n\n"
+        f"🌐 查看更多：\n"
+        f"{WEB_URL}"
+    )
+
+
+def show_energy_coins(user_id: str, text: str) -> str:
+    """能量幣查詢"""
+    from routers.energy import get_user_energy_coins
+
+    coins = get_user_energy_coins(user_id)
+
+    return (
+        f"✨ 能量幣報告\n"
+        f"━━━━━━━━━━━━━━\n"
+        f"🥇 金幣：{coins['gold']} 枚\n"
+        f"   └ 還債累計 ${coins['gold_amount']:,.0f}\n"
+        f"🥈 銀幣：{coins['silver']} 枚\n"
+        f"   └ 捐款累計 ${coins['silver_amount']:,.0f}\n"
+        f"🥉 銅幣：{coins['copper']} 枚\n"
+        f"   └ 打工累計 ${coins['copper_amount']:,.0f}\n"
+        f"━━━━━━━━━━━━━━\n"
+        f"🏆 總能量幣：{coins['total_coins']} 枚\n\n"
+        f"🌐 查看詳情：\n"
+        f"{WEB_URL}/static/energy.html"
+    )
+
+
+def show_habits(user_id: str, text: str) -> str:
+    """習慣查詢"""
+    from database import get_habits_with_streaks
+
+    habits_status = get_habits_with_streaks(user_id)
+
+    if not habits_status:
+        return (
+            f"📋 習慣追蹤\n"
+            f"━━━━━━━━━━━━━━\n"
+            f"尚未建立任何習慣\n\n"
+            f"輸入「新增習慣 打拳」來建立\n"
+            f"或到網頁版管理習慣：\n"
+            f"{WEB_URL}/static/habits.html"
+        )
+
+    lines = ["📋 今日習慣\n━━━━━━━━━━━━━━"]
+    for h in habits_status:
+        status = "✅" if h["checked"] else "⬜"
+        streak = h["streak"]
+        streak_text = f" 🔥{streak}天" if streak > 0 else ""
+        lines.append(f"{status} {h['emoji']} {h['name']}{streak_text}")
+
+    lines.append(f"\n輸入習慣名稱即可打卡")
+    lines.append(f"例如：打拳")
+    return "\n".join(lines)
+
+
+# ============ 前綴指令 ============
+
+def add_habit(user_id: str, text: str) -> str:
+    """新增習慣"""
+    from database import create_habit, get_habit_index
+
+    habit_name = text.replace("新增習慣", "").strip()
+
+    if not habit_name:
+        return "請輸入習慣名稱\n例如：新增習慣 打拳"
+    if habit_name in get_habit_index(user_id):
+        return f"「{habit_name}」習慣已存在"
+
+    create_habit(user_id, habit_name)
+    return (
+        f"✅ 習慣建立成功！\n\n"
+        f"習慣名稱：{habit_name}\n\n"
+        f"輸入「{habit_name}」即可打卡"
+    )
+
+
+def checkin_by_command(user_id: str, text: str) -> str:
+    """打卡 習慣名稱"""
+    from database import checkin_habit, get_habit_index, get_habit_streak
+
+    habit_name = text.replace("打卡 ", "").strip()
+    habit = get_habit_index(user_id).get(habit_name)
+
+    if not habit:
+        return f"找不到「{habit_name}」習慣\n\n輸入「習慣」查看所有習慣"
+
+    success = checkin_habit(user_id, habit["id"])
+    streak = get_habit_streak(user_id, habit["id"])
+
+    if success:
+        return (
+            f"✅ {habit['emoji']} {habit_name} 打卡成功！\n\n"
+            f"🔥 連續 {streak} 天\n\n"
+            f"繼續保持！💪"
+        )
+    return f"今天「{habit_name}」已經打卡過了！\n\n🔥 連續 {streak} 天"
+
+
+# 完全相符：文字 -> 處理函式
+EXACT_COMMANDS: dict[str, Callable[[str, str], str]] = {
+    "使用說明": show_help,
+    "今日收支": show_today_summary,
+    "能量幣": show_energy_coins,
+    "習慣": show_habits,
+}
+
+# 前綴：依序比對第一個符合的
+PREFIX_COMMANDS: list[tuple[str, Callable[[str, str], str]]] = [
+    ("新增習慣", add_habit),
+    ("打卡 ", checkin_by_command),
+]
+
+
+# ============ 習慣打卡與記帳 ============
+
+def parse_dated_checkin(text: str) -> Optional[tuple[str, str, str]]:
+    """
+    解析補打卡格式，回傳 (習慣名稱, 日期 YYYY-MM-DD, 顯示文字)
+    支援：昨天/前天 + 習慣、M/D、MM/DD、YYYY/M/D + 習慣
+    """
+    for prefix, days in RELATIVE_DAYS.items():
+        if text.startswith(prefix):
+            habit_name = text.replace(prefix, "").strip()
+            check_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+            return habit_name, check_date, prefix
+
+    date_match = DATED_CHECKIN_PATTERN.match(text)
+    if not date_match:
+        return None
+
+    year = int(date_match.group(1)[:-1]) if date_match.group(1) else datetime.now().year
+    month = int(date_match.group(2))
+    day = int(date_match.group(3))
+    check_date = f"{year}-{month:02d}-{day:02d}"
+
+    try:
+        # 驗證日期有效
+        datetime.strptime(check_date, "%Y-%m-%d")
+    except ValueError:
+        return None
+
+    return date_match.group(4).strip(), check_date, f"{month}/{day}"
+
+
+def backfill_checkin(user_id: str, habit: dict, habit_name: str, check_date: str, date_display: str) -> str:
+    """補打卡"""
+    from database import checkin_habit, get_habit_streak
+
+    success = checkin_habit(user_id, habit["id"], check_date)
+    streak = get_habit_streak(user_id, habit["id"])
+
+    if success:
+        return (
+            f"✅ {habit['emoji']} {habit_name} 補打成功！\n\n"
+            f"📅 日期：{date_display}\n"
+            f"🔥 連續 {streak} 天\n\n"
+            f"繼續保持！💪"
+        )
+    return f"「{habit_name}」在 {date_display} 已經打卡過了！"
+
+
+def checkin_today(user_id: str, habit: dict) -> str:
+    """直接輸入習慣名稱打卡"""
+    from database import checkin_habit, get_habit_streak
+
+    success = checkin_habit(user_id, habit["id"])
+    streak = get_habit_streak(user_id, habit["id"])
+
+    if success:
+        return (
+            f"✅ {habit['emoji']} {habit['name']} 打卡成功！\n\n"
+            f"🔥 連續 {streak} 天\n\n"
+            f"繼續保持！💪"
+        )
+    return f"今天「{habit['name']}」已經打卡過了！\n\n🔥 連續 {streak} 天"
+
+
+def record_transaction(user_id: str, text: str) -> str:
+    """解析為記帳內容並儲存"""
+    from database import add_transaction
+
+    parsed = parse_transaction(text)
+
+    if not parsed:
+        # 無法解析，顯示使用說明
+        return (
+            f"📝 記帳小幫手\n"
+            f"━━━━━━━━━━━━━━\n"
+            f"請輸入記帳內容，例如：\n"
+            f"• 午餐 150\n"
+            f"• 交通費 50\n"
+            f"• 收入 薪水 50000\n\n"
+            f"或使用語音輸入更方便！"
+        )
+
+    add_transaction(
+        user_id=user_id,
+        trans_type=parsed.type,
+        amount=parsed.amount,
+        category=parsed.category,
+        description=parsed.description
+    )
+
+    type_text = "收入" if parsed.type == "income" else "支出"
+    return (
+        f"✅ 記帳成功！\n\n"
+        f"類型：{type_text}\n"
+        f"分類：{parsed.category}\n"
+        f"金額：${parsed.amount:,.0f}\n"
+        f"描述：{parsed.description}"
+    )
+
+
+def route_text_message(user_id: str, text: str) -> str:
+    """依文字內容分派指令，回傳回覆文字"""
+    command = EXACT_COMMANDS.get(text)
+    if command:
+        return command(user_id, text)
+
+    for prefix, command in PREFIX_COMMANDS:
+        if text.startswith(prefix):
+            return command(user_id, text)
+
+    from database import get_habit_index
+    habits = get_habit_index(user_id)
+
+    if habits:
+        # 日期 + 習慣（補打），習慣不存在時視為一般文字
+        dated = parse_dated_checkin(text)
+        if dated:
+            habit_name, check_date, date_display = dated
+            habit = habits.get(habit_name)
+            if habit_name and habit:
+                return backfill_checkin(user_id, habit, habit_name, check_date, date_display)
+
+        # 直接輸入習慣名稱
+        habit = habits.get(text)
+        if habit:
+            return checkin_today(user_id, habit)
+
+    return record_transaction(user_id, text)
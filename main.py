@@ -1,29 +1,33 @@
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import RedirectResponse
-from linebot.v3 import WebhookHandler
-from linebot.v3.messaging import (
-    Configuration,
-    ApiClient,
-    MessagingApi,
-    ReplyMessageRequest,
-    TextMessage,
-    QuickReply,
-    QuickReplyItem,
-    MessageAction,
-    URIAction,
-)
+from fastapi.concurrency import run_in_threadpool
+from linebot.v3 import WebhookHandler, SignatureValidator
+from linebot.v3.messaging import Configuration, TextMessage
 from linebot.v3.webhooks import MessageEvent, AudioMessageContent, TextMessageContent
 from linebot.v3.exceptions import InvalidSignatureError
 
-from config import LINE_CHANNEL_ACCESS_TOKEN, LINE_CHANNEL_SECRET
-from voice_handler import process_voice_message
+from config import (
+    LINE_CHANNEL_ACCESS_TOKEN,
+    LINE_CHANNEL_SECRET,
+    WEBHOOK_WORKERS,
+    WEBHOOK_QUEUE_SIZE,
+    WEBHOOK_ENQUEUE_TIMEOUT_SECONDS,
+    WEBHOOK_DRAIN_TIMEOUT_SECONDS,
+    WEBHOOK_DEDUP_TTL_HOURS,
+    WEBHOOK_DEDUP_MEMORY_SIZE,
+)
+from voice_handler import process_voice_message, transcription_cache
+from line_commands import route_text_message
 from parser import parse_transaction
-from database import add_transaction, get_summary
-from datetime import date
+from database import add_transaction, query_cache
+from services.webhook_queue import WebhookQueue
+from services.webhook_dedup import EventDeduplicator
+from services.line_messaging import LineReplySender, QUICK_REPLY
+from functools import wraps
 
 # 引入路由
-from routers import auth, transactions, stats, export, budget, recurring, energy, habits, reminders
+from routers import auth, transactions, stats, export, budget, recurring, energy, habits, reminders, dashboard
 
 app = FastAPI(title="LINE 語音記帳機器人")
 
@@ -37,6 +41,7 @@ app.include_router(recurring.router)
 app.include_router(energy.router)
 app.include_router(habits.router)
 app.include_router(reminders.router)
+app.include_router(dashboard.router)
 
 # 掛載靜態檔案
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -44,31 +49,90 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 # LINE Bot 設定
 configuration = Configuration(access_token=LINE_CHANNEL_ACCESS_TOKEN)
 handler = WebhookHandler(LINE_CHANNEL_SECRET)
+signature_validator = SignatureValidator(LINE_CHANNEL_SECRET)
+
+# Webhook 事件在背景 worker 處理，端點驗證簽章後立即回應
+webhook_queue = WebhookQueue(
+    maxsize=WEBHOOK_QUEUE_SIZE,
+    workers=WEBHOOK_WORKERS,
+    enqueue_timeout=WEBHOOK_ENQUEUE_TIMEOUT_SECONDS,
+)
+
+# 共用的訊息回覆 client（啟動時建立）
+reply_sender = LineReplySender(configuration)
+
+# LINE 重送的事件只處理一次
+webhook_dedup = EventDeduplicator(
+    ttl_hours=WEBHOOK_DEDUP_TTL_HOURS,
+    memory_size=WEBHOOK_DEDUP_MEMORY_SIZE,
+)
+
+
+def message_event_key(event: MessageEvent) -> str:
+    """訊息事件的去重鍵"""
+    return f"message:{event.message.id}"
+
+
+def deduplicated(func):
+    """
+    以訊息 ID 去除重複的訊息事件：重送的事件在任何下載、轉文字、寫入之前就略過
+    處理過程拋出例外時取消登記，讓下一次重送可以重新處理
+    （自行捕捉例外的 handler 需在錯誤處理中呼叫 webhook_dedup.release）
+    """
+    @wraps(func)
+    def wrapper(event: MessageEvent):
+        event_key = message_event_key(event)
+        delivery_context = getattr(event, "delivery_context", None)
+        is_redelivery = bool(delivery_context and delivery_context.is_redelivery)
 
+        if not webhook_dedup.claim(event_key, is_redelivery):
+            print(f"略過重複的 Webhook 事件: {event_key}")
+            return
 
-def get_quick_reply():
-    """取得常駐的快速回覆按鈕"""
-    return QuickReply(
-        items=[
-            QuickReplyItem(
-                action=MessageAction(label="今日收支", text="今日收支")
-            ),
-            QuickReplyItem(
-                action=MessageAction(label="習慣", text="習慣")
-            ),
-            QuickReplyItem(
-                action=MessageAction(label="能量幣", text="能量幣")
-            ),
-            QuickReplyItem(
-                action=URIAction(label="查看網頁版", uri="https://line-voice-accounting.onrender.com")
-            ),
-            QuickReplyItem(
-                action=MessageAction(label="使用說明", text="使用說明")
-            ),
-        ]
+        try:
+            return func(event)
+        except Exception:
+            webhook_dedup.release(event_key)
+            raise
+
+    return wrapper
+
+
+def send_reply(event: MessageEvent, reply_text: str):
+    """排入回覆訊息（帶快速回覆按鈕），由共用的 client 在背景送出"""
+    reply_sender.reply(
+        event.reply_token,
+        event.source.user_id,
+        [TextMessage(text=reply_text, quick_reply=QUICK_REPLY)],
+        event_timestamp=event.timestamp,
     )
 
 
+@app.on_event("startup")
+async def startup():
+    """建立共用的訊息 client、啟動 Webhook 工作佇列，預先載入語音辨識後端"""
+    await reply_sender.start()
+    webhook_queue.start()
+
+    from services.stt import get_backend
+    await run_in_threadpool(get_backend().start)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """排空 Webhook 工作佇列與待送回覆後關閉共用 client、匯出工作，寫回快取使用時間後關閉資料庫連線池"""
+    await webhook_queue.drain(timeout=WEBHOOK_DRAIN_TIMEOUT_SECONDS)
+    await reply_sender.close()
+    export.export_jobs.shutdown()
+
+    from voice_handler import close_clients
+    await close_clients()
+    transcription_cache.flush()
+
+    from database import pool
+    pool.close_all()
+
+
 @app.get("/")
 async def root():
     """首頁導向"""
@@ -78,7 +142,16 @@ async def root():
 @app.get("/health")
 async def health():
     """健康檢查"""
-    return {"status": "ok", "message": "LINE 語音記帳機器人運作中"}
+    return {
+        "status": "ok",
+        "message": "LINE 語音記帳機器人運作中",
+        "webhook_queue": webhook_queue.stats(),
+        "webhook_dedup": webhook_dedup.stats(),
+        "line_replies": reply_sender.stats(),
+        "transcription_cache": transcription_cache.stats(),
+        "export_jobs": export.export_jobs.stats(),
+        "query_cache": query_cache.stats(),
+    }
 
 
 @app.post("/webhook")
@@ -88,254 +161,40 @@ async def webhook(request: Request):
     body = await request.body()
     body_text = body.decode("utf-8")
 
-    try:
-        handler.handle(body_text, signature)
-    except InvalidSignatureError:
+    if not signature_validator.validate(body_text, signature):
         raise HTTPException(status_code=400, detail="Invalid signature")
 
+    # 事件交給背景 worker 處理（語音轉文字等耗時工作不會卡住 event loop）
+    accepted = await webhook_queue.submit(handle_webhook_body, body_text, signature)
+    if not accepted:
+        raise HTTPException(status_code=503, detail="Webhook queue is full")
+
     return {"status": "ok"}
 
 
+def handle_webhook_body(body_text: str, signature: str):
+    """在 worker thread 中分派事件給各個 handler"""
+    try:
+        handler.handle(body_text, signature)
+    except InvalidSignatureError:
+        print("Webhook 簽章驗證失敗")
+
+
 @handler.add(MessageEvent, message=TextMessageContent)
+@deduplicated
 def handle_text_message(event: MessageEvent):
     """處理文字訊息"""
     user_id = event.source.user_id
     text = event.message.text.strip()
 
-    reply_text = None
-
-    # 使用說明
-    if text == "使用說明":
-        reply_text = (
-            f"📝 語音記帳使用說明\n"
-            f"━━━━━━━━━━━━━━\n"
-            f"【記帳方式】\n"
-            f"• 語音：直接說「午餐 150」\n"
-            f"• 文字：輸入「午餐 150」\n"
-            f"• 收入：輸入「收入 薪水 50000」\n\n"
-            f"【查看記錄】\n"
-            f"• 輸入「今日收支」\n"
-            f"• 網頁版：\n"
-            f"line-voice-accounting.onrender.com"
-        )
-    # 今日收支查詢
-    elif text == "今日收支":
-        today = date.today().isoformat()
-        summary = get_summary(user_id, start_date=today, end_date=today)
-
-        reply_text = (
-            f"📊 今日收支報告\n"
-            f"━━━━━━━━━━━━━━\n"
-            f"💰 收入：${summary['total_income']:,.0f}\n"
-            f"💸 支出：${summary['total_expense']:,.0f}\n"
-            f"━━━━━━━━━━━━━━\n"
-            f"📈 結餘：${summary['balance']:,.0f}\n"
-            f"📝 筆數：{summary['transaction_count']} 筆\n\n"
-            f"🌐 查看更多：\n"
-            f"https://line-voice-accounting.onrender.com"
-        )
-    # 能量幣查詢
-    elif text == "能量幣":
-        from routers.energy import get_user_energy_coins
-        coins = get_user_energy_coins(user_id)
-
-        reply_text = (
-            f"✨ 能量幣報告\n"
-            f"━━━━━━━━━━━━━━\n"
-            f"🥇 金幣：{coins['gold']} 枚\n"
-            f"   └ 還債累計 ${coins['gold_amount']:,.0f}\n"
-            f"🥈 銀幣：{coins['silver']} 枚\n"
-            f"   └ 捐款累計 ${coins['silver_amount']:,.0f}\n"
-            f"🥉 銅幣：{coins['copper']} 枚\n"
-            f"   └ 打工累計 ${coins['copper_amount']:,.0f}\n"
-            f"━━━━━━━━━━━━━━\n"
-            f"🏆 總能量幣：{coins['total_coins']} 枚\n\n"
-            f"🌐 查看詳情：\n"
-            f"https://line-voice-accounting.onrender.com/static/energy.html"
-        )
-    # 習慣查詢
-    elif text == "習慣":
-        from database import get_today_checkins, get_habit_streak
-        habits_status = get_today_checkins(user_id)
-
-        if not habits_status:
-            reply_text = (
-                f"📋 習慣追蹤\n"
-                f"━━━━━━━━━━━━━━\n"
-                f"尚未建立任何習慣\n\n"
-                f"輸入「新增習慣 打拳」來建立\n"
-                f"或到網頁版管理習慣：\n"
-                f"https://line-voice-accounting.onrender.com/static/habits.html"
-            )
-        else:
-            lines = ["📋 今日習慣\n━━━━━━━━━━━━━━"]
-            for h in habits_status:
-                status = "✅" if h["checked"] else "⬜"
-                streak = get_habit_streak(user_id, h["id"])
-                streak_text = f" 🔥{streak}天" if streak > 0 else ""
-                lines.append(f"{status} {h['emoji']} {h['name']}{streak_text}")
-
-            lines.append(f"\n輸入習慣名稱即可打卡")
-            lines.append(f"例如：打拳")
-            reply_text = "\n".join(lines)
-
-    # 新增習慣
-    elif text.startswith("新增習慣 ") or text.startswith("新增習慣"):
-        from database import create_habit, get_habit_by_name
-        habit_name = text.replace("新增習慣", "").strip()
-
-        if not habit_name:
-            reply_text = "請輸入習慣名稱\n例如：新增習慣 打拳"
-        elif get_habit_by_name(user_id, habit_name):
-            reply_text = f"「{habit_name}」習慣已存在"
-        else:
-            create_habit(user_id, habit_name)
-            reply_text = (
-                f"✅ 習慣建立成功！\n\n"
-                f"習慣名稱：{habit_name}\n\n"
-                f"輸入「{habit_name}」即可打卡"
-            )
-
-    # 打卡習慣（直接輸入習慣名稱或「打卡 習慣名稱」）
-    elif text.startswith("打卡 "):
-        from database import get_habit_by_name, checkin_habit, get_habit_streak
-        habit_name = text.replace("打卡 ", "").strip()
-        habit = get_habit_by_name(user_id, habit_name)
-
-        if not habit:
-            reply_text = f"找不到「{habit_name}」習慣\n\n輸入「習慣」查看所有習慣"
-        else:
-            success = checkin_habit(user_id, habit["id"])
-            streak = get_habit_streak(user_id, habit["id"])
-
-            if success:
-                reply_text = (
-                    f"✅ {habit['emoji']} {habit_name} 打卡成功！\n\n"
-                    f"🔥 連續 {streak} 天\n\n"
-                    f"繼續保持！💪"
-                )
-            else:
-                reply_text = f"今天「{habit_name}」已經打卡過了！\n\n🔥 連續 {streak} 天"
-
-    else:
-        # 先檢查是否為「日期 + 習慣」格式（補打）
-        from database import get_habit_by_name, checkin_habit, get_habit_streak
-        import re
-        from datetime import datetime, timedelta
-
-        check_date = None
-        habit_name = None
-        date_display = None
-
-        # 解析日期格式
-        # 昨天/前天 + 習慣
-        if text.startswith("昨天 ") or text.startswith("昨天"):
-            habit_name = text.replace("昨天", "").strip()
-            check_date = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
-            date_display = "昨天"
-        elif text.startswith("前天 ") or text.startswith("前天"):
-            habit_name = text.replace("前天", "").strip()
-            check_date = (datetime.now() - timedelta(days=2)).strftime("%Y-%m-%d")
-            date_display = "前天"
-        else:
-            # M/D 或 MM/DD 或 YYYY/M/D 格式
-            date_match = re.match(r'^(\d{4}/)?(\d{1,2})/(\d{1,2})\s+(.+)$', text)
-            if date_match:
-                year = int(date_match.group(1)[:-1]) if date_match.group(1) else datetime.now().year
-                month = int(date_match.group(2))
-                day = int(date_match.group(3))
-                habit_name = date_match.group(4).strip()
-                try:
-                    check_date = f"{year}-{month:02d}-{day:02d}"
-                    # 驗證日期有效
-                    datetime.strptime(check_date, "%Y-%m-%d")
-                    date_display = f"{month}/{day}"
-                except ValueError:
-                    check_date = None
-
-        # 如果有解析到日期和習慣名稱，嘗試補打
-        if check_date and habit_name:
-            habit = get_habit_by_name(user_id, habit_name)
-            if habit:
-                success = checkin_habit(user_id, habit["id"], check_date)
-                streak = get_habit_streak(user_id, habit["id"])
-
-                if success:
-                    reply_text = (
-                        f"✅ {habit['emoji']} {habit_name} 補打成功！\n\n"
-                        f"📅 日期：{date_display}\n"
-                        f"🔥 連續 {streak} 天\n\n"
-                        f"繼續保持！💪"
-                    )
-                else:
-                    reply_text = f"「{habit_name}」在 {date_display} 已經打卡過了！"
-            else:
-                # 習慣不存在，可能是記帳，繼續往下處理
-                pass
-
-        if reply_text is None:
-            # 先檢查是否為習慣名稱（直接打卡）
-            habit = get_habit_by_name(user_id, text)
-
-            if habit:
-                success = checkin_habit(user_id, habit["id"])
-                streak = get_habit_streak(user_id, habit["id"])
-
-                if success:
-                    reply_text = (
-                        f"✅ {habit['emoji']} {habit['name']} 打卡成功！\n\n"
-                        f"🔥 連續 {streak} 天\n\n"
-                        f"繼續保持！💪"
-                    )
-                else:
-                    reply_text = f"今天「{habit['name']}」已經打卡過了！\n\n🔥 連續 {streak} 天"
-            else:
-                # 嘗試解析為記帳內容
-                parsed = parse_transaction(text)
-
-                if parsed:
-                    # 儲存到資料庫
-                    transaction_id = add_transaction(
-                        user_id=user_id,
-                        trans_type=parsed.type,
-                        amount=parsed.amount,
-                        category=parsed.category,
-                        description=parsed.description
-                    )
-
-                    # 回覆確認訊息
-                    type_text = "收入" if parsed.type == "income" else "支出"
-                    reply_text = (
-                        f"✅ 記帳成功！\n\n"
-                        f"類型：{type_text}\n"
-                        f"分類：{parsed.category}\n"
-                        f"金額：${parsed.amount:,.0f}\n"
-                        f"描述：{parsed.description}"
-                    )
-                else:
-                    # 無法解析，顯示使用說明
-                    reply_text = (
-                        f"📝 記帳小幫手\n"
-                        f"━━━━━━━━━━━━━━\n"
-                        f"請輸入記帳內容，例如：\n"
-                        f"• 午餐 150\n"
-                        f"• 交通費 50\n"
-                        f"• 收入 薪水 50000\n\n"
-                        f"或使用語音輸入更方便！"
-                    )
+    reply_text = route_text_message(user_id, text)
 
     # 回覆訊息（帶快速回覆按鈕）
-    with ApiClient(configuration) as api_client:
-        messaging_api = MessagingApi(api_client)
-        messaging_api.reply_message(
-            ReplyMessageRequest(
-                reply_token=event.reply_token,
-                messages=[TextMessage(text=reply_text, quick_reply=get_quick_reply())]
-            )
-        )
+    send_reply(event, reply_text)
 
 
 @handler.add(MessageEvent, message=AudioMessageContent)
+@deduplicated
 def handle_audio_message(event: MessageEvent):
     """處理語音訊息"""
     user_id = event.source.user_id
@@ -373,17 +232,12 @@ def handle_audio_message(event: MessageEvent):
 
     except Exception as e:
         print(f"處理錯誤: {e}")
+        # 下載或轉文字失敗時取消登記，LINE 重送的事件可以重新處理
+        webhook_dedup.release(message_event_key(event))
         reply_text = f"處理時發生錯誤，請稍後再試。\n錯誤：{str(e)}"
 
     # 回覆訊息（帶快速回覆按鈕）
-    with ApiClient(configuration) as api_client:
-        messaging_api = MessagingApi(api_client)
-        messaging_api.reply_message(
-            ReplyMessageRequest(
-                reply_token=event.reply_token,
-                messages=[TextMessage(text=reply_text, quick_reply=get_quick_reply())]
-            )
-        )
+    send_reply(event, reply_text)
 
 
 if __name__ == "__main__":
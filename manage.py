@@ -0,0 +1,97 @@
+"""
+資料維護工具
+用法：
+  python manage.py rollups rebuild [--user USER_ID]   重建每日彙總表
+  python manage.py rollups verify [--user USER_ID]    比對每日彙總與原始交易
+  python manage.py energy reclassify [--user USER_ID] 依目前關鍵字重新分類能量幣
+  python manage.py habits recompute [--user USER_ID]  重新計算習慣連續天數與每月計數
+"""
+import argparse
+import sys
+
+
+def rollups_rebuild(args):
+    """重建每日彙總"""
+    from database import rebuild_daily_rollups
+
+    target = args.user or "全部用戶"
+    print(f"重建每日彙總：{target}...")
+    rebuild_daily_rollups(args.user)
+    print("完成！")
+    return 0
+
+
+def rollups_verify(args):
+    """檢查每日彙總是否與原始交易一致"""
+    from database import verify_daily_rollups
+
+    mismatches = verify_daily_rollups(args.user)
+    if not mismatches:
+        print("每日彙總與交易記錄一致")
+        return 0
+
+    print(f"發現 {len(mismatches)} 筆不一致：")
+    for m in mismatches[:50]:
+        print(
+            f"  {m['user_id']} {m['day']} {m['type']} {m['category']}："
+            f"應為 {m['expected_total']} / {m['expected_count']} 筆，"
+            f"實際 {m['actual_total']} / {m['actual_count']} 筆"
+        )
+    print("\n可執行 python manage.py rollups rebuild 修正")
+    return 1
+
+
+def energy_reclassify(args):
+    """依目前的關鍵字規則重新分類能量幣"""
+    from database import reclassify_energy_ledger
+
+    target = args.user or "全部用戶"
+    print(f"重新分類能量幣：{target}...")
+    written = reclassify_energy_ledger(args.user)
+    print(f"完成！共 {written} 筆能量幣明細")
+    return 0
+
+
+def habits_recompute(args):
+    """從打卡記錄重新計算習慣計數"""
+    from database import rebuild_habit_counters
+
+    target = args.user or "全部用戶"
+    print(f"重新計算習慣連續天數與每月計數：{target}...")
+    rebuild_habit_counters(args.user)
+    print("完成！")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="資料維護工具")
+    subparsers = parser.add_subparsers(dest="group", required=True)
+
+    rollups = subparsers.add_parser("rollups", help="每日彙總表")
+    rollups_actions = rollups.add_subparsers(dest="action", required=True)
+    for name, func, help_text in (
+        ("rebuild", rollups_rebuild, "從交易記錄重建"),
+        ("verify", rollups_verify, "比對彙總與交易記錄"),
+    ):
+        action = rollups_actions.add_parser(name, help=help_text)
+        action.add_argument("--user", help="只處理指定用戶")
+        action.set_defaults(func=func)
+
+    energy = subparsers.add_parser("energy", help="能量幣")
+    energy_actions = energy.add_subparsers(dest="action", required=True)
+    action = energy_actions.add_parser("reclassify", help="依目前關鍵字重新分類")
+    action.add_argument("--user", help="只處理指定用戶")
+    action.set_defaults(func=energy_reclassify)
+
+    habits = subparsers.add_parser("habits", help="習慣打卡")
+    habits_actions = habits.add_subparsers(dest="action", required=True)
+    action = habits_actions.add_parser("recompute", help="從打卡記錄重新計算")
+    action.add_argument("--user", help="只處理指定用戶")
+    action.set_defaults(func=habits_recompute)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,10 @@
 import re
-from typing import Optional
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, Optional
 from dataclasses import dataclass
+from keyword_matcher import KeywordMatcher
 
 
 @dataclass
@@ -31,6 +35,17 @@ INCOME_KEYWORDS = {
     "收入": ["收入", "進帳", "入帳", "賺", "收到", "匯入", "轉入", "進來", "入袋"],
 }
 
+# 收入優先於支出，同類型內依分類順序，第一個命中的分類勝出
+CATEGORY_MATCHER = KeywordMatcher(
+    [(("income", category), keywords) for category, keywords in INCOME_KEYWORDS.items()]
+    + [(("expense", category), keywords) for category, keywords in EXPENSE_KEYWORDS.items()]
+)
+
+# 金額樣式（預先編譯）
+# 「花了 100」這類寫法一定也會被第一個樣式抓到，因此只需要阿拉伯數字與中文數字兩個樣式
+AMOUNT_PATTERN = re.compile(r"(\d+(?:,\d{3})*(?:\.\d+)?)\s*(?:塊|元|錢|块)?")
+CHINESE_AMOUNT_PATTERN = re.compile(r"([零一二兩三四五六七八九十百千萬]+)\s*(?:塊|元|錢|块)?")
+
 # 中文數字對照
 CHINESE_NUMBERS = {
     "零": 0, "一": 1, "二": 2, "兩": 2, "三": 3, "四": 4,
@@ -80,23 +95,12 @@ def chinese_to_number(text: str) -> Optional[float]:
 def extract_amount(text: str) -> Optional[float]:
     """從文字中提取金額"""
     # 嘗試匹配阿拉伯數字
-    patterns = [
-        r"(\d+(?:,\d{3})*(?:\.\d+)?)\s*(?:塊|元|錢|块)?",
-        r"(?:花了?|用了?|付了?|收到?)\s*(\d+(?:,\d{3})*(?:\.\d+)?)",
-    ]
-
-    for pattern in patterns:
-        match = re.search(pattern, text)
-        if match:
-            amount_str = match.group(1).replace(",", "")
-            try:
-                return float(amount_str)
-            except ValueError:
-                pass
+    match = AMOUNT_PATTERN.search(text)
+    if match:
+        return float(match.group(1).replace(",", ""))
 
     # 嘗試匹配中文數字
-    chinese_pattern = r"([零一二兩三四五六七八九十百千萬]+)\s*(?:塊|元|錢|块)?"
-    match = re.search(chinese_pattern, text)
+    match = CHINESE_AMOUNT_PATTERN.search(text)
     if match:
         return chinese_to_number(match.group(1))
 
@@ -105,19 +109,9 @@ def extract_amount(text: str) -> Optional[float]:
 
 def determine_category(text: str) -> tuple[str, str]:
     """判斷分類和類型（收入/支出）"""
-    text_lower = text.lower()
-
-    # 先檢查是否為收入
-    for category, keywords in INCOME_KEYWORDS.items():
-        for keyword in keywords:
-            if keyword in text_lower:
-                return "income", category
-
-    # 檢查支出分類
-    for category, keywords in EXPENSE_KEYWORDS.items():
-        for keyword in keywords:
-            if keyword in text_lower:
-                return "expense", category
+    match = CATEGORY_MATCHER.first_match(text.lower())
+    if match:
+        return match
 
     # 預設為支出-其他
     return "expense", "其他"
@@ -140,3 +134,62 @@ def parse_transaction(text: str) -> Optional[ParsedTransaction]:
         category=category,
         description=text
     )
+
+
+def _parse_chunk(texts: list) -> list:
+    """
+    解析一批文字（給 process pool 使用，必須是模組層級函式）
+    只回傳 (type, amount, category)，description 由主 process 用原文補回，減少跨 process 傳輸量
+    """
+    results = []
+    for text in texts:
+        parsed = parse_transaction(text)
+        results.append(None if parsed is None else (parsed.type, parsed.amount, parsed.category))
+    return results
+
+
+def _chunks(texts: Iterable[str], size: int) -> Iterator[list]:
+    iterator = iter(texts)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_transactions(
+    texts: Iterable[str],
+    workers: Optional[int] = None,
+    chunksize: int = 1000,
+) -> Iterator[Optional[ParsedTransaction]]:
+    """
+    批次解析記帳文字，依輸入順序逐筆產出結果（無法解析的為 None）
+    結果與逐筆呼叫 parse_transaction 完全相同
+
+    workers: process 數量，None 或 <= 1 時在目前的 process 內解析
+             大量資料（匯入聊天記錄、銀行明細）可指定 workers 分散到多個 process
+    chunksize: 每次送進 process 的筆數
+    """
+    if not workers or workers <= 1:
+        for text in texts:
+            yield parse_transaction(text)
+        return
+
+    # 同時只保留 workers * 2 批在處理中，避免一次把整份輸入讀進記憶體
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in _chunks(texts, chunksize):
+            pending.append((chunk, executor.submit(_parse_chunk, chunk)))
+            if len(pending) >= workers * 2:
+                yield from _merge_chunk(*pending.popleft())
+        while pending:
+            yield from _merge_chunk(*pending.popleft())
+
+
+def _merge_chunk(chunk: list, future) -> Iterator[Optional[ParsedTransaction]]:
+    for text, result in zip(chunk, future.result()):
+        if result is None:
+            yield None
+        else:
+            trans_type, amount, category = result
+            yield ParsedTransaction(type=trans_type, amount=amount, category=category, description=text)
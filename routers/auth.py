@@ -101,7 +101,14 @@ async def get_current_user(request: Request):
 
 
 def get_user_id_from_request(request: Request) -> str:
-    """從 request 取得用戶 ID（供其他 router 使用）"""
+    """
+    從 request 取得用戶 ID（供其他 router 使用）
+    結果記在 request.state，同一個請求中再次呼叫（如 conditional_get 與 handler）不會重複查詢 session
+    """
+    user_id = getattr(request.state, "user_id", None)
+    if user_id:
+        return user_id
+
     session_id = request.cookies.get(SESSION_COOKIE_NAME)
 
     if not session_id:
@@ -111,4 +118,5 @@ def get_user_id_from_request(request: Request) -> str:
     if not session:
         raise HTTPException(status_code=401, detail="Session 已過期")
 
-    return session["user_id"]
+    request.state.user_id = session["user_id"]
+    return request.state.user_id
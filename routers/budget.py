@@ -3,6 +3,7 @@ from fastapi import APIRouter, Request, HTTPException
 from pydantic import BaseModel
 from database import get_budget, set_budget, get_budget_status
 from routers.auth import get_user_id_from_request
+from services.etag import conditional_get
 
 router = APIRouter(prefix="/api/budget", tags=["預算"])
 
@@ -12,6 +13,7 @@ class BudgetCreate(BaseModel):
 
 
 @router.get("")
+@conditional_get
 async def get_user_budget(request: Request):
     """取得預算設定"""
     user_id = get_user_id_from_request(request)
@@ -37,6 +39,7 @@ async def set_user_budget(request: Request, data: BudgetCreate):
 
 
 @router.get("/status")
+@conditional_get
 async def get_user_budget_status(request: Request):
     """取得預算使用狀況"""
     user_id = get_user_id_from_request(request)
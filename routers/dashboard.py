@@ -0,0 +1,57 @@
+"""儀表板 API"""
+import asyncio
+from fastapi import APIRouter, Request
+from fastapi.concurrency import run_in_threadpool
+from typing import Optional
+from database import (
+    get_stats_by_category,
+    get_stats_by_date,
+    get_summary,
+    get_transactions
+)
+from routers.auth import get_user_id_from_request
+from services.etag import conditional_get
+
+router = APIRouter(prefix="/api/dashboard", tags=["儀表板"])
+
+
+@router.get("")
+@conditional_get
+async def get_dashboard(
+    request: Request,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    recent: int = 5
+):
+    """
+    儀表板所需的全部資料（一次請求）
+    只驗證一次 session（conditional_get 已驗證過，這裡取 request.state 中的結果），
+    摘要、分類、趨勢與最近記帳同時在 threadpool 中查詢，
+    回應時間約等於最慢的一個查詢；某一區塊失敗時該欄位為 null，其他區塊照常回傳
+    """
+    user_id = get_user_id_from_request(request)
+    recent = max(1, min(recent, 20))
+
+    sections = {
+        "summary": (get_summary, user_id, start_date, end_date),
+        "categories": (get_stats_by_category, user_id, "expense", start_date, end_date),
+        "trends": (get_stats_by_date, user_id, start_date, end_date, "day"),
+        "recent": (get_transactions, user_id, recent),
+    }
+
+    results = await asyncio.gather(
+        *(run_in_threadpool(*query) for query in sections.values()),
+        return_exceptions=True
+    )
+
+    payload = {}
+    errors = []
+    for name, result in zip(sections, results):
+        if isinstance(result, Exception):
+            print(f"儀表板 {name} 查詢失敗: {result}")
+            errors.append(name)
+            result = None
+        payload[name] = result
+
+    payload["errors"] = errors
+    return payload
@@ -1,15 +1,59 @@
 """匯出 API"""
 import io
-import csv
 from datetime import datetime
-from fastapi import APIRouter, Request
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
 from typing import Optional
-from database import get_all_transactions_for_export
+from config import (
+    EXPORT_ARTIFACT_DIR,
+    EXPORT_ARTIFACT_MAX,
+    EXPORT_ARTIFACT_TTL_SECONDS,
+    EXPORT_CHUNK_SIZE,
+    EXPORT_COLUMNAR_CHUNK_SIZE,
+    EXPORT_JOB_WORKERS,
+    EXPORT_SPOOL_THRESHOLD_BYTES,
+)
+from database import iter_transaction_columns_for_export, iter_transactions_for_export
 from routers.auth import get_user_id_from_request
+from services.export_jobs import ExportJobManager
+from services.export_writers import (
+    ARROW_STREAM_MEDIA_TYPE,
+    EXPORT_FORMATS,
+    PARQUET_MEDIA_TYPE,
+    XLSX_MEDIA_TYPE,
+    accepts_gzip,
+    arrow_stream_chunks,
+    columnar_available,
+    csv_chunks,
+    file_chunks,
+    file_range_chunks,
+    gzip_chunks,
+    parse_byte_range,
+    prefetched,
+    spooled_excel,
+    spooled_parquet,
+)
 
 router = APIRouter(prefix="/api/export", tags=["匯出"])
 
+# 背景匯出工作（main.py 關閉時呼叫 shutdown）
+export_jobs = ExportJobManager(
+    artifact_dir=EXPORT_ARTIFACT_DIR,
+    workers=EXPORT_JOB_WORKERS,
+    max_artifacts=EXPORT_ARTIFACT_MAX,
+    ttl_seconds=EXPORT_ARTIFACT_TTL_SECONDS,
+    chunk_size=EXPORT_CHUNK_SIZE,
+    columnar_chunk_size=EXPORT_COLUMNAR_CHUNK_SIZE
+)
+
+
+class ExportJobCreate(BaseModel):
+    format: str = "csv"
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+
 
 @router.get("/csv")
 async def export_csv(
@@ -17,132 +61,228 @@ async def export_csv(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None
 ):
-    """匯出 CSV 檔案"""
+    """
+    匯出 CSV 檔案（串流）
+    從資料庫分批讀取、逐批寫出，用戶端接受時以 gzip 壓縮傳送
+    """
     user_id = get_user_id_from_request(request)
 
-    transactions = get_all_transactions_for_export(
+    chunks = iter_transactions_for_export(
         user_id=user_id,
         start_date=start_date,
-        end_date=end_date
+        end_date=end_date,
+        chunk_size=EXPORT_CHUNK_SIZE
+    )
+    chunks = await run_in_threadpool(prefetched, chunks)
+    body = csv_chunks(chunks)
+
+    # 產生檔名
+    filename = f"accounting_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    headers = {
+        "Content-Disposition": f"attachment; filename={filename}",
+        "Vary": "Accept-Encoding"
+    }
+
+    if accepts_gzip(request.headers.get("accept-encoding", "")):
+        body = gzip_chunks(body)
+        headers["Content-Encoding"] = "gzip"
+
+    # 同步產生器由 Starlette 在 threadpool 中逐段讀取，資料庫查詢不會卡住 event loop
+    return StreamingResponse(
+        body,
+        media_type="text/csv",
+        headers=headers
     )
 
-    # 建立 CSV
-    output = io.StringIO()
-    writer = csv.writer(output)
 
-    # 寫入標頭
-    writer.writerow(["日期", "類型", "分類", "金額", "描述"])
+@router.get("/excel")
+async def export_excel(
+    request: Request,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+):
+    """
+    匯出 Excel 檔案
+    write-only 模式逐批寫入暫存檔，再分段串流給用戶端
+    """
+    user_id = get_user_id_from_request(request)
 
-    # 寫入資料
-    for t in transactions:
-        type_text = "收入" if t["type"] == "income" else "支出"
-        writer.writerow([
-            t["created_at"],
-            type_text,
-            t["category"],
-            t["amount"],
-            t["description"] or ""
-        ])
+    chunks = iter_transactions_for_export(
+        user_id=user_id,
+        start_date=start_date,
+        end_date=end_date,
+        chunk_size=EXPORT_CHUNK_SIZE
+    )
 
+    # xlsx 是 zip 格式，必須整份寫完才能送出；在 threadpool 中產生，不卡住 event loop
+    output = await run_in_threadpool(spooled_excel, chunks, EXPORT_SPOOL_THRESHOLD_BYTES)
+    size = output.seek(0, io.SEEK_END)
     output.seek(0)
 
     # 產生檔名
-    filename = f"accounting_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    filename = f"accounting_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
 
     return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
+        file_chunks(output),
+        media_type=XLSX_MEDIA_TYPE,
         headers={
-            "Content-Disposition": f"attachment; filename={filename}"
+            "Content-Disposition": f"attachment; filename={filename}",
+            "Content-Length": str(size)
         }
     )
 
 
-@router.get("/excel")
-async def export_excel(
+def _require_columnar():
+    if not columnar_available():
+        raise HTTPException(status_code=501, detail="伺服器未安裝 pyarrow，無法匯出 Parquet / Arrow")
+
+
+@router.get("/parquet")
+async def export_parquet(
     request: Request,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None
 ):
-    """匯出 Excel 檔案"""
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-
+    """
+    匯出 Parquet 檔案（欄位式、zstd 壓縮，適合用 pandas / DuckDB 分析多年資料）
+    欄位：created_at（timestamp）、type / category（dictionary）、amount（float64）、description
+    """
+    _require_columnar()
     user_id = get_user_id_from_request(request)
 
-    transactions = get_all_transactions_for_export(
+    chunks = iter_transaction_columns_for_export(
         user_id=user_id,
         start_date=start_date,
-        end_date=end_date
+        end_date=end_date,
+        chunk_size=EXPORT_COLUMNAR_CHUNK_SIZE
     )
 
-    # 建立工作簿
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "記帳明細"
-
-    # 樣式設定
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="4A90D9", end_color="4A90D9", fill_type="solid")
-    header_alignment = Alignment(horizontal="center", vertical="center")
-    thin_border = Border(
-        left=Side(style="thin"),
-        right=Side(style="thin"),
-        top=Side(style="thin"),
-        bottom=Side(style="thin")
+    output = await run_in_threadpool(spooled_parquet, chunks, EXPORT_SPOOL_THRESHOLD_BYTES)
+    size = output.seek(0, io.SEEK_END)
+    output.seek(0)
+
+    # 產生檔名
+    filename = f"accounting_{datetime.now().strftime('%Y%m%d_%H%M%S')}.parquet"
+
+    return StreamingResponse(
+        file_chunks(output),
+        media_type=PARQUET_MEDIA_TYPE,
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "Content-Length": str(size)
+        }
     )
 
-    # 寫入標頭
-    headers = ["日期", "類型", "分類", "金額", "描述"]
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-        cell.border = thin_border
-
-    # 寫入資料
-    income_fill = PatternFill(start_color="E8F5E9", end_color="E8F5E9", fill_type="solid")
-    expense_fill = PatternFill(start_color="FFEBEE", end_color="FFEBEE", fill_type="solid")
-
-    for row, t in enumerate(transactions, 2):
-        type_text = "收入" if t["type"] == "income" else "支出"
-        fill = income_fill if t["type"] == "income" else expense_fill
-
-        data = [
-            t["created_at"],
-            type_text,
-            t["category"],
-            t["amount"],
-            t["description"] or ""
-        ]
-
-        for col, value in enumerate(data, 1):
-            cell = ws.cell(row=row, column=col, value=value)
-            cell.border = thin_border
-            cell.fill = fill
-            if col == 4:  # 金額欄位靠右對齊
-                cell.alignment = Alignment(horizontal="right")
-
-    # 調整欄寬
-    ws.column_dimensions["A"].width = 20
-    ws.column_dimensions["B"].width = 10
-    ws.column_dimensions["C"].width = 15
-    ws.column_dimensions["D"].width = 12
-    ws.column_dimensions["E"].width = 30
-
-    # 儲存到記憶體
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
+
+@router.get("/arrow")
+async def export_arrow(
+    request: Request,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+):
+    """
+    匯出 Arrow IPC 串流（與 Parquet 相同欄位，每批 zstd 壓縮後立即送出）
+    讀取：pyarrow.ipc.open_stream(...)
+    """
+    _require_columnar()
+    user_id = get_user_id_from_request(request)
+
+    chunks = iter_transaction_columns_for_export(
+        user_id=user_id,
+        start_date=start_date,
+        end_date=end_date,
+        chunk_size=EXPORT_COLUMNAR_CHUNK_SIZE
+    )
+    chunks = await run_in_threadpool(prefetched, chunks)
 
     # 產生檔名
-    filename = f"accounting_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    filename = f"accounting_{datetime.now().strftime('%Y%m%d_%H%M%S')}.arrows"
 
     return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        arrow_stream_chunks(chunks),
+        media_type=ARROW_STREAM_MEDIA_TYPE,
         headers={
             "Content-Disposition": f"attachment; filename={filename}"
         }
     )
+
+
+# ============ 背景匯出工作 ============
+
+@router.post("/jobs")
+async def create_export_job(request: Request, data: ExportJobCreate):
+    """
+    送出匯出工作，立即回傳工作狀態
+    相同條件（且資料沒有變動）的工作會直接沿用，reused 為 true
+    """
+    user_id = get_user_id_from_request(request)
+
+    try:
+        job, reused = await run_in_threadpool(
+            export_jobs.submit, user_id, data.format, data.start_date, data.end_date
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+    return {**job.to_dict(), "reused": reused}
+
+
+@router.get("/jobs/{job_id}")
+async def get_export_job(request: Request, job_id: str):
+    """查詢匯出進度"""
+    user_id = get_user_id_from_request(request)
+
+    job = export_jobs.get(job_id, user_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="匯出工作不存在或已過期")
+
+    return job.to_dict()
+
+
+@router.get("/jobs/{job_id}/download")
+async def download_export_job(request: Request, job_id: str):
+    """下載完成的匯出檔，支援 Range（中斷後續傳）"""
+    user_id = get_user_id_from_request(request)
+
+    job = export_jobs.get(job_id, user_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="匯出工作不存在或已過期")
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail="匯出尚未完成")
+
+    spec = EXPORT_FORMATS[job.format]
+    filename = f"accounting_{datetime.fromtimestamp(job.created_at).strftime('%Y%m%d_%H%M%S')}.{spec.extension}"
+    headers = {
+        "Content-Disposition": f"attachment; filename={filename}",
+        "Accept-Ranges": "bytes",
+        # 同一份檔案內容固定，可讓用戶端以 If-Range 確認續傳的是同一個檔案
+        "ETag": f'"{job.id}"'
+    }
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range == headers["ETag"]):
+        try:
+            byte_range = parse_byte_range(range_header, job.size)
+        except ValueError:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{job.size}"})
+
+    start, end = byte_range or (0, job.size - 1)
+    headers["Content-Length"] = str(end - start + 1)
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{job.size}"
+
+    # 回應前先開啟檔案：之後才被淘汰的檔案仍可透過這個 handle 讀完
+    file = export_jobs.open_artifact(job)
+    if file is None:
+        raise HTTPException(status_code=404, detail="匯出工作不存在或已過期")
+
+    return StreamingResponse(
+        file_range_chunks(file, start, end),
+        status_code=206 if byte_range else 200,
+        media_type=spec.media_type,
+        headers=headers
+    )
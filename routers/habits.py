@@ -14,10 +14,11 @@ from database import (
     checkin_habit,
     uncheckin_habit,
     get_habit_checkins,
-    get_today_checkins,
+    get_habits_with_streaks,
     get_habit_streak,
     get_habit_stats
 )
+from services.etag import conditional_get
 
 router = APIRouter(prefix="/api/habits", tags=["習慣打卡"])
 
@@ -43,14 +44,11 @@ class CheckinRequest(BaseModel):
 
 
 @router.get("")
+@conditional_get
 async def list_habits(request: Request):
     """取得所有習慣及今日打卡狀態"""
     user_id = get_user_id(request)
-    habits = get_today_checkins(user_id)
-
-    # 加入連續天數
-    for habit in habits:
-        habit["streak"] = get_habit_streak(user_id, habit["id"])
+    habits = get_habits_with_streaks(user_id)
 
     return {"items": habits}
 
@@ -76,6 +74,7 @@ async def create_new_habit(request: Request, data: HabitCreate):
 
 
 @router.get("/{habit_id}")
+@conditional_get
 async def get_single_habit(request: Request, habit_id: int):
     """取得單一習慣詳情"""
     user_id = get_user_id(request)
@@ -155,6 +154,7 @@ async def cancel_checkin(request: Request, habit_id: int, date: Optional[str] =
 
 
 @router.get("/{habit_id}/checkins")
+@conditional_get
 async def get_checkins(
     request: Request,
     habit_id: int,
@@ -173,6 +173,7 @@ async def get_checkins(
 
 
 @router.get("/{habit_id}/stats")
+@conditional_get
 async def get_stats(
     request: Request,
     habit_id: int,
@@ -186,6 +187,5 @@ async def get_stats(
         raise HTTPException(status_code=404, detail="習慣不存在")
 
     stats = get_habit_stats(user_id, habit_id, year, month)
-    stats["streak"] = get_habit_streak(user_id, habit_id)
 
     return stats
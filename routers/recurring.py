@@ -12,6 +12,7 @@ from database import (
 )
 import os
 from routers.auth import get_user_id_from_request
+from services.etag import conditional_get
 
 router = APIRouter(prefix="/api/recurring", tags=["固定收支"])
 
@@ -37,6 +38,7 @@ class RecurringUpdate(BaseModel):
 
 
 @router.get("")
+@conditional_get
 async def list_recurring(request: Request):
     """取得固定收支列表"""
     user_id = get_user_id_from_request(request)
@@ -46,6 +48,7 @@ async def list_recurring(request: Request):
 
 
 @router.get("/{recurring_id}")
+@conditional_get
 async def get_recurring(request: Request, recurring_id: int):
     """取得單筆固定收支"""
     user_id = get_user_id_from_request(request)
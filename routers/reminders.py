@@ -10,6 +10,7 @@ from database import (
     update_expense_reminder,
     delete_expense_reminder
 )
+from services.etag import conditional_get
 
 router = APIRouter(prefix="/api/reminders", tags=["固定支出提醒"])
 
@@ -33,6 +34,7 @@ class ReminderUpdate(BaseModel):
 
 
 @router.get("")
+@conditional_get
 async def list_reminders(request: Request):
     """取得所有固定支出提醒"""
     user_id = get_user_id(request)
@@ -76,6 +78,7 @@ async def create_new_reminder(request: Request, data: ReminderCreate):
 
 
 @router.get("/{reminder_id}")
+@conditional_get
 async def get_single_reminder(request: Request, reminder_id: int):
     """取得單一固定支出提醒"""
     user_id = get_user_id(request)
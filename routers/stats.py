@@ -7,11 +7,13 @@ from database import (
     get_stats_by_date
 )
 from routers.auth import get_user_id_from_request
+from services.etag import conditional_get
 
 router = APIRouter(prefix="/api/stats", tags=["統計"])
 
 
 @router.get("/summary")
+@conditional_get
 async def get_stats_summary(
     request: Request,
     start_date: Optional[str] = None,
@@ -30,6 +32,7 @@ async def get_stats_summary(
 
 
 @router.get("/by-category")
+@conditional_get
 async def get_category_stats(
     request: Request,
     type: Optional[str] = None,
@@ -50,6 +53,7 @@ async def get_category_stats(
 
 
 @router.get("/by-date")
+@conditional_get
 async def get_date_stats(
     request: Request,
     start_date: Optional[str] = None,
@@ -4,6 +4,7 @@ from pydantic import BaseModel
 from typing import Optional
 from database import (
     get_transactions_paginated,
+    get_transactions_by_cursor,
     get_transaction_by_id,
     add_transaction,
     update_transaction,
@@ -11,6 +12,7 @@ from database import (
     get_categories
 )
 from routers.auth import get_user_id_from_request
+from services.etag import conditional_get
 
 router = APIRouter(prefix="/api/transactions", tags=["交易"])
 
@@ -30,6 +32,7 @@ class TransactionUpdate(BaseModel):
 
 
 @router.get("")
+@conditional_get
 async def list_transactions(
     request: Request,
     page: int = 1,
@@ -37,11 +40,32 @@ async def list_transactions(
     type: Optional[str] = None,
     category: Optional[str] = None,
     start_date: Optional[str] = None,
-    end_date: Optional[str] = None
+    end_date: Optional[str] = None,
+    mode: str = "offset",
+    cursor: Optional[str] = None,
+    include_total: bool = False
 ):
-    """取得交易列表（分頁、篩選）"""
+    """
+    取得交易列表（分頁、篩選）
+    mode=cursor 或帶 cursor 參數時使用游標分頁，回傳 next_cursor / prev_cursor
+    """
     user_id = get_user_id_from_request(request)
 
+    if mode == "cursor" or cursor:
+        try:
+            return get_transactions_by_cursor(
+                user_id=user_id,
+                cursor=cursor,
+                per_page=per_page,
+                trans_type=type,
+                category=category,
+                start_date=start_date,
+                end_date=end_date,
+                include_total=include_total
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
     result = get_transactions_paginated(
         user_id=user_id,
         page=page,
@@ -56,6 +80,7 @@ async def list_transactions(
 
 
 @router.get("/categories")
+@conditional_get
 async def list_categories(request: Request):
     """取得用戶的所有分類"""
     user_id = get_user_id_from_request(request)
@@ -64,6 +89,7 @@ async def list_categories(request: Request):
 
 
 @router.get("/{transaction_id}")
+@conditional_get
 async def get_transaction(request: Request, transaction_id: int):
     """取得單筆交易"""
     user_id = get_user_id_from_request(request)
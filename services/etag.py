@@ -0,0 +1,67 @@
+"""
+條件式 GET（ETag / If-None-Match）
+同一個網址的回應只取決於查詢參數、用戶的資料版本與今天日期（連續天數、本月預算依日期計算），
+所以 ETag 由「用戶 ID 雜湊 + 資料版本 + 今天日期」組成：
+用戶端帶回相同的 ETag 時只查一次資料版本就回 304，不執行統計、列表等查詢
+"""
+import hashlib
+from datetime import date
+from functools import wraps
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from database import query_cache
+from routers.auth import get_user_id_from_request
+
+# 回應可以存在瀏覽器，但每次使用前都要帶 ETag 回來驗證；內容因用戶而異，不可由共用快取保存
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(user_id: str, data_version: int) -> str:
+    """弱 ETag：不同用戶的 ETag 不會相同，登出換帳號後不會拿到前一個用戶的 304"""
+    user_hash = hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:12]
+    return f'W/"{user_hash}-v{data_version}-{date.today().isoformat()}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match 是否包含此 ETag（弱比較，忽略 W/ 前綴）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    target = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == target
+        for candidate in if_none_match.split(",")
+    )
+
+
+def conditional_get(func):
+    """
+    GET handler 的 ETag 裝飾器（handler 需有 request: Request 參數）
+    - If-None-Match 符合時回 304，不呼叫 handler
+    - 否則呼叫 handler，回應加上 ETag 與 Cache-Control
+    錯誤回應（HTTPException）不帶 ETag，照常拋出
+    """
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        request: Request = kwargs["request"]
+        user_id = get_user_id_from_request(request)
+        # 先取版本再查詢：查詢期間有寫入時回應帶的是舊版本，下次請求會重新取得，不會漏掉更新
+        # 版本同時交給查詢快取，handler 讀到的快取結果與 ETag 是同一個版本
+        etag = make_etag(user_id, query_cache.refresh_version(user_id))
+        headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+        if etag_matches(request.headers.get("if-none-match", ""), etag):
+            return Response(status_code=304, headers=headers)
+
+        result = await func(*args, **kwargs)
+        if isinstance(result, Response):
+            result.headers.update(headers)
+            return result
+        return JSONResponse(jsonable_encoder(result), headers=headers)
+
+    return wrapper
@@ -0,0 +1,271 @@
+"""
+背景匯出工作
+送出後立即回傳工作 ID，由固定數量的 worker thread 產生檔案，前端輪詢進度後下載
+完成的檔案以 (用戶, 格式, 日期範圍, 資料版本) 為鍵保留一段時間：
+同樣的匯出（重複點擊、重新下載）直接沿用，用戶有新的交易寫入後資料版本改變才重新產生
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import BinaryIO, Optional
+
+from services.export_writers import EXPORT_FORMATS, columnar_available
+
+
+@dataclass
+class ExportJob:
+    id: str
+    user_id: str
+    format: str
+    start_date: Optional[str]
+    end_date: Optional[str]
+    data_version: int
+    status: str = "pending"  # pending / running / done / failed
+    total_rows: int = 0
+    rows_written: int = 0
+    size: int = 0
+    path: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    @property
+    def key(self) -> tuple:
+        return (self.user_id, self.format, self.start_date, self.end_date, self.data_version)
+
+    @property
+    def progress(self) -> float:
+        if self.status == "done":
+            return 1.0
+        if not self.total_rows:
+            return 0.0
+        return min(self.rows_written / self.total_rows, 1.0)
+
+    def to_dict(self) -> dict:
+        """回傳給前端的狀態（不含檔案路徑與用戶 ID）"""
+        return {
+            "id": self.id,
+            "format": self.format,
+            "start_date": self.start_date,
+            "end_date": self.end_date,
+            "status": self.status,
+            "progress": round(self.progress, 4),
+            "total_rows": self.total_rows,
+            "rows_written": self.rows_written,
+            "size": self.size,
+            "error": self.error,
+        }
+
+
+class ExportJobManager:
+    """匯出工作排程與檔案快取"""
+
+    def __init__(
+        self,
+        artifact_dir: str = "",
+        workers: int = 2,
+        max_artifacts: int = 50,
+        ttl_seconds: float = 3600,
+        chunk_size: int = 1000,
+        columnar_chunk_size: int = 10000
+    ):
+        self.workers = workers
+        self.max_artifacts = max_artifacts
+        self.ttl_seconds = ttl_seconds
+        self.chunk_size = chunk_size
+        self.columnar_chunk_size = columnar_chunk_size
+
+        self._artifact_dir = artifact_dir
+        self._owns_artifact_dir = not artifact_dir
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._jobs = {}
+        self._by_key = {}
+        self._lock = threading.Lock()
+
+        self.submitted = 0
+        self.reused = 0
+        self.completed = 0
+        self.failed = 0
+        self.evicted = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self._owns_artifact_dir:
+                        self._artifact_dir = tempfile.mkdtemp(prefix="exports-")
+                    else:
+                        os.makedirs(self._artifact_dir, exist_ok=True)
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="export")
+        return self._executor
+
+    def submit(
+        self,
+        user_id: str,
+        export_format: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> tuple:
+        """
+        送出匯出工作，回傳 (工作, 是否沿用既有的工作)
+        相同鍵的工作還在執行或已完成時直接沿用，失敗的工作會重新產生
+        """
+        from database import get_data_version
+
+        spec = EXPORT_FORMATS.get(export_format)
+        if spec is None:
+            raise ValueError(f"不支援的匯出格式：{export_format}")
+        if spec.columnar and not columnar_available():
+            raise RuntimeError("伺服器未安裝 pyarrow，無法匯出 Parquet / Arrow")
+
+        executor = self._get_executor()
+        data_version = get_data_version(user_id)
+        key = (user_id, export_format, start_date, end_date, data_version)
+
+        with self._lock:
+            self._evict_locked()
+
+            existing = self._jobs.get(self._by_key.get(key))
+            if existing and existing.status != "failed":
+                self.reused += 1
+                return existing, True
+
+            # 同條件但資料版本較舊的檔案不會再被使用
+            for stale in [job for job in self._jobs.values() if job.key[:4] == key[:4] and job.finished_at]:
+                self._remove_locked(stale)
+
+            job = ExportJob(
+                id=uuid.uuid4().hex,
+                user_id=user_id,
+                format=export_format,
+                start_date=start_date,
+                end_date=end_date,
+                data_version=data_version
+            )
+            self._jobs[job.id] = job
+            self._by_key[key] = job.id
+            self.submitted += 1
+
+        executor.submit(self._run, job)
+        return job, False
+
+    def get(self, job_id: str, user_id: str) -> Optional[ExportJob]:
+        """取得用戶自己的工作（其他用戶的工作視為不存在）"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    def open_artifact(self, job: ExportJob) -> Optional[BinaryIO]:
+        """
+        開啟完成的匯出檔；在鎖內開啟，淘汰流程不會插在查詢與開啟之間
+        工作已被淘汰時回傳 None，已開啟的 handle 在檔案被刪除後仍可讀完
+        """
+        with self._lock:
+            if self._jobs.get(job.id) is not job or job.status != "done":
+                return None
+            return open(job.path, "rb")
+
+    def _run(self, job: ExportJob):
+        from database import (
+            count_transactions_for_export,
+            iter_transaction_columns_for_export,
+            iter_transactions_for_export,
+        )
+
+        spec = EXPORT_FORMATS[job.format]
+        path = os.path.join(self._artifact_dir, f"{job.id}.{spec.extension}")
+        partial = f"{path}.part"
+
+        try:
+            job.status = "running"
+            job.total_rows = count_transactions_for_export(job.user_id, job.start_date, job.end_date)
+
+            if spec.columnar:
+                chunks = iter_transaction_columns_for_export(
+                    job.user_id, job.start_date, job.end_date, chunk_size=self.columnar_chunk_size
+                )
+            else:
+                chunks = iter_transactions_for_export(
+                    job.user_id, job.start_date, job.end_date, chunk_size=self.chunk_size
+                )
+
+            with open(partial, "wb") as output:
+                spec.write(self._track_progress(job, chunks, spec.columnar), output)
+            os.replace(partial, path)
+
+            job.path = path
+            job.size = os.path.getsize(path)
+            job.status = "done"
+            with self._lock:
+                self.completed += 1
+        except Exception as e:
+            print(f"匯出工作 {job.id} 失敗: {e}")
+            job.error = str(e)
+            job.status = "failed"
+            with self._lock:
+                self.failed += 1
+            if os.path.exists(partial):
+                os.remove(partial)
+        finally:
+            job.finished_at = time.time()
+
+    @staticmethod
+    def _track_progress(job: ExportJob, chunks, columnar: bool):
+        for chunk in chunks:
+            yield chunk
+            job.rows_written += len(chunk["id"]) if columnar else len(chunk)
+
+    def _evict_locked(self):
+        """移除過期的工作；已完成的檔案超過上限時從最舊的開始刪除（呼叫前需持有 _lock）"""
+        now = time.time()
+        finished = sorted(
+            (job for job in self._jobs.values() if job.finished_at is not None),
+            key=lambda job: job.finished_at
+        )
+        excess = sum(1 for job in finished if job.status == "done") - self.max_artifacts
+
+        for job in finished:
+            expired = now - job.finished_at > self.ttl_seconds
+            if not expired and not (excess > 0 and job.status == "done"):
+                continue
+            if job.status == "done":
+                excess -= 1
+                self.evicted += 1
+            self._remove_locked(job)
+
+    def _remove_locked(self, job: ExportJob):
+        self._jobs.pop(job.id, None)
+        if self._by_key.get(job.key) == job.id:
+            del self._by_key[job.key]
+        # 已開始的下載持有檔案 handle，刪除後仍可讀完
+        if job.path and os.path.exists(job.path):
+            os.remove(job.path)
+
+    def shutdown(self):
+        """停止接受新工作並清除本行程建立的暫存檔"""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if self._owns_artifact_dir and self._artifact_dir:
+            shutil.rmtree(self._artifact_dir, ignore_errors=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            "pending": statuses.count("pending"),
+            "running": statuses.count("running"),
+            "artifacts": statuses.count("done"),
+            "submitted": self.submitted,
+            "reused": self.reused,
+            "completed": self.completed,
+            "failed": self.failed,
+            "evicted": self.evicted,
+        }
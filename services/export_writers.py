@@ -0,0 +1,375 @@
+"""
+匯出檔案產生
+輸入是資料庫分批取出的交易（iter_transactions_for_export / iter_transaction_columns_for_export），
+每批轉成一段檔案內容立即產出，不在記憶體中組出整個檔案
+Parquet / Arrow 需要安裝 pyarrow（選用）
+"""
+import csv
+import importlib.util
+import io
+import itertools
+import tempfile
+import zlib
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional
+
+EXPORT_HEADERS = ["日期", "類型", "分類", "金額", "描述"]
+
+# Excel 欄寬（A~E）
+EXCEL_COLUMN_WIDTHS = {"A": 20, "B": 10, "C": 15, "D": 12, "E": 30}
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+# Parquet 每個 row group 的列數（太小會讓壓縮與欄位統計失去效果）
+PARQUET_ROW_GROUP_ROWS = 128 * 1024
+
+# 檔案內容以固定大小分段傳送
+FILE_CHUNK_BYTES = 64 * 1024
+
+
+def export_row(t: dict) -> list:
+    """交易 -> 匯出欄位"""
+    type_text = "收入" if t["type"] == "income" else "支出"
+    return [
+        t["created_at"],
+        type_text,
+        t["category"],
+        t["amount"],
+        t["description"] or ""
+    ]
+
+
+def csv_chunks(chunks: Iterable[list]) -> Iterator[bytes]:
+    """每批交易產出一段 UTF-8 CSV（第一段含標頭）"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_HEADERS)
+
+    for rows in chunks:
+        writer.writerows(export_row(t) for t in rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+    # 沒有任何資料時仍要輸出標頭
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def prefetched(chunks: Iterable) -> Iterator:
+    """
+    先取出第一批再開始回應：查詢失敗時例外在送出標頭前拋出，用戶端收到 5xx，
+    而不是 200 加上被截斷的檔案
+    """
+    iterator = iter(chunks)
+    try:
+        first = next(iterator)
+    except StopIteration:
+        return iter(())
+    return itertools.chain([first], iterator)
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """以 gzip 格式串流壓縮（每段壓縮後的輸出可能為空，略過不送）"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Accept-Encoding 是否允許 gzip（q=0 表示拒絕）"""
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        if coding.strip().lower() not in ("gzip", "*"):
+            continue
+        quality = params.strip().replace(" ", "")
+        if quality.startswith("q="):
+            try:
+                return float(quality[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def parse_byte_range(range_header: str, size: int) -> Optional[tuple]:
+    """
+    解析單一區段的 Range 標頭，回傳 (start, end)（含 end）
+    沒有 Range 或格式不支援時回傳 None（送出整個檔案）；範圍無法滿足時拋出 ValueError
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+
+    first, _, last = spec.strip().partition("-")
+    try:
+        first = int(first) if first.strip() else None
+        last = int(last) if last.strip() else None
+    except ValueError:
+        return None
+
+    if first is None:
+        # bytes=-N：最後 N 個位元組
+        if last is None:
+            return None
+        if last == 0:
+            raise ValueError("空的範圍")
+        return max(size - last, 0), size - 1
+
+    end = size - 1 if last is None else min(last, size - 1)
+    if first >= size or end < first:
+        raise ValueError("範圍超出檔案大小")
+    return first, end
+
+
+def file_range_chunks(file: BinaryIO, start: int, end: int, chunk_bytes: int = FILE_CHUNK_BYTES) -> Iterator[bytes]:
+    """分段讀出已開啟檔案中 start~end（含）的內容，讀完（或用戶端中斷）後關閉檔案"""
+    try:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            data = file.read(min(chunk_bytes, remaining))
+            if not data:
+                return
+            remaining -= len(data)
+            yield data
+    finally:
+        file.close()
+
+
+# ============ Excel ============
+
+def _excel_styles() -> list:
+    """
+    具名樣式：整份活頁簿共用一組字型／填色／框線，
+    每個儲存格只記錄樣式名稱，不會為每個值建立新的樣式物件
+    """
+    from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+
+    thin = Side(style="thin")
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+
+    def fill(color: str) -> PatternFill:
+        return PatternFill(start_color=color, end_color=color, fill_type="solid")
+
+    header = NamedStyle(name="export_header")
+    header.font = Font(bold=True, color="FFFFFF")
+    header.fill = fill("4A90D9")
+    header.alignment = Alignment(horizontal="center", vertical="center")
+    header.border = border
+
+    styles = [header]
+    for trans_type, color in (("income", "E8F5E9"), ("expense", "FFEBEE")):
+        cell = NamedStyle(name=f"export_{trans_type}")
+        cell.fill = fill(color)
+        cell.border = border
+
+        # 金額欄位靠右對齊
+        amount = NamedStyle(name=f"export_{trans_type}_amount")
+        amount.fill = fill(color)
+        amount.border = border
+        amount.alignment = Alignment(horizontal="right")
+
+        styles += [cell, amount]
+    return styles
+
+
+def write_excel(chunks: Iterable[list], output: BinaryIO):
+    """
+    以 write-only 模式寫出 Excel：每列寫入後就序列化到暫存 XML，
+    記憶體用量與列數無關
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("記帳明細")
+
+    for style in _excel_styles():
+        wb.add_named_style(style)
+
+    # write-only 模式必須在寫入任何一列前設定欄寬
+    for column, width in EXCEL_COLUMN_WIDTHS.items():
+        ws.column_dimensions[column].width = width
+
+    def styled_row(styles: list) -> list:
+        cells = []
+        for style in styles:
+            cell = WriteOnlyCell(ws)
+            cell.style = style
+            cells.append(cell)
+        return cells
+
+    header = styled_row(["export_header"] * len(EXPORT_HEADERS))
+    for cell, value in zip(header, EXPORT_HEADERS):
+        cell.value = value
+    ws.append(header)
+
+    # append 會立即把整列序列化，同一組已套用樣式的儲存格可以每列重複使用，只換值
+    row_cells = {}
+    for trans_type in ("income", "expense"):
+        style = f"export_{trans_type}"
+        row_cells[trans_type] = styled_row([style, style, style, f"{style}_amount", style])
+
+    for rows in chunks:
+        for t in rows:
+            cells = row_cells["income" if t["type"] == "income" else "expense"]
+            for cell, value in zip(cells, export_row(t)):
+                cell.value = value
+            ws.append(cells)
+
+    wb.save(output)
+
+
+def spooled_excel(chunks: Iterable[list], spool_bytes: int) -> BinaryIO:
+    """寫出 Excel 到暫存檔（小檔留在記憶體，超過 spool_bytes 才寫到磁碟），回傳已倒回開頭的檔案"""
+    output = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+    try:
+        write_excel(chunks, output)
+    except Exception:
+        output.close()
+        raise
+    output.seek(0)
+    return output
+
+
+def file_chunks(file: BinaryIO, chunk_bytes: int = FILE_CHUNK_BYTES) -> Iterator[bytes]:
+    """分段讀出檔案內容，讀完（或用戶端中斷）後關閉檔案"""
+    try:
+        while True:
+            data = file.read(chunk_bytes)
+            if not data:
+                return
+            yield data
+    finally:
+        file.close()
+
+
+# ============ Parquet / Arrow ============
+
+def columnar_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def _require_pyarrow():
+    if not columnar_available():
+        raise RuntimeError("Parquet / Arrow 匯出需要安裝 pyarrow：pip install pyarrow")
+
+
+def arrow_schema():
+    """時間為 timestamp、類型與分類以 dictionary 編碼、金額為 float64"""
+    import pyarrow as pa
+
+    return pa.schema([
+        ("created_at", pa.timestamp("s")),
+        ("type", pa.dictionary(pa.int8(), pa.string())),
+        ("category", pa.dictionary(pa.int32(), pa.string())),
+        ("amount", pa.float64()),
+        ("description", pa.string()),
+    ])
+
+
+def arrow_batches(chunks: Iterable[dict]) -> Iterator:
+    """每批欄位資料 -> RecordBatch，欄位直接轉成 Arrow 陣列，不經過逐列的 dict"""
+    import pyarrow as pa
+
+    schema = arrow_schema()
+    for columns in chunks:
+        yield pa.record_batch([
+            pa.array(columns["created_at"], pa.string()).cast(pa.timestamp("s")),
+            pa.array(columns["type"], pa.string()).dictionary_encode().cast(schema.field("type").type),
+            pa.array(columns["category"], pa.string()).dictionary_encode(),
+            pa.array(columns["amount"], pa.float64()),
+            pa.array(columns["description"], pa.string()),
+        ], schema=schema)
+
+
+def arrow_stream_chunks(chunks: Iterable[dict], compression: str = "zstd") -> Iterator[bytes]:
+    """
+    Arrow IPC 串流格式：每批寫成一個壓縮過的 record batch 立即產出
+    每批的分類字典可能不同，串流格式允許替換字典
+    """
+    _require_pyarrow()
+    import pyarrow as pa
+
+    buffer = io.BytesIO()
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+    with pa.ipc.new_stream(buffer, arrow_schema(), options=options) as writer:
+        for batch in arrow_batches(chunks):
+            writer.write_batch(batch)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    # 結束標記（沒有任何資料時也包含 schema）
+    yield buffer.getvalue()
+
+
+def write_parquet(chunks: Iterable[dict], output: BinaryIO, compression: str = "zstd"):
+    """寫出 Parquet，累積到 PARQUET_ROW_GROUP_ROWS 才寫一個 row group"""
+    _require_pyarrow()
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema()
+    with pq.ParquetWriter(output, schema, compression=compression) as writer:
+        pending = []
+        pending_rows = 0
+        for batch in arrow_batches(chunks):
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            if pending_rows >= PARQUET_ROW_GROUP_ROWS:
+                writer.write_table(pa.Table.from_batches(pending, schema), row_group_size=pending_rows)
+                pending, pending_rows = [], 0
+        if pending:
+            writer.write_table(pa.Table.from_batches(pending, schema), row_group_size=pending_rows)
+
+
+def spooled_parquet(chunks: Iterable[dict], spool_bytes: int) -> BinaryIO:
+    """
+    寫出 Parquet 到暫存檔，回傳已倒回開頭的檔案
+    Parquet 的 metadata 在檔尾，必須整份寫完才能送出
+    """
+    output = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+    try:
+        write_parquet(chunks, output)
+    except Exception:
+        output.close()
+        raise
+
+    output.seek(0)
+    return output
+
+
+# ============ 匯出格式 ============
+
+def write_csv(chunks: Iterable[list], output: BinaryIO):
+    for data in csv_chunks(chunks):
+        output.write(data)
+
+
+def write_arrow_stream(chunks: Iterable[dict], output: BinaryIO):
+    for data in arrow_stream_chunks(chunks):
+        output.write(data)
+
+
+@dataclass(frozen=True)
+class ExportFormat:
+    """匯出格式；columnar 為 True 時輸入是 iter_transaction_columns_for_export 的欄位資料"""
+    extension: str
+    media_type: str
+    columnar: bool
+    write: Callable[[Iterable, BinaryIO], None]
+
+
+EXPORT_FORMATS = {
+    "csv": ExportFormat("csv", "text/csv", False, write_csv),
+    "excel": ExportFormat("xlsx", XLSX_MEDIA_TYPE, False, write_excel),
+    "parquet": ExportFormat("parquet", PARQUET_MEDIA_TYPE, True, write_parquet),
+    "arrow": ExportFormat("arrows", ARROW_STREAM_MEDIA_TYPE, True, write_arrow_stream),
+}
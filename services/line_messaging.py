@@ -0,0 +1,214 @@
+"""
+LINE 訊息回覆
+應用程式啟動時建立一組共用的 AsyncApiClient（保留連線），
+worker thread 把回覆排進 event loop 後就繼續處理下一個事件，不等待 LINE API
+- 429 / 5xx 以指數退避重試
+- reply token 已過期（或等太久可能過期）時改用 push，並帶 X-Line-Retry-Key 避免重複發送
+- 5xx 或逾時的 reply 可能已經送達，之後再收到 reply token 失效不改用 push，避免用戶收到兩次
+"""
+import asyncio
+import random
+import threading
+import time
+import uuid
+from typing import Optional
+
+from linebot.v3.messaging import (
+    AsyncApiClient,
+    AsyncMessagingApi,
+    Configuration,
+    MessageAction,
+    PushMessageRequest,
+    QuickReply,
+    QuickReplyItem,
+    ReplyMessageRequest,
+    URIAction,
+)
+from linebot.v3.messaging.exceptions import ApiException
+
+# reply token 約 1 分鐘後失效，保留一點餘裕
+REPLY_TOKEN_TTL_SECONDS = 50
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def _build_quick_reply() -> QuickReply:
+    return QuickReply(
+        items=[
+            QuickReplyItem(
+                action=MessageAction(label="今日收支", text="今日收支")
+            ),
+            QuickReplyItem(
+                action=MessageAction(label="習慣", text="習慣")
+            ),
+            QuickReplyItem(
+                action=MessageAction(label="能量幣", text="能量幣")
+            ),
+            QuickReplyItem(
+                action=URIAction(label="查看網頁版", uri="https://line-voice-accounting.onrender.com")
+            ),
+            QuickReplyItem(
+                action=MessageAction(label="使用說明", text="使用說明")
+            ),
+        ]
+    )
+
+
+# 常駐的快速回覆按鈕（只建立一次，所有訊息共用，請勿修改）
+QUICK_REPLY = _build_quick_reply()
+
+
+def _is_invalid_reply_token(error: ApiException) -> bool:
+    return error.status == 400 and "reply token" in str(error.body or "").lower()
+
+
+class LineReplySender:
+    """共用的非同步訊息發送器"""
+
+    def __init__(self, configuration: Configuration, max_retries: int = 3, backoff_base: float = 0.5):
+        self.configuration = configuration
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._api_client: Optional[AsyncApiClient] = None
+        self._api: Optional[AsyncMessagingApi] = None
+        self._pending = set()
+        self._lock = threading.Lock()
+
+        self.replied = 0
+        self.pushed = 0
+        self.push_fallbacks = 0
+        self.unconfirmed = 0
+        self.retries = 0
+        self.failed = 0
+
+    async def start(self):
+        """在 event loop 中建立共用的 client（應用程式啟動時呼叫）"""
+        if self._api is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._api_client = AsyncApiClient(self.configuration)
+        self._api = AsyncMessagingApi(self._api_client)
+
+    def reply(self, reply_token: str, user_id: str, messages: list, event_timestamp: Optional[int] = None):
+        """
+        從任何 thread 排入回覆，不等待結果
+        event_timestamp：事件時間（毫秒），用來判斷 reply token 是否可能已過期
+        """
+        if self._loop is None:
+            raise RuntimeError("LineReplySender 尚未啟動")
+
+        future = asyncio.run_coroutine_threadsafe(
+            self._send(reply_token, user_id, messages, event_timestamp),
+            self._loop
+        )
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._discard)
+        return future
+
+    def _discard(self, future):
+        with self._lock:
+            self._pending.discard(future)
+
+    async def _send(self, reply_token: str, user_id: str, messages: list, event_timestamp: Optional[int]):
+        if event_timestamp and time.time() - event_timestamp / 1000 > REPLY_TOKEN_TTL_SECONDS:
+            self.push_fallbacks += 1
+            await self._push(user_id, messages)
+            return
+
+        # 先前的嘗試是否可能已送達 LINE（5xx、逾時等無法確定結果的錯誤）
+        maybe_delivered = False
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self._api.reply_message(
+                    ReplyMessageRequest(reply_token=reply_token, messages=messages)
+                )
+                self.replied += 1
+                return
+            except ApiException as e:
+                if _is_invalid_reply_token(e):
+                    if maybe_delivered:
+                        # reply token 很可能是被先前那次送達的回覆用掉了，push 會讓訊息重複
+                        self.unconfirmed += 1
+                        print("回覆訊息結果不明：先前的嘗試可能已送達，不改用 push")
+                        return
+                    self.push_fallbacks += 1
+                    await self._push(user_id, messages)
+                    return
+                if e.status not in RETRYABLE_STATUS or attempt == self.max_retries:
+                    self.failed += 1
+                    print(f"回覆訊息失敗 ({e.status}): {e.body}")
+                    return
+                if e.status >= 500:
+                    maybe_delivered = True
+            except Exception as e:
+                maybe_delivered = True
+                if attempt == self.max_retries:
+                    self.failed += 1
+                    print(f"回覆訊息失敗: {e}")
+                    return
+
+            self.retries += 1
+            await self._backoff(attempt)
+
+    async def _push(self, user_id: str, messages: list):
+        """以 push 發送；同一個 retry key 讓 LINE 忽略重試造成的重複訊息"""
+        retry_key = str(uuid.uuid4())
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self._api.push_message(
+                    PushMessageRequest(to=user_id, messages=messages),
+                    x_line_retry_key=retry_key
+                )
+                self.pushed += 1
+                return
+            except ApiException as e:
+                # 409：相同 retry key 的請求已經成功
+                if e.status == 409:
+                    self.pushed += 1
+                    return
+                if e.status not in RETRYABLE_STATUS or attempt == self.max_retries:
+                    self.failed += 1
+                    print(f"推播訊息失敗 ({e.status}): {e.body}")
+                    return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.failed += 1
+                    print(f"推播訊息失敗: {e}")
+                    return
+
+            self.retries += 1
+            await self._backoff(attempt)
+
+    async def _backoff(self, attempt: int):
+        delay = self.backoff_base * (2 ** attempt)
+        await asyncio.sleep(delay + random.uniform(0, delay / 2))
+
+    async def close(self, timeout: float = 10.0):
+        """等待排入的回覆送出後關閉 client"""
+        with self._lock:
+            pending = [asyncio.wrap_future(future) for future in self._pending]
+        if pending:
+            await asyncio.wait(pending, timeout=timeout)
+
+        api_client, self._api_client = self._api_client, None
+        self._api = None
+        if api_client is not None:
+            await api_client.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "replied": self.replied,
+            "pushed": self.pushed,
+            "push_fallbacks": self.push_fallbacks,
+            "unconfirmed": self.unconfirmed,
+            "retries": self.retries,
+            "failed": self.failed,
+        }
@@ -0,0 +1,189 @@
+"""
+用戶查詢結果快取
+統計、分類、預算狀態只取決於用戶的資料與查詢參數，結果以
+(函式, 用戶, 參數, 資料版本, 今天日期) 為鍵快取：資料版本改變後舊的鍵不會再被查到
+- 記憶體層：行程內 LRU + TTL
+- 共用層（可選）：Redis，多個 worker 共用計算結果；鍵含資料版本，不需要另外失效
+用戶的資料版本在記憶體中短暫保留；本行程寫入交易、預算後呼叫 invalidate() 立即丟掉，
+其他行程的寫入（manage.py 維護指令、其他 worker）最多 version_ttl 秒後生效；
+帶 ETag 的 API 每次以 refresh_version() 讀取最新版本，不受此延遲影響
+"""
+import copy
+import inspect
+import json
+import threading
+from datetime import date
+from functools import wraps
+from typing import Any, Callable
+
+from services.cache import TTLCache
+
+_MISSING = object()
+
+
+class RedisBackend:
+    """以 Redis 作為共用層；連線或序列化失敗時視為未命中，不影響查詢"""
+
+    def __init__(self, url: str, prefix: str = "query-cache:"):
+        import redis
+
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.errors = 0
+
+    def get(self, key: str) -> Any:
+        try:
+            raw = self._client.get(self.prefix + key)
+        except Exception as e:
+            self.errors += 1
+            print(f"查詢快取讀取失敗: {e}")
+            return _MISSING
+        return _MISSING if raw is None else json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: float):
+        try:
+            self._client.set(self.prefix + key, json.dumps(value, ensure_ascii=False), ex=max(int(ttl), 1))
+        except Exception as e:
+            self.errors += 1
+            print(f"查詢快取寫入失敗: {e}")
+
+
+def create_backend(url: str):
+    """依設定建立共用層；未設定或未安裝 redis 時只使用記憶體層"""
+    if not url:
+        return None
+    try:
+        return RedisBackend(url)
+    except ImportError:
+        print("未安裝 redis 套件（pip install redis），查詢快取只使用記憶體層")
+        return None
+
+
+class QueryCache:
+    """用戶查詢結果快取（被快取的函式第一個參數必須是 user_id）"""
+
+    def __init__(
+        self,
+        version_loader: Callable[[str], int],
+        maxsize: int = 10000,
+        ttl: float = 600,
+        version_ttl: float = 10,
+        backend=None
+    ):
+        self.ttl = ttl
+        self.backend = backend
+        self._version_loader = version_loader
+        self._results = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._versions = TTLCache(maxsize=maxsize, ttl=version_ttl)
+        self._generations = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+        self.hits_memory = 0
+        self.hits_shared = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def cached(self, func):
+        """快取函式結果的裝飾器；回傳的是副本，呼叫端修改不會影響快取"""
+        signature = inspect.signature(func)
+
+        @wraps(func)
+        def wrapper(user_id: str, *args, **kwargs):
+            bound = signature.bind(user_id, *args, **kwargs)
+            bound.apply_defaults()
+            params = tuple(value for name, value in bound.arguments.items() if name != "user_id")
+            key = (func.__name__, user_id, params, self._version(user_id), date.today().isoformat())
+
+            value = self._results.get(key, _MISSING)
+            if value is not _MISSING:
+                self._count("hits_memory")
+                return copy.deepcopy(value)
+
+            shared_key = json.dumps(key, ensure_ascii=False, default=str)
+            if self.backend is not None:
+                value = self.backend.get(shared_key)
+                if value is not _MISSING:
+                    self._results.set(key, value)
+                    self._count("hits_shared")
+                    return copy.deepcopy(value)
+
+            self._count("misses")
+            value = func(user_id, *args, **kwargs)
+            self._results.set(key, copy.deepcopy(value))
+            if self.backend is not None:
+                self.backend.set(shared_key, value, self.ttl)
+            return value
+
+        wrapper.uncached = func
+        return wrapper
+
+    def _version(self, user_id: str) -> int:
+        version = self._versions.get(user_id)
+        if version is not None:
+            return version
+        return self.refresh_version(user_id)
+
+    def refresh_version(self, user_id: str) -> int:
+        """
+        不經過記憶體，從資料庫讀取最新版本並保留給之後的查詢使用
+        計算 ETag 時呼叫：其他行程的寫入不會呼叫本行程的 invalidate()，
+        這樣同一個請求中的快取結果才會與 ETag 是同一個版本
+        """
+        # 讀取期間有寫入（invalidate）時不保留讀到的版本，避免把舊版本放回去
+        generation = self._generation(user_id)
+        version = self._version_loader(user_id)
+        with self._lock:
+            if self._generation_locked(user_id) == generation:
+                current = self._versions.get(user_id)
+                if current is None or version > current:
+                    self._versions.set(user_id, version)
+        return version
+
+    def _generation(self, user_id: str) -> tuple:
+        with self._lock:
+            return self._generation_locked(user_id)
+
+    def _generation_locked(self, user_id: str) -> tuple:
+        return self._epoch, self._generations.get(user_id, 0)
+
+    def invalidate(self, user_id: str):
+        """用戶的資料已寫入（需在 commit 之後呼叫）：丟掉記憶體中的版本與結果"""
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            self._versions.pop(user_id)
+            self.invalidations += 1
+        self._results.discard_where(lambda key: key[1] == user_id)
+
+    def invalidate_all(self):
+        """批次維護工作（重建彙總等）後清空記憶體層"""
+        with self._lock:
+            self._epoch += 1
+            self._versions.clear()
+            self.invalidations += 1
+        self._results.clear()
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self) -> dict:
+        """命中率與淘汰數"""
+        results = self._results.stats()
+        with self._lock:
+            hits = self.hits_memory + self.hits_shared
+            lookups = hits + self.misses
+            stats = {
+                "size": results["size"],
+                "maxsize": results["maxsize"],
+                "hits_memory": self.hits_memory,
+                "hits_shared": self.hits_shared,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "evictions": results["evictions"],
+                "invalidations": self.invalidations,
+                "shared": self.backend is not None,
+            }
+        if self.backend is not None:
+            stats["shared_errors"] = self.backend.errors
+        return stats
@@ -0,0 +1,74 @@
+"""
+Session token 簽章
+格式：<session_id>.<user_id(base64url)>.<到期時間戳>.<HMAC 簽章>
+簽章與到期時間可在本機驗證，不需要查詢資料庫
+"""
+import base64
+import hashlib
+import hmac
+import time
+from dataclasses import dataclass
+from typing import Optional
+from config import SESSION_SECRET
+
+
+@dataclass(frozen=True)
+class SessionToken:
+    """驗證過簽章的 session token 內容"""
+    session_id: str
+    user_id: str
+    expires_at: int  # Unix 時間戳
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(SESSION_SECRET.encode("utf-8"), payload.encode("utf-8"), hashlib.sha256).digest()
+    return _b64encode(digest)
+
+
+def sign_session(session_id: str, user_id: str, expires_at: int) -> str:
+    """產生帶簽章的 session token"""
+    payload = f"{session_id}.{_b64encode(user_id.encode('utf-8'))}.{expires_at}"
+    return f"{payload}.{_sign(payload)}"
+
+
+def is_signed_token(token: str) -> bool:
+    """判斷是否為帶簽章的 token（舊版 cookie 只有 session_id）"""
+    return token.count(".") == 3
+
+
+def verify_session_token(token: str) -> Optional[SessionToken]:
+    """驗證簽章與到期時間，失敗回傳 None"""
+    if not token or not is_signed_token(token):
+        return None
+
+    session_id, user_part, expires_part, signature = token.split(".")
+    payload = f"{session_id}.{user_part}.{expires_part}"
+
+    if not hmac.compare_digest(signature, _sign(payload)):
+        return None
+
+    try:
+        expires_at = int(expires_part)
+        user_id = _b64decode(user_part).decode("utf-8")
+    except ValueError:
+        return None
+
+    if expires_at <= time.time():
+        return None
+
+    return SessionToken(session_id=session_id, user_id=user_id, expires_at=expires_at)
+
+
+def session_id_from_token(token: str) -> str:
+    """取出 token 中的 session_id（不驗證簽章）"""
+    if is_signed_token(token):
+        return token.split(".", 1)[0]
+    return token
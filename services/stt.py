@@ -0,0 +1,326 @@
+"""
+語音轉文字（STT）後端
+- openai：遠端 Whisper API（預設）
+- local：本機 CPU 上的 faster-whisper 量化模型，在獨立的常駐 process 中保持載入
+- fake：固定回傳結果，供測試與離線開發使用
+由 STT_BACKEND 設定選擇；可另設 STT_FALLBACK_BACKEND，主要後端失敗時改用備援
+"""
+import asyncio
+import hashlib
+import importlib.util
+import io
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from config import (
+    OPENAI_API_KEY,
+    STT_BACKEND,
+    STT_FALLBACK_BACKEND,
+    STT_OPENAI_MODEL,
+    STT_LOCAL_MODEL,
+    STT_LOCAL_COMPUTE_TYPE,
+    STT_LOCAL_CPU_THREADS,
+)
+
+AUDIO_FILENAME = "voice.m4a"
+
+
+def _read_bytes(audio) -> bytes:
+    """bytes 或檔案物件轉成 bytes（送進其他 process 需要可序列化的資料）"""
+    if isinstance(audio, (bytes, bytearray)):
+        return bytes(audio)
+    audio.seek(0)
+    return audio.read()
+
+
+class STTBackend(ABC):
+    """語音轉文字後端介面"""
+
+    name = "base"
+
+    @property
+    @abstractmethod
+    def model(self) -> str:
+        """模型識別字串（用於轉文字快取的鍵）"""
+
+    def start(self) -> float:
+        """預先載入（應用程式啟動時呼叫），回傳花費秒數"""
+        return 0.0
+
+    @abstractmethod
+    def transcribe(self, audio, language: str) -> str:
+        """audio 可以是 bytes 或已開啟的檔案物件"""
+
+    async def transcribe_async(self, audio, language: str) -> str:
+        """預設在 thread 中執行同步版本"""
+        return await asyncio.to_thread(self.transcribe, audio, language)
+
+    def transcribe_with_model(self, audio, language: str) -> tuple:
+        """回傳 (文字, 實際產生文字的模型)，轉文字快取以產生結果的模型為鍵"""
+        return self.transcribe(audio, language), self.model
+
+    async def transcribe_with_model_async(self, audio, language: str) -> tuple:
+        """transcribe_with_model 的非同步版本"""
+        return await self.transcribe_async(audio, language), self.model
+
+    def close(self):
+        pass
+
+    async def aclose(self):
+        self.close()
+
+
+class OpenAIBackend(STTBackend):
+    """遠端 Whisper API，共用同一組 OpenAI client"""
+
+    name = "openai"
+
+    def __init__(self, model: str = "whisper-1", api_key: Optional[str] = None):
+        self._model = model
+        self._api_key = api_key
+        self._lock = threading.Lock()
+        self._client = None
+        self._async_client = None
+
+    @property
+    def model(self) -> str:
+        return self._model
+
+    def _get_client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from openai import OpenAI
+                    self._client = OpenAI(api_key=self._api_key)
+        return self._client
+
+    def _get_async_client(self):
+        if self._async_client is None:
+            from openai import AsyncOpenAI
+            self._async_client = AsyncOpenAI(api_key=self._api_key)
+        return self._async_client
+
+    def transcribe(self, audio, language: str) -> str:
+        transcript = self._get_client().audio.transcriptions.create(
+            model=self._model,
+            file=(AUDIO_FILENAME, audio),
+            language=language
+        )
+        return transcript.text
+
+    async def transcribe_async(self, audio, language: str) -> str:
+        transcript = await self._get_async_client().audio.transcriptions.create(
+            model=self._model,
+            file=(AUDIO_FILENAME, audio),
+            language=language
+        )
+        return transcript.text
+
+    def close(self):
+        client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+    async def aclose(self):
+        self.close()
+        async_client, self._async_client = self._async_client, None
+        if async_client is not None:
+            await async_client.close()
+
+
+# ============ 本機 faster-whisper（在 worker process 中執行） ============
+
+_local_model = None
+
+
+def _load_local_model(model_size: str, compute_type: str, cpu_threads: int):
+    """worker process 啟動時載入模型，之後一直保持載入"""
+    global _local_model
+    from faster_whisper import WhisperModel
+    _local_model = WhisperModel(model_size, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+
+
+def _local_warmup() -> bool:
+    return _local_model is not None
+
+
+def _local_transcribe(audio: bytes, language: str) -> str:
+    segments, _ = _local_model.transcribe(io.BytesIO(audio), language=language, beam_size=1, vad_filter=True)
+    return "".join(segment.text for segment in segments).strip()
+
+
+class LocalWhisperBackend(STTBackend):
+    """
+    本機 CPU 語音辨識（faster-whisper / CTranslate2 int8 量化模型）
+    模型在單一常駐 worker process 中載入一次，不佔用 web process 的 GIL
+    """
+
+    name = "local"
+
+    def __init__(self, model_size: str = "small", compute_type: str = "int8", cpu_threads: int = 0):
+        if importlib.util.find_spec("faster_whisper") is None:
+            raise RuntimeError("本機語音辨識需要安裝 faster-whisper：pip install faster-whisper")
+
+        self.model_size = model_size
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def model(self) -> str:
+        return f"faster-whisper-{self.model_size}-{self.compute_type}"
+
+    def start(self) -> float:
+        """啟動 worker 並等待模型載入完成，回傳載入秒數"""
+        started = time.perf_counter()
+        self._get_executor().submit(_local_warmup).result()
+        return time.perf_counter() - started
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=1,
+                        initializer=_load_local_model,
+                        initargs=(self.model_size, self.compute_type, self.cpu_threads),
+                    )
+        return self._executor
+
+    def transcribe(self, audio, language: str) -> str:
+        return self._get_executor().submit(_local_transcribe, _read_bytes(audio), language).result()
+
+    async def transcribe_async(self, audio, language: str) -> str:
+        future = self._get_executor().submit(_local_transcribe, _read_bytes(audio), language)
+        return await asyncio.wrap_future(future)
+
+    def close(self):
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+class FakeBackend(STTBackend):
+    """
+    固定結果的假後端
+    responses 以音檔 SHA-256 對應回傳文字，找不到時回傳 default
+    """
+
+    name = "fake"
+
+    def __init__(self, responses: Optional[dict] = None, default: str = "午餐 150", latency: float = 0.0):
+        self.responses = responses or {}
+        self.default = default
+        self.latency = latency
+        self.calls = 0
+
+    @property
+    def model(self) -> str:
+        return "fake"
+
+    def transcribe(self, audio, language: str) -> str:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        digest = hashlib.sha256(_read_bytes(audio)).hexdigest()
+        return self.responses.get(digest, self.default)
+
+
+class FallbackBackend(STTBackend):
+    """主要後端失敗時改用備援後端"""
+
+    def __init__(self, primary: STTBackend, fallback: STTBackend):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = f"{primary.name}+{fallback.name}"
+        self.fallbacks = 0
+
+    @property
+    def model(self) -> str:
+        # 快取查詢使用主要模型的鍵；備援產生的結果以備援模型為鍵（見 transcribe_with_model）
+        return self.primary.model
+
+    def start(self) -> float:
+        return self.primary.start() + self.fallback.start()
+
+    def transcribe(self, audio, language: str) -> str:
+        return self.transcribe_with_model(audio, language)[0]
+
+    async def transcribe_async(self, audio, language: str) -> str:
+        return (await self.transcribe_with_model_async(audio, language))[0]
+
+    def transcribe_with_model(self, audio, language: str) -> tuple:
+        try:
+            return self.primary.transcribe_with_model(audio, language)
+        except Exception as e:
+            print(f"語音辨識後端 {self.primary.name} 失敗，改用 {self.fallback.name}: {e}")
+            self.fallbacks += 1
+            return self.fallback.transcribe_with_model(audio, language)
+
+    async def transcribe_with_model_async(self, audio, language: str) -> tuple:
+        try:
+            return await self.primary.transcribe_with_model_async(audio, language)
+        except Exception as e:
+            print(f"語音辨識後端 {self.primary.name} 失敗，改用 {self.fallback.name}: {e}")
+            self.fallbacks += 1
+            return await self.fallback.transcribe_with_model_async(audio, language)
+
+    def close(self):
+        self.primary.close()
+        self.fallback.close()
+
+    async def aclose(self):
+        await self.primary.aclose()
+        await self.fallback.aclose()
+
+
+def create_backend(name: str) -> STTBackend:
+    """依名稱建立後端"""
+    if name == "openai":
+        return OpenAIBackend(model=STT_OPENAI_MODEL, api_key=OPENAI_API_KEY)
+    if name == "local":
+        return LocalWhisperBackend(
+            model_size=STT_LOCAL_MODEL,
+            compute_type=STT_LOCAL_COMPUTE_TYPE,
+            cpu_threads=STT_LOCAL_CPU_THREADS,
+        )
+    if name == "fake":
+        return FakeBackend()
+    raise ValueError(f"未知的語音辨識後端：{name}")
+
+
+_backend_lock = threading.Lock()
+_backend: Optional[STTBackend] = None
+
+
+def get_backend() -> STTBackend:
+    """取得設定中選擇的後端（整個 process 共用一個）"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend = create_backend(STT_BACKEND)
+                if STT_FALLBACK_BACKEND and STT_FALLBACK_BACKEND != STT_BACKEND:
+                    backend = FallbackBackend(backend, create_backend(STT_FALLBACK_BACKEND))
+                _backend = backend
+    return _backend
+
+
+def set_backend(backend: Optional[STTBackend]):
+    """替換目前的後端（測試或基準測試使用）"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+async def close_backend():
+    """關閉目前的後端"""
+    global _backend
+    with _backend_lock:
+        backend, _backend = _backend, None
+    if backend is not None:
+        await backend.aclose()
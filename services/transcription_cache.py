@@ -0,0 +1,133 @@
+"""
+語音轉文字快取
+以音檔內容的 SHA-256 為鍵（轉傳的語音、重試的訊息內容相同），
+先查行程內 LRU，再查資料庫 transcription_cache 表，都沒有才呼叫遠端語音辨識
+資料庫層依筆數淘汰最久未使用的項目；命中不會立即寫入資料庫，
+使用時間累積後批次更新（寫入新結果前一定先更新，淘汰時看到的是最新的使用時間）
+"""
+import threading
+import time
+from typing import Optional
+
+from services.cache import TTLCache
+
+# 記憶體層的存活時間（資料庫層依筆數淘汰，不設時間）
+MEMORY_TTL_SECONDS = 24 * 3600
+
+# 累積多少個命中的項目，或距離上次更新多久，就批次更新資料庫的使用時間
+TOUCH_BATCH_SIZE = 100
+TOUCH_FLUSH_SECONDS = 300
+
+
+class TranscriptionCache:
+    """兩層式轉文字快取：記憶體 LRU + 資料庫（依筆數淘汰最久未使用）"""
+
+    def __init__(self, memory_size: int = 512, max_entries: int = 20000):
+        self.max_entries = max_entries
+        self._memory = TTLCache(maxsize=memory_size, ttl=MEMORY_TTL_SECONDS)
+        self._lock = threading.Lock()
+        self._pending_touches = {}  # cache_key -> 尚未寫入資料庫的命中次數
+        self._last_flush = time.monotonic()
+
+        self.hits_memory = 0
+        self.hits_db = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.evicted = 0
+
+    @staticmethod
+    def make_key(digest: str, model: str, language: str) -> str:
+        """
+        digest 為音檔內容的 SHA-256（十六進位）
+        快取鍵包含模型與語言，換模型時不會沿用舊結果
+        """
+        return f"{model}:{language}:{digest}"
+
+    def get(self, key: str, audio_size: int) -> Optional[str]:
+        """查詢快取，命中時累計省下的上傳量；資料庫層讀取失敗視為未命中，改走語音辨識"""
+        from database import get_cached_transcription
+
+        text = self._memory.get(key)
+        if text is not None:
+            self._record_hit(key, "memory", audio_size)
+            return text
+
+        try:
+            text = get_cached_transcription(key)
+        except Exception as e:
+            print(f"讀取語音轉文字快取失敗: {e}")
+            text = None
+
+        if text is not None:
+            self._memory.set(key, text)
+            self._record_hit(key, "db", audio_size)
+            return text
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, text: str, audio_size: int):
+        """寫入兩層快取（空字串不快取，讓下次可以重試）"""
+        from database import save_transcription
+
+        if not text:
+            return
+
+        self._memory.set(key, text)
+        self.flush()
+        try:
+            evicted = save_transcription(key, text, audio_size, self.max_entries)
+        except Exception as e:
+            print(f"寫入語音轉文字快取失敗: {e}")
+            return
+
+        with self._lock:
+            self.evicted += evicted
+
+    def _record_hit(self, key: str, tier: str, audio_size: int):
+        now = time.monotonic()
+        with self._lock:
+            if tier == "memory":
+                self.hits_memory += 1
+            else:
+                self.hits_db += 1
+            self.bytes_saved += audio_size
+
+            # 記憶體層的命中也算使用，否則常用的項目在資料庫中會被當成最久未使用而淘汰
+            self._pending_touches[key] = self._pending_touches.get(key, 0) + 1
+            due = len(self._pending_touches) >= TOUCH_BATCH_SIZE or now - self._last_flush >= TOUCH_FLUSH_SECONDS
+
+        if due:
+            self.flush()
+
+    def flush(self):
+        """將累積的命中次數與使用時間寫入資料庫"""
+        from database import touch_transcriptions
+
+        with self._lock:
+            pending, self._pending_touches = self._pending_touches, {}
+            self._last_flush = time.monotonic()
+
+        if not pending:
+            return
+        try:
+            touch_transcriptions(pending)
+        except Exception as e:
+            print(f"更新語音轉文字快取使用時間失敗: {e}")
+
+    def stats(self) -> dict:
+        """命中率與省下的上傳量"""
+        with self._lock:
+            hits = self.hits_memory + self.hits_db
+            total = hits + self.misses
+            return {
+                "hits_memory": self.hits_memory,
+                "hits_db": self.hits_db,
+                "misses": self.misses,
+                "hit_rate": round(hits / total, 4) if total else 0.0,
+                "bytes_saved": self.bytes_saved,
+                "evicted": self.evicted,
+                "pending_touches": len(self._pending_touches),
+                "memory_size": len(self._memory),
+            }
@@ -0,0 +1,92 @@
+"""
+Webhook 事件去重
+LINE 在逾時等情況會重送 Webhook，同一個訊息 ID 只處理一次：
+先查行程內的快取，再以資料庫 webhook_events 表登記（多個 worker / 多台主機共用）
+重複的事件在下載語音、轉文字、寫入交易之前就直接略過
+"""
+import threading
+import time
+
+from services.cache import TTLCache
+
+
+class EventDeduplicator:
+    """以事件 ID 登記已處理的 Webhook 事件"""
+
+    def __init__(self, ttl_hours: float = 24, memory_size: int = 10000, cleanup_interval: float = 3600):
+        self.ttl_hours = ttl_hours
+        self.cleanup_interval = cleanup_interval
+        self._seen = TTLCache(maxsize=memory_size, ttl=ttl_hours * 3600)
+        self._lock = threading.Lock()
+        self._last_cleanup = 0.0
+
+        self.claimed = 0
+        self.duplicates_memory = 0
+        self.duplicates_db = 0
+        self.redeliveries = 0
+        self.released = 0
+
+    def claim(self, event_id: str, is_redelivery: bool = False) -> bool:
+        """
+        第一次看到此事件回傳 True（應該處理），重複事件回傳 False（應該略過）
+        """
+        from database import claim_webhook_event
+
+        if is_redelivery:
+            with self._lock:
+                self.redeliveries += 1
+
+        if self._seen.get(event_id):
+            with self._lock:
+                self.duplicates_memory += 1
+            return False
+
+        claimed = claim_webhook_event(event_id)
+        self._seen.set(event_id, True)
+
+        with self._lock:
+            if claimed:
+                self.claimed += 1
+            else:
+                self.duplicates_db += 1
+
+        self._maybe_cleanup()
+        return claimed
+
+    def release(self, event_id: str):
+        """處理失敗時取消登記，讓重送的事件可以重新處理"""
+        from database import release_webhook_event
+
+        self._seen.pop(event_id)
+        release_webhook_event(event_id)
+        with self._lock:
+            self.released += 1
+
+    def _maybe_cleanup(self):
+        """定期清理資料庫中過期的事件記錄"""
+        from database import cleanup_webhook_events
+
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_cleanup < self.cleanup_interval:
+                return
+            self._last_cleanup = now
+
+        try:
+            cleanup_webhook_events(self.ttl_hours)
+        except Exception as e:
+            print(f"清理 Webhook 事件記錄失敗: {e}")
+
+    def stats(self) -> dict:
+        """去重統計"""
+        with self._lock:
+            absorbed = self.duplicates_memory + self.duplicates_db
+            return {
+                "claimed": self.claimed,
+                "duplicates_absorbed": absorbed,
+                "duplicates_memory": self.duplicates_memory,
+                "duplicates_db": self.duplicates_db,
+                "redeliveries_seen": self.redeliveries,
+                "released": self.released,
+                "memory_size": len(self._seen),
+            }
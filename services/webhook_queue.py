@@ -0,0 +1,126 @@
+"""
+Webhook 工作佇列
+Webhook 端點驗證簽章後把事件放進有界佇列並立即回 200，
+由固定數量的 worker 在 thread pool 中執行（語音下載、轉文字、寫資料庫、回覆）
+佇列滿時等待一段時間仍放不進去就拒絕，讓 LINE 稍後重送
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+
+class WebhookQueue:
+    """有界工作佇列 + thread pool，附背壓統計與關閉時排空"""
+
+    def __init__(self, maxsize: int = 100, workers: int = 4, enqueue_timeout: float = 2.0):
+        self.maxsize = maxsize
+        self.workers = workers
+        self.enqueue_timeout = enqueue_timeout
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks = []
+        self._accepting = False
+
+        # 統計（只在 event loop 執行緒中更新，不需要鎖）
+        self._in_flight = 0
+        self._enqueued = 0
+        self._processed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._max_depth = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._run_total = 0.0
+
+    def start(self):
+        """在 event loop 啟動後呼叫，建立佇列與 worker"""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="webhook")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._accepting = True
+
+    async def submit(self, func: Callable, *args) -> bool:
+        """
+        放入一個工作；佇列已滿且在 enqueue_timeout 內仍放不進去時回傳 False
+        """
+        if not self._accepting:
+            self._rejected += 1
+            return False
+
+        try:
+            await asyncio.wait_for(
+                self._queue.put((time.monotonic(), func, args)),
+                timeout=self.enqueue_timeout
+            )
+        except asyncio.TimeoutError:
+            self._rejected += 1
+            return False
+
+        self._enqueued += 1
+        self._max_depth = max(self._max_depth, self._queue.qsize())
+        return True
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            enqueued_at, func, args = await self._queue.get()
+            started = time.monotonic()
+            wait = started - enqueued_at
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            self._in_flight += 1
+            try:
+                await loop.run_in_executor(self._executor, func, *args)
+                self._processed += 1
+            except Exception as e:
+                self._failed += 1
+                print(f"Webhook 事件處理錯誤: {e}")
+            finally:
+                self._in_flight -= 1
+                self._run_total += time.monotonic() - started
+                self._queue.task_done()
+
+    async def drain(self, timeout: float = 25.0):
+        """
+        關閉時呼叫：停止接收新工作，等待佇列中的工作完成（最多 timeout 秒）
+        """
+        if self._queue is None:
+            return
+        self._accepting = False
+
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"Webhook 佇列排空逾時，尚有 {self._queue.qsize() + self._in_flight} 個工作未完成")
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._executor.shutdown(wait=False)
+        self._tasks = []
+        self._queue = None
+        self._executor = None
+
+    def stats(self) -> dict:
+        """背壓與處理統計"""
+        started = self._processed + self._failed + self._in_flight
+        finished = self._processed + self._failed
+        return {
+            "accepting": self._accepting,
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "maxsize": self.maxsize,
+            "in_flight": self._in_flight,
+            "max_depth": self._max_depth,
+            "enqueued": self._enqueued,
+            "processed": self._processed,
+            "failed": self._failed,
+            "rejected": self._rejected,
+            "avg_wait_ms": round(self._wait_total / started * 1000, 2) if started else 0.0,
+            "max_wait_ms": round(self._wait_max * 1000, 2),
+            "avg_run_ms": round(self._run_total / finished * 1000, 2) if finished else 0.0,
+        }
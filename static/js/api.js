@@ -2,8 +2,12 @@
  * API 封裝模組
  */
 const API = {
+    // GET 回應快取的 sessionStorage key 前綴（內容為 { etag, data }）
+    CACHE_PREFIX: 'api-cache:',
+
     /**
      * 發送 API 請求
+     * GET 請求自動帶上次回應的 ETag（If-None-Match），伺服器回 304 時直接使用快取的內容
      */
     async request(url, options = {}) {
         const defaultOptions = {
@@ -13,10 +17,25 @@ const API = {
             credentials: 'include',
         };
 
+        const isGet = !options.method || options.method === 'GET';
+        const cached = isGet ? this.readCache(url) : null;
+        if (isGet) {
+            // 自行驗證 ETag，略過瀏覽器的 HTTP 快取才拿得到 304
+            defaultOptions.cache = 'no-store';
+            if (cached) {
+                defaultOptions.headers['If-None-Match'] = cached.etag;
+            }
+        }
+
         const response = await fetch(url, { ...defaultOptions, ...options });
 
+        if (response.status === 304 && cached) {
+            return cached.data;
+        }
+
         // 處理未授權（只在非登入頁時重定向）
         if (response.status === 401) {
+            this.clearCache();
             if (!window.location.pathname.includes('index.html')) {
                 window.location.href = '/static/index.html';
             }
@@ -32,12 +51,53 @@ const API = {
         // 檢查是否有內容
         const contentType = response.headers.get('content-type');
         if (contentType && contentType.includes('application/json')) {
-            return response.json();
+            const data = await response.json();
+            const etag = response.headers.get('ETag');
+            if (isGet && etag) {
+                this.writeCache(url, etag, data);
+            }
+            return data;
         }
 
         return response;
     },
 
+    /**
+     * 讀取 GET 回應快取（sessionStorage 無法使用時視為沒有快取）
+     */
+    readCache(url) {
+        try {
+            const raw = sessionStorage.getItem(this.CACHE_PREFIX + url);
+            return raw ? JSON.parse(raw) : null;
+        } catch (error) {
+            return null;
+        }
+    },
+
+    /**
+     * 寫入 GET 回應快取
+     */
+    writeCache(url, etag, data) {
+        try {
+            sessionStorage.setItem(this.CACHE_PREFIX + url, JSON.stringify({ etag, data }));
+        } catch (error) {
+            // 容量不足時不快取，下次照常完整取得
+        }
+    },
+
+    /**
+     * 清除所有 GET 回應快取（登出、未授權時）
+     */
+    clearCache() {
+        try {
+            Object.keys(sessionStorage)
+                .filter(key => key.startsWith(this.CACHE_PREFIX))
+                .forEach(key => sessionStorage.removeItem(key));
+        } catch (error) {
+            // sessionStorage 無法使用時沒有快取可清
+        }
+    },
+
     /**
      * GET 請求
      */
@@ -89,6 +149,7 @@ const API = {
      * 登出
      */
     logout() {
+        this.clearCache();
         return this.post('/auth/logout');
     },
 
@@ -159,6 +220,15 @@ const API = {
         return this.get('/api/stats/by-date', params);
     },
 
+    // ============ 儀表板 API ============
+
+    /**
+     * 取得儀表板全部資料（摘要、分類、趨勢、最近記帳）
+     */
+    getDashboard(params = {}) {
+        return this.get('/api/dashboard', params);
+    },
+
     // ============ 匯出 API ============
 
     /**
@@ -0,0 +1,16 @@
+"""
+測試環境：資料庫使用暫存目錄中的本機檔案（libsql 支援本機路徑），LINE 設定填入測試值
+需在匯入 config / database 之前設定環境變數
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault("TURSO_DATABASE_URL", os.path.join(tempfile.mkdtemp(prefix="tests-"), "test.db"))
+os.environ.setdefault("TURSO_AUTH_TOKEN", "")
+os.environ.setdefault("LINE_CHANNEL_ACCESS_TOKEN", "test-access-token")
+os.environ.setdefault("LINE_CHANNEL_SECRET", "test-channel-secret")
+os.environ.setdefault("SESSION_SECRET", "test-session-secret")
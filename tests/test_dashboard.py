@@ -0,0 +1,36 @@
+"""儀表板 API 加上 conditional_get 後，每個請求只驗證一次 session"""
+from fastapi.testclient import TestClient
+
+import database
+import main
+from routers import auth
+
+
+def test_dashboard_validates_session_once(monkeypatch):
+    lookups = []
+
+    def get_session(session_id):
+        lookups.append(session_id)
+        return {"user_id": "U-dashboard-test", "display_name": "測試", "picture_url": None}
+
+    monkeypatch.setattr(auth, "get_session", get_session)
+
+    with TestClient(main.app) as client:
+        client.cookies.set(auth.SESSION_COOKIE_NAME, "session-1")
+        transaction_id = database.add_transaction("U-dashboard-test", "expense", 180, "餐飲", "晚餐")
+        response = client.get("/api/dashboard")
+
+        assert response.status_code == 200
+        assert lookups == ["session-1"]
+        body = response.json()
+        assert set(body) == {"summary", "categories", "trends", "recent", "errors"}
+        assert body["errors"] == []
+        assert body["summary"]["total_expense"] >= 180
+        assert "餐飲" in {row["category"] for row in body["categories"]}
+        assert body["trends"]
+        assert body["recent"][0]["id"] == transaction_id
+
+        lookups.clear()
+        cached = client.get("/api/dashboard", headers={"If-None-Match": response.headers["ETag"]})
+        assert cached.status_code == 304
+        assert lookups == ["session-1"]
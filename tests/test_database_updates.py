@@ -0,0 +1,40 @@
+"""分頁查詢與 update_* 動態組出的參數要以 tuple 傳給 libsql（實際跑在測試資料庫上）"""
+import database
+
+
+def setup_module():
+    database.init_db()
+
+
+def test_paginated_transactions_with_filters():
+    user_id = "U-paginated-test"
+    for amount in (100, 200, 300):
+        database.add_transaction(user_id, "expense", amount, "餐飲", "午餐")
+    database.add_transaction(user_id, "income", 5000, "薪資", None)
+
+    result = database.get_transactions_paginated(
+        user_id, page=1, per_page=2, trans_type="expense", category="餐飲",
+        start_date="2000-01-01", end_date="2999-12-31"
+    )
+
+    assert result["total"] == 3
+    assert result["total_pages"] == 2
+    assert len(result["items"]) == 2
+    assert {item["type"] for item in result["items"]} == {"expense"}
+
+
+def test_update_helpers_accept_dynamic_params():
+    user_id = "U-update-test"
+    transaction_id = database.add_transaction(user_id, "expense", 120, "餐飲", "早餐")
+
+    assert database.update_transaction(transaction_id, user_id, amount=150, description="早午餐")
+    updated = database.get_transaction_by_id(transaction_id, user_id)
+    assert updated["amount"] == 150
+    assert updated["description"] == "早午餐"
+
+    habit_id = database.create_habit(user_id, "運動")
+    assert database.update_habit(habit_id, user_id, emoji="🏃")
+    assert database.get_habit_by_id(habit_id, user_id)["emoji"] == "🏃"
+
+    database.checkin_habit(user_id, habit_id, "2026-01-02")
+    assert database.get_habit_checkins(user_id, habit_id, "2026-01-01", "2026-01-31") == ["2026-01-02"]
@@ -0,0 +1,41 @@
+"""能量幣 API 的日期區間與歷史記錄實際查詢 energy_ledger"""
+from fastapi.testclient import TestClient
+
+import database
+import main
+from routers import auth
+
+USER_ID = "U-energy-test"
+
+
+def test_energy_date_range_and_history(monkeypatch):
+    monkeypatch.setattr(
+        auth, "get_session",
+        lambda session_id: {"user_id": USER_ID, "display_name": "測試", "picture_url": None}
+    )
+
+    with TestClient(main.app) as client:
+        client.cookies.set(auth.SESSION_COOKIE_NAME, "session-energy")
+        debt_id = database.add_transaction(USER_ID, "expense", 500, "其他", "還錢給朋友")
+        donation_id = database.add_transaction(USER_ID, "expense", 300, "其他", "捐款")
+        database.add_transaction(USER_ID, "income", 250, "薪資", "打工")
+        database.add_transaction(USER_ID, "expense", 90, "餐飲", "午餐")
+
+        ranged = client.get("/api/energy", params={"start_date": "2000-01-01", "end_date": "2999-12-31"})
+        assert ranged.status_code == 200
+        assert ranged.json() == client.get("/api/energy").json()
+        assert (ranged.json()["gold"], ranged.json()["silver"], ranged.json()["copper"]) == (5, 3, 2)
+
+        empty = client.get("/api/energy", params={"start_date": "1999-01-01", "end_date": "1999-12-31"})
+        assert empty.status_code == 200
+        assert empty.json()["total_coins"] == 0
+
+        history = client.get("/api/energy/history", params={"coin_type": "gold"})
+        assert history.status_code == 200
+        assert [item["id"] for item in history.json()["items"]] == [debt_id]
+
+        everything = client.get("/api/energy/history", params={"limit": 2})
+        assert everything.status_code == 200
+        items = everything.json()["items"]
+        assert len(items) == 2
+        assert donation_id in {item["id"] for item in items}
@@ -0,0 +1,149 @@
+"""匯出 API 實際查詢測試資料庫並讀回產出的檔案"""
+import csv
+import io
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from openpyxl import load_workbook
+
+import database
+import main
+from routers import auth, export
+from services.export_jobs import ExportJobManager
+from services.export_writers import file_range_chunks
+
+USER_ID = "U-export-test"
+ROWS = 5
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(
+        auth, "get_session",
+        lambda session_id: {"user_id": USER_ID, "display_name": "測試", "picture_url": None}
+    )
+    # 每頁 2 筆，5 筆資料會走過 keyset 分頁的第二、三頁
+    monkeypatch.setattr(export, "EXPORT_CHUNK_SIZE", 2)
+    monkeypatch.setattr(export, "EXPORT_COLUMNAR_CHUNK_SIZE", 2)
+
+    with TestClient(main.app, raise_server_exceptions=False) as test_client:
+        test_client.cookies.set(auth.SESSION_COOKIE_NAME, "session-export")
+        if not database.get_transactions(USER_ID, limit=1):
+            for i in range(ROWS):
+                database.add_transaction(USER_ID, "expense", 100 + i, "餐飲", f"午餐 {i}")
+        yield test_client
+
+
+def test_csv_export_round_trip(client):
+    response = client.get("/api/export/csv", headers={"Accept-Encoding": "identity"})
+
+    assert response.status_code == 200
+    rows = list(csv.reader(io.StringIO(response.content.decode("utf-8"))))
+    assert rows[0] == ["日期", "類型", "分類", "金額", "描述"]
+    assert sorted(float(row[3]) for row in rows[1:]) == [100 + i for i in range(ROWS)]
+
+    compressed = client.get("/api/export/csv", headers={"Accept-Encoding": "gzip"})
+    assert compressed.status_code == 200
+    assert compressed.headers["content-encoding"] == "gzip"
+    # TestClient 已依 Content-Encoding 解壓
+    assert compressed.content == response.content
+
+
+def test_csv_export_query_failure_is_an_error(client, monkeypatch):
+    def failing_pages(*args, **kwargs):
+        raise RuntimeError("資料庫連線中斷")
+        yield
+
+    monkeypatch.setattr(export, "iter_transactions_for_export", failing_pages)
+
+    response = client.get("/api/export/csv")
+    assert response.status_code == 500
+    assert not response.headers.get("content-type", "").startswith("text/csv")
+
+
+def test_excel_export_round_trip(client):
+    response = client.get("/api/export/excel")
+
+    assert response.status_code == 200
+    assert response.headers["content-length"] == str(len(response.content))
+    sheet = load_workbook(io.BytesIO(response.content), read_only=True)["記帳明細"]
+    rows = list(sheet.iter_rows(values_only=True))
+    assert list(rows[0]) == ["日期", "類型", "分類", "金額", "描述"]
+    assert sorted(row[3] for row in rows[1:]) == [100 + i for i in range(ROWS)]
+    assert {row[1] for row in rows[1:]} == {"支出"}
+
+
+def test_parquet_export_round_trip(client):
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    response = client.get("/api/export/parquet")
+
+    assert response.status_code == 200
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.column_names == ["created_at", "type", "category", "amount", "description"]
+    assert sorted(table.column("amount").to_pylist()) == [100 + i for i in range(ROWS)]
+    assert set(table.column("type").to_pylist()) == {"expense"}
+
+
+def test_arrow_export_round_trip(client):
+    pa = pytest.importorskip("pyarrow")
+
+    response = client.get("/api/export/arrow")
+
+    assert response.status_code == 200
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.num_rows == ROWS
+    assert sorted(table.column("amount").to_pylist()) == [100 + i for i in range(ROWS)]
+    assert table.column("description").to_pylist()[0].startswith("午餐")
+
+
+def wait_for_job(client, job_id: str) -> dict:
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/export/jobs/{job_id}").json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError("匯出工作逾時")
+
+
+def test_export_job_download_with_range(client):
+    created = client.post("/api/export/jobs", json={"format": "csv"})
+    assert created.status_code == 200
+
+    job = wait_for_job(client, created.json()["id"])
+    assert job["status"] == "done", job["error"]
+    assert job["rows_written"] == job["total_rows"] == ROWS
+
+    full = client.get(f"/api/export/jobs/{job['id']}/download")
+    assert full.status_code == 200
+    assert len(full.content) == job["size"]
+    assert full.content.decode("utf-8").count("\n") == ROWS + 1
+
+    partial = client.get(f"/api/export/jobs/{job['id']}/download", headers={"Range": "bytes=10-"})
+    assert partial.status_code == 206
+    assert partial.content == full.content[10:]
+
+
+def test_artifact_opened_before_eviction_is_still_readable(tmp_path):
+    jobs = ExportJobManager(artifact_dir=str(tmp_path), workers=1, max_artifacts=0)
+    job, _ = jobs.submit(USER_ID, "csv")
+    try:
+        deadline = time.monotonic() + 10
+        while job.finished_at is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert job.status == "done", job.error
+
+        file = jobs.open_artifact(job)
+        with jobs._lock:
+            jobs._evict_locked()
+        assert not os.path.exists(job.path)
+        assert jobs.open_artifact(job) is None
+
+        content = b"".join(file_range_chunks(file, 0, job.size - 1))
+        assert len(content) == job.size
+        assert file.closed
+    finally:
+        jobs.shutdown()
@@ -0,0 +1,130 @@
+"""打卡時增量更新的連續天數與每月計數，必須與 rebuild_habit_counters 全部重算的結果相同"""
+import random
+
+import database
+from line_commands import route_text_message
+
+
+def setup_module():
+    database.init_db()
+
+
+def counters(user_id: str, habit_id: int) -> tuple:
+    with database.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT current_streak, longest_streak, last_checkin_date FROM habits
+            WHERE id = ? AND user_id = ?
+        """, (habit_id, user_id))
+        streaks = cursor.fetchone()
+        cursor.execute("""
+            SELECT month, count FROM habit_monthly_counts
+            WHERE user_id = ? AND habit_id = ?
+            ORDER BY month
+        """, (user_id, habit_id))
+        monthly = cursor.fetchall()
+    return tuple(streaks), [tuple(row) for row in monthly]
+
+
+def assert_matches_rebuild(user_id: str, habit_id: int) -> tuple:
+    incremental = counters(user_id, habit_id)
+    database.rebuild_habit_counters(user_id)
+    assert counters(user_id, habit_id) == incremental
+    return incremental
+
+
+def test_duplicate_checkin_is_ignored():
+    user_id = "U-counter-duplicate"
+    habit_id = database.create_habit(user_id, "喝水")
+
+    assert database.checkin_habit(user_id, habit_id, "2026-03-10")
+    version = database.get_data_version(user_id)
+    assert not database.checkin_habit(user_id, habit_id, "2026-03-10")
+    assert database.get_data_version(user_id) == version
+
+    assert database.get_habit_checkins(user_id, habit_id) == ["2026-03-10"]
+    assert assert_matches_rebuild(user_id, habit_id) == ((1, 1, "2026-03-10"), [("2026-03", 1)])
+
+    stats = database.get_habit_stats(user_id, habit_id, 2026, 3)
+    assert stats["checked_days"] == 1
+
+
+def test_duplicate_checkin_reply():
+    user_id = "U-counter-reply"
+    database.create_habit(user_id, "拉筋")
+
+    assert "打卡成功" in route_text_message(user_id, "拉筋")
+    assert route_text_message(user_id, "拉筋").startswith("今天「拉筋」已經打卡過了")
+    assert "已經打卡過了" in route_text_message(user_id, "打卡 拉筋")
+
+
+def test_out_of_order_backfill_and_uncheck():
+    user_id = "U-counter-sequence"
+    habit_id = database.create_habit(user_id, "跑步")
+
+    steps = [
+        ("check", "2026-01-30"),
+        ("check", "2026-02-02"),
+        ("check", "2026-02-01"),   # 補打，接上最後一段
+        ("check", "2026-01-28"),   # 補打，獨立一天
+        ("check", "2026-01-31"),   # 補打，跨月把兩段接成一段
+        ("check", "2026-01-29"),   # 補打，接成 1/28 ~ 2/2 六天
+        ("uncheck", "2026-01-31"), # 從最長那段中間斷開
+        ("uncheck", "2026-02-02"), # 取消最後一天
+        ("uncheck", "2026-01-28"), # 取消最早一天
+        ("check", "2026-02-05"),
+        ("uncheck", "2026-02-05"),
+        ("uncheck", "2026-02-01"),
+        ("uncheck", "2026-01-29"),
+        ("uncheck", "2026-01-30"),
+    ]
+    expected = {
+        5: ((6, 6, "2026-02-02"), [("2026-01", 4), ("2026-02", 2)]),
+        6: ((2, 3, "2026-02-02"), [("2026-01", 3), ("2026-02", 2)]),
+        8: ((1, 2, "2026-02-01"), [("2026-01", 2), ("2026-02", 1)]),
+        13: ((0, 0, None), []),
+    }
+
+    for index, (action, check_date) in enumerate(steps):
+        if action == "check":
+            assert database.checkin_habit(user_id, habit_id, check_date), check_date
+        else:
+            assert database.uncheckin_habit(user_id, habit_id, check_date), check_date
+
+        state = assert_matches_rebuild(user_id, habit_id)
+        if index in expected:
+            assert state == expected[index], (index, action, check_date)
+
+    assert not database.uncheckin_habit(user_id, habit_id, "2026-01-30")
+
+
+def test_relative_and_dated_backfill_from_line():
+    user_id = "U-counter-line"
+    habit_id = database.create_habit(user_id, "重訓")
+
+    for text in ("前天 重訓", "重訓", "2026/3/1 重訓", "昨天 重訓", "2026/2/28 重訓", "3/1 重訓"):
+        route_text_message(user_id, text)
+        assert_matches_rebuild(user_id, habit_id)
+
+    # 前天、昨天、今天連續三天（2/28、3/1 是另一段，可能在今天之前或之後）
+    assert database.get_habit_streak(user_id, habit_id) == 3
+    assert counters(user_id, habit_id)[0][1] >= 3
+
+
+def test_random_sequence_matches_rebuild():
+    rng = random.Random(18)
+    user_id = "U-counter-random"
+    habit_id = database.create_habit(user_id, "隨機")
+    checked = set()
+
+    for _ in range(120):
+        check_date = f"2026-0{rng.randint(4, 5)}-{rng.randint(1, 30):02d}"
+        if check_date in checked and rng.random() < 0.6:
+            assert database.uncheckin_habit(user_id, habit_id, check_date)
+            checked.discard(check_date)
+        else:
+            assert database.checkin_habit(user_id, habit_id, check_date) == (check_date not in checked)
+            checked.add(check_date)
+        assert_matches_rebuild(user_id, habit_id)
+
+    assert sorted(database.get_habit_checkins(user_id, habit_id)) == sorted(checked)
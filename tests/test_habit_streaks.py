@@ -0,0 +1,51 @@
+"""習慣連續天數：get_habits_with_streaks 由儲存的計數推算目前連續天數"""
+from datetime import date, timedelta
+
+import database
+
+
+def setup_module():
+    database.init_db()
+
+
+def days_ago(n: int) -> str:
+    return (date.today() - timedelta(days=n)).isoformat()
+
+
+def habit_with_checkins(user_id: str, name: str, offsets: list) -> int:
+    habit_id = database.create_habit(user_id, name)
+    for offset in offsets:
+        assert database.checkin_habit(user_id, habit_id, days_ago(offset))
+    return habit_id
+
+
+def test_habits_with_streaks():
+    user_id = "U-streak-list"
+    cases = {
+        # 名稱: (打卡日期距今天數（負數為未來）, 今日已打卡, 目前連續天數)
+        "今天有打": ([2, 1, 0], 1, 3),
+        "只打到昨天": ([3, 2, 1], 0, 3),
+        "中間斷掉": ([3, 2, 0], 1, 1),
+        "很久沒打": ([5, 4, 3], 0, 0),
+        "補打到未來": ([1, 0, -1], 1, 2),
+        "只有未來": ([-2], 0, 0),
+    }
+    ids = {name: habit_with_checkins(user_id, name, offsets) for name, (offsets, _, _) in cases.items()}
+
+    habits = {habit["name"]: habit for habit in database.get_habits_with_streaks(user_id)}
+    assert list(habits) == list(cases)
+
+    for name, (_, checked, streak) in cases.items():
+        assert (habits[name]["checked"], habits[name]["streak"]) == (checked, streak), name
+        assert database.get_habit_streak(user_id, ids[name]) == streak, name
+
+
+def test_streak_continues_until_today_is_checked():
+    user_id = "U-streak-today"
+    habit_id = habit_with_checkins(user_id, "伏地挺身", [2, 1])
+
+    assert database.get_habits_with_streaks(user_id)[0]["streak"] == 2
+
+    database.checkin_habit(user_id, habit_id)
+    habit = database.get_habits_with_streaks(user_id)[0]
+    assert (habit["checked"], habit["streak"]) == (1, 3)
@@ -0,0 +1,44 @@
+"""Aho–Corasick 比對保持舊版巢狀迴圈的優先順序：收入優先、先宣告的分類優先、幣別依規則順序"""
+import pytest
+
+from benchmarks.bench_keyword_matcher import legacy_classify_energy, legacy_determine_category
+from energy_coins import classify_energy
+from keyword_matcher import KeywordMatcher
+from parser import determine_category
+
+
+def test_matcher_reports_groups_in_declared_order():
+    matcher = KeywordMatcher([("a", ["she"]), ("b", ["he", "hers"]), ("c", ["x"])])
+
+    # 重疊的關鍵字（she / he / hers）都要找到，順序依宣告而非出現位置
+    assert matcher.all_matches("ushers") == ["a", "b"]
+    assert matcher.first_match("hers she") == "a"
+    assert matcher.first_match("nothing") is None
+
+
+@pytest.mark.parametrize("text, expected", [
+    # 收入關鍵字勝過支出，不論在文字中的位置
+    ("午餐 收到 100", ("income", "收入")),
+    ("買股票 5000", ("income", "投資")),
+    # 同類型內先宣告的分類勝出，不論在文字中的位置
+    ("買午餐 80", ("expense", "餐飲")),
+    ("加油 順便買飲料", ("expense", "餐飲")),
+    ("收入 打工 300", ("income", "打工")),
+    ("UBER 200", ("expense", "交通")),
+    ("隨便 100", ("expense", "其他")),
+])
+def test_category_priority(text, expected):
+    assert determine_category(text) == expected
+    assert legacy_determine_category(text) == expected
+
+
+@pytest.mark.parametrize("trans_type, description, expected", [
+    ("expense", "捐款 之後 還錢", ["gold", "silver"]),
+    ("expense", "還錢", ["gold"]),
+    ("expense", "慈善捐助", ["silver"]),
+    ("income", "打工 還錢 捐款", ["copper"]),
+    ("expense", "打工", []),
+])
+def test_coin_rule_order(trans_type, description, expected):
+    assert classify_energy(trans_type, "其他", description) == expected
+    assert legacy_classify_energy(trans_type, "其他", description) == expected
@@ -0,0 +1,102 @@
+"""文字訊息指令路由：完全相符／前綴指令、補打卡、習慣名稱打卡與習慣索引快取"""
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+from line_commands import EXACT_COMMANDS, PREFIX_COMMANDS, parse_dated_checkin, route_text_message
+
+
+def setup_module():
+    database.init_db()
+
+
+def checkin_dates(user_id: str, habit_name: str) -> list:
+    habit = database.get_habit_by_name(user_id, habit_name)
+    return database.get_habit_checkins(user_id, habit["id"])
+
+
+@pytest.mark.parametrize("text, heading", [
+    ("使用說明", "📝 語音記帳使用說明"),
+    ("今日收支", "📊 今日收支報告"),
+    ("能量幣", "✨ 能量幣報告"),
+    ("習慣", "📋 習慣追蹤"),
+])
+def test_exact_commands(text, heading):
+    assert route_text_message("U-route-exact", text).startswith(heading)
+
+
+def test_every_exact_command_is_covered():
+    assert set(EXACT_COMMANDS) == {"使用說明", "今日收支", "能量幣", "習慣"}
+    assert [prefix for prefix, _ in PREFIX_COMMANDS] == ["新增習慣", "打卡 "]
+
+
+def test_prefix_commands():
+    user_id = "U-route-prefix"
+
+    assert route_text_message(user_id, "新增習慣").startswith("請輸入習慣名稱")
+    assert route_text_message(user_id, "新增習慣 閱讀").startswith("✅ 習慣建立成功")
+    assert route_text_message(user_id, "新增習慣 閱讀") == "「閱讀」習慣已存在"
+
+    assert "閱讀 打卡成功" in route_text_message(user_id, "打卡 閱讀")
+    assert checkin_dates(user_id, "閱讀") == [datetime.now().strftime("%Y-%m-%d")]
+    assert route_text_message(user_id, "打卡 游泳").startswith("找不到「游泳」習慣")
+
+    # 有習慣後，「習慣」列出今日狀態
+    assert "✅ ✓ 閱讀" in route_text_message(user_id, "習慣")
+
+
+def test_parse_dated_checkin():
+    yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    before_yesterday = (datetime.now() - timedelta(days=2)).strftime("%Y-%m-%d")
+    year = datetime.now().year
+
+    assert parse_dated_checkin("昨天 跑步") == ("跑步", yesterday, "昨天")
+    assert parse_dated_checkin("前天跑步") == ("跑步", before_yesterday, "前天")
+    assert parse_dated_checkin("3/5 跑步") == ("跑步", f"{year}-03-05", "3/5")
+    assert parse_dated_checkin("2025/12/31 跑步") == ("跑步", "2025-12-31", "12/31")
+    assert parse_dated_checkin("2/30 跑步") is None
+    assert parse_dated_checkin("午餐 150") is None
+
+
+def test_dated_backfill_and_checkin_by_name():
+    user_id = "U-route-backfill"
+    database.create_habit(user_id, "跑步")
+
+    assert "補打成功" in route_text_message(user_id, "昨天 跑步")
+    assert "補打成功" in route_text_message(user_id, "2020/1/1 跑步")
+    assert "打卡成功" in route_text_message(user_id, "跑步")
+
+    today = datetime.now()
+    assert checkin_dates(user_id, "跑步") == sorted({
+        today.strftime("%Y-%m-%d"),
+        (today - timedelta(days=1)).strftime("%Y-%m-%d"),
+        "2020-01-01",
+    }, reverse=True)
+
+    # 日期後面不是習慣名稱時當成一般記帳
+    assert route_text_message(user_id, "3/5 午餐 150").startswith("✅ 記帳成功")
+
+
+def test_text_without_habits_is_recorded_as_transaction():
+    reply = route_text_message("U-route-plain", "午餐 150")
+    assert reply.startswith("✅ 記帳成功")
+    assert "金額：$150" in reply
+
+
+def test_habit_index_cache_follows_create_rename_delete():
+    user_id = "U-route-cache"
+
+    # 先讓空的習慣索引進快取
+    assert route_text_message(user_id, "冥想").startswith("📝 記帳小幫手")
+    assert database._habit_index_cache.get(user_id) == {}
+
+    habit_id = database.create_habit(user_id, "冥想")
+    assert "冥想 打卡成功" in route_text_message(user_id, "冥想")
+
+    database.update_habit(habit_id, user_id, name="靜坐")
+    assert "靜坐 補打成功" in route_text_message(user_id, "昨天 靜坐")
+    assert route_text_message(user_id, "冥想").startswith("📝 記帳小幫手")
+
+    database.delete_habit(habit_id, user_id)
+    assert route_text_message(user_id, "靜坐").startswith("📝 記帳小幫手")
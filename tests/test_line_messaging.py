@@ -0,0 +1,68 @@
+"""reply 可能已送達時（5xx、逾時），reply token 失效不改用 push，避免重複訊息"""
+import asyncio
+
+from linebot.v3.messaging import Configuration, TextMessage
+from linebot.v3.messaging.exceptions import ApiException
+
+from services.line_messaging import LineReplySender
+
+
+def api_error(status: int, body: str = "") -> ApiException:
+    error = ApiException(status=status)
+    error.body = body
+    return error
+
+
+INVALID_TOKEN = api_error(400, '{"message":"Invalid reply token"}')
+
+
+class FakeMessagingApi:
+    def __init__(self, reply_errors):
+        self.reply_errors = list(reply_errors)
+        self.replies = 0
+        self.pushes = 0
+
+    async def reply_message(self, request):
+        self.replies += 1
+        if self.reply_errors:
+            raise self.reply_errors.pop(0)
+
+    async def push_message(self, request, x_line_retry_key=None):
+        self.pushes += 1
+
+
+def send(reply_errors) -> tuple:
+    sender = LineReplySender(Configuration(access_token="test"), backoff_base=0)
+    api = sender._api = FakeMessagingApi(reply_errors)
+    asyncio.run(sender._send("reply-token", "U-reply-test", [TextMessage(text="記帳成功")], None))
+    return api, sender.stats()
+
+
+def test_invalid_token_after_server_error_does_not_push():
+    api, stats = send([api_error(502), INVALID_TOKEN])
+
+    assert (api.replies, api.pushes) == (2, 0)
+    assert stats["unconfirmed"] == 1
+    assert stats["push_fallbacks"] == 0
+
+
+def test_invalid_token_after_timeout_does_not_push():
+    api, stats = send([TimeoutError(), INVALID_TOKEN])
+
+    assert api.pushes == 0
+    assert stats["unconfirmed"] == 1
+
+
+def test_invalid_token_after_rate_limit_falls_back_to_push():
+    # 429 表示請求沒有被處理，reply token 仍是第一次使用
+    api, stats = send([api_error(429), INVALID_TOKEN])
+
+    assert (api.replies, api.pushes) == (2, 1)
+    assert stats["push_fallbacks"] == 1
+
+
+def test_server_error_then_success_replies_once():
+    api, stats = send([api_error(500)])
+
+    assert (api.replies, api.pushes) == (2, 0)
+    assert stats["replied"] == 1
@@ -0,0 +1,41 @@
+"""parse_transactions 的批次結果與逐筆呼叫 parse_transaction 完全相同"""
+import pytest
+
+from benchmarks.bench_parse_batch import generate_corpus
+from benchmarks.bench_parser import generate_golden
+from parser import parse_transaction, parse_transactions
+
+EDGE_ROWS = [
+    "",
+    None,
+    " ",
+    "今天吃飯",
+    "午餐",
+    "0",
+    "零元",
+    "1,234,567.89 元 薪水",
+    "花了 100",
+    "兩千五 房租",
+    "一萬零五十 年終",
+    "3C 買 299",
+    "收到紅包 600 然後吃飯 200",
+]
+
+
+def corpus() -> list:
+    return [text for text, _, _ in generate_golden(2000)] + generate_corpus(2000) + EDGE_ROWS
+
+
+def test_corpus_includes_unparseable_rows():
+    assert any(parse_transaction(text) is None for text in corpus())
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_batch_matches_single(workers):
+    texts = corpus()
+    expected = [parse_transaction(text) for text in texts]
+    actual = list(parse_transactions(iter(texts), workers=workers, chunksize=257))
+
+    assert len(actual) == len(expected)
+    for text, want, got in zip(texts, expected, actual):
+        assert got == want, text
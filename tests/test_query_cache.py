@@ -0,0 +1,23 @@
+"""查詢快取與 ETag 使用同一個資料版本"""
+from services.query_cache import QueryCache
+
+
+def test_refresh_version_picks_up_writes_from_other_processes():
+    versions = {"U1": 1}
+    data = {"U1": 100}
+    cache = QueryCache(versions.get, version_ttl=3600)
+
+    @cache.cached
+    def get_total(user_id):
+        return {"total": data[user_id]}
+
+    assert get_total("U1") == {"total": 100}
+
+    # 其他行程寫入：資料版本遞增，但不會呼叫本行程的 invalidate()
+    versions["U1"] = 2
+    data["U1"] = 250
+    assert get_total("U1") == {"total": 100}
+
+    assert cache.refresh_version("U1") == 2
+    assert get_total("U1") == {"total": 250}
+
@@ -0,0 +1,73 @@
+"""Session token 的 HMAC 簽章、到期時間、舊版 cookie 與登出時的快取移除"""
+import time
+
+import database
+from services.session_token import (
+    is_signed_token,
+    session_id_from_token,
+    sign_session,
+    verify_session_token,
+)
+
+
+def setup_module():
+    database.init_db()
+
+
+def test_valid_token_round_trip():
+    expires_at = int(time.time()) + 3600
+    token = verify_session_token(sign_session("sid-1", "U-中文", expires_at))
+
+    assert token.session_id == "sid-1"
+    assert token.user_id == "U-中文"
+    assert token.expires_at == expires_at
+
+
+def test_tampered_token_is_rejected():
+    expires_at = int(time.time()) + 3600
+    token = sign_session("sid-1", "U-token-test", expires_at)
+    session_id, user_part, expires_part, signature = token.split(".")
+
+    # 改簽章
+    flipped = "A" if signature[0] != "A" else "B"
+    assert verify_session_token(f"{session_id}.{user_part}.{expires_part}.{flipped}{signature[1:]}") is None
+    # 改內容但沿用原簽章：延長到期時間、換成其他用戶
+    assert verify_session_token(f"{session_id}.{user_part}.{expires_at + 86400}.{signature}") is None
+    other_user = sign_session("sid-1", "U-other", expires_at).split(".")[1]
+    assert verify_session_token(f"{session_id}.{other_user}.{expires_part}.{signature}") is None
+
+
+def test_expired_token_is_rejected():
+    assert verify_session_token(sign_session("sid-1", "U-token-test", int(time.time()) - 1)) is None
+
+
+def test_legacy_unsigned_cookie_is_looked_up_in_database():
+    token = database.create_session("U-legacy-test", "舊版", None)
+    session_id = session_id_from_token(token)
+    assert not is_signed_token(session_id)
+    assert verify_session_token(session_id) is None
+
+    # 舊版 cookie 只有 session_id：不經簽章驗證，直接以資料庫中的 session 為準
+    database._session_cache.pop(session_id)
+    assert database.get_session(session_id)["user_id"] == "U-legacy-test"
+    assert database.get_session("unknown-session-id") is None
+
+
+def test_signed_token_must_match_database_user():
+    token = database.create_session("U-owner-test", "擁有者", None)
+    session_id, _, expires_part, _ = token.split(".")
+    forged = sign_session(session_id, "U-someone-else", int(expires_part))
+
+    database._session_cache.pop(session_id)
+    assert database.get_session(forged) is None
+    assert database.get_session(token)["user_id"] == "U-owner-test"
+
+
+def test_delete_session_evicts_cache():
+    token = database.create_session("U-logout-test", "登出", None)
+    session_id = session_id_from_token(token)
+    assert database._session_cache.get(session_id) is not None
+
+    assert database.delete_session(token)
+    assert database._session_cache.get(session_id) is None
+    assert database.get_session(token) is None
@@ -0,0 +1,43 @@
+"""統計函式從 daily_user_rollups 讀取，實際查詢測試資料庫並與原始交易比對"""
+from datetime import datetime, timezone
+
+import database
+
+USER_ID = "U-stats-test"
+
+
+def setup_module():
+    database.init_db()
+    database.add_transaction(USER_ID, "expense", 120, "餐飲", "午餐")
+    database.add_transaction(USER_ID, "expense", 80, "餐飲", "早餐")
+    database.add_transaction(USER_ID, "expense", 300, "交通", "計程車")
+    database.add_transaction(USER_ID, "income", 1000, "薪資", None)
+
+
+def test_summary_reads_rollups():
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+    assert database.get_summary(USER_ID, start_date=today, end_date=today) == {
+        "total_income": 1000,
+        "total_expense": 500,
+        "balance": 500,
+        "transaction_count": 4,
+    }
+    assert database.get_summary(USER_ID, start_date="1999-01-01", end_date="1999-12-31")["transaction_count"] == 0
+
+
+def test_category_and_date_stats_read_rollups():
+    expense = database.get_stats_by_category(USER_ID, trans_type="expense", start_date="2000-01-01")
+    assert [(row["category"], row["total"], row["count"]) for row in expense] == [
+        ("交通", 300, 1),
+        ("餐飲", 200, 2),
+    ]
+
+    trends = database.get_stats_by_date(USER_ID, start_date="2000-01-01", end_date="2999-12-31", group_by="month")
+    assert len(trends) == 1
+    assert (trends[0]["income"], trends[0]["expense"]) == (1000, 500)
+
+
+def test_rollups_match_transactions():
+    assert database.verify_daily_rollups(USER_ID) == []
+    assert database.verify_daily_rollups() == []
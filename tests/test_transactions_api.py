@@ -0,0 +1,42 @@
+"""/api/transactions 游標分頁實際查詢測試資料庫，逐頁走完不重複、不遺漏"""
+from fastapi.testclient import TestClient
+
+import database
+import main
+from routers import auth
+
+USER_ID = "U-cursor-test"
+
+
+def test_cursor_pagination_walks_every_row(monkeypatch):
+    monkeypatch.setattr(
+        auth, "get_session",
+        lambda session_id: {"user_id": USER_ID, "display_name": "測試", "picture_url": None}
+    )
+
+    with TestClient(main.app) as client:
+        client.cookies.set(auth.SESSION_COOKIE_NAME, "session-cursor")
+        expected = {database.add_transaction(USER_ID, "expense", 10 * i, "餐飲", None) for i in range(1, 6)}
+
+        first = client.get("/api/transactions", params={
+            "mode": "cursor", "per_page": 2, "include_total": True, "start_date": "2000-01-01"
+        })
+        assert first.status_code == 200
+        body = first.json()
+        assert body["total"] == 5
+        assert body["prev_cursor"] is None
+
+        seen = [item["id"] for item in body["items"]]
+        while body["next_cursor"]:
+            response = client.get("/api/transactions", params={"cursor": body["next_cursor"], "per_page": 2})
+            assert response.status_code == 200
+            body = response.json()
+            seen.extend(item["id"] for item in body["items"])
+
+        assert len(seen) == len(expected)
+        assert set(seen) == expected
+        assert seen == sorted(seen, reverse=True)
+
+        previous = client.get("/api/transactions", params={"cursor": body["prev_cursor"], "per_page": 2})
+        assert previous.status_code == 200
+        assert [item["id"] for item in previous.json()["items"]] == seen[2:4]
@@ -0,0 +1,20 @@
+"""資料庫層讀取失敗時轉文字快取視為未命中，不讓整則語音訊息失敗"""
+import database
+from services.transcription_cache import TranscriptionCache
+
+
+def test_db_read_failure_is_a_miss(monkeypatch):
+    def failing_read(key):
+        raise ConnectionError("資料庫暫時無法連線")
+
+    monkeypatch.setattr(database, "get_cached_transcription", failing_read)
+    cache = TranscriptionCache(memory_size=8)
+
+    assert cache.get("whisper-1:zh:abc", 1000) is None
+    assert cache.stats()["misses"] == 1
+
+    # 記憶體層仍可使用
+    monkeypatch.setattr(database, "save_transcription", lambda *args: 0)
+    cache.set("whisper-1:zh:abc", "午餐 120", 1000)
+    assert cache.get("whisper-1:zh:abc", 1000) == "午餐 120"
+    assert cache.stats()["hits_memory"] == 1
@@ -0,0 +1,28 @@
+"""下載的語音在記憶體時以 bytes 上傳，超過門檻才交出暫存檔"""
+import hashlib
+
+import pytest
+
+import voice_handler
+
+
+def download(size: int) -> voice_handler.DownloadedAudio:
+    buffer = voice_handler._new_audio_buffer()
+    data = b"\x00" * size
+    for start in range(0, size, 100):
+        buffer.write(data[start:start + 100])
+    return voice_handler._finish_download(buffer, size, hashlib.sha256(data))
+
+
+@pytest.mark.parametrize("size, in_memory", [(0, True), (1000, True), (1001, False)])
+def test_upload_content_follows_spool_threshold(monkeypatch, size, in_memory):
+    monkeypatch.setattr(voice_handler, "VOICE_SPOOL_THRESHOLD_BYTES", 1000)
+    audio = download(size)
+
+    content = audio.upload_content()
+    if in_memory:
+        assert content == b"\x00" * size
+    else:
+        assert content is audio.file
+        assert content.read() == b"\x00" * size
+    audio.close()
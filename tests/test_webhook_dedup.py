@@ -0,0 +1,46 @@
+"""語音訊息處理失敗後取消去重登記，LINE 重送的事件可以重新處理"""
+from types import SimpleNamespace
+
+import main
+from services.webhook_dedup import EventDeduplicator
+
+
+def audio_event(message_id: str, is_redelivery: bool = False):
+    return SimpleNamespace(
+        message=SimpleNamespace(id=message_id),
+        source=SimpleNamespace(user_id="U-dedup-test"),
+        delivery_context=SimpleNamespace(is_redelivery=is_redelivery),
+        reply_token="reply-token",
+        timestamp=0,
+    )
+
+
+def test_failed_download_is_released_for_redelivery(monkeypatch):
+    dedup = EventDeduplicator()
+    monkeypatch.setattr(main, "webhook_dedup", dedup)
+
+    replies = []
+    monkeypatch.setattr(main, "send_reply", lambda event, text: replies.append(text))
+
+    downloads = []
+
+    def process_voice_message(message_id):
+        downloads.append(message_id)
+        if len(downloads) == 1:
+            raise ConnectionError("下載逾時")
+        return "午餐 150"
+
+    monkeypatch.setattr(main, "process_voice_message", process_voice_message)
+
+    main.handle_audio_message(audio_event("m-release-1"))
+    assert "處理時發生錯誤" in replies[-1]
+    assert dedup.stats()["released"] == 1
+
+    main.handle_audio_message(audio_event("m-release-1", is_redelivery=True))
+    assert downloads == ["m-release-1", "m-release-1"]
+    assert replies[-1].startswith("記帳成功")
+
+    # 成功處理後的重送仍會被略過
+    main.handle_audio_message(audio_event("m-release-1", is_redelivery=True))
+    assert len(downloads) == 2
+    assert len(replies) == 2
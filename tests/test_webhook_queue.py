@@ -0,0 +1,88 @@
+"""Webhook 有界佇列：佇列滿回 503、簽章錯誤不入列、關閉時排空"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+from config import LINE_CHANNEL_SECRET
+from services.webhook_queue import WebhookQueue
+
+
+def signed(body: str) -> dict:
+    digest = hmac.new(LINE_CHANNEL_SECRET.encode("utf-8"), body.encode("utf-8"), hashlib.sha256).digest()
+    return {"X-Line-Signature": base64.b64encode(digest).decode("ascii"), "Content-Type": "application/json"}
+
+
+BODY = json.dumps({"destination": "U-bot", "events": []})
+
+
+def test_full_queue_returns_503(monkeypatch):
+    queue = WebhookQueue(maxsize=1, workers=1, enqueue_timeout=0.05)
+    monkeypatch.setattr(main, "webhook_queue", queue)
+
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocking_handler(body_text, signature):
+        started.set()
+        release.wait(5)
+
+    monkeypatch.setattr(main, "handle_webhook_body", blocking_handler)
+
+    with TestClient(main.app) as client:
+        try:
+            # 第一個事件佔住唯一的 worker，第二個填滿佇列
+            assert client.post("/webhook", content=BODY, headers=signed(BODY)).status_code == 200
+            assert started.wait(5)
+            assert client.post("/webhook", content=BODY, headers=signed(BODY)).status_code == 200
+
+            response = client.post("/webhook", content=BODY, headers=signed(BODY))
+            assert response.status_code == 503
+            assert queue.stats()["rejected"] == 1
+        finally:
+            release.set()
+
+    assert queue.stats()["processed"] == 2
+
+
+def test_bad_signature_is_rejected_before_enqueue(monkeypatch):
+    queue = WebhookQueue(maxsize=10, workers=1)
+    monkeypatch.setattr(main, "webhook_queue", queue)
+
+    with TestClient(main.app) as client:
+        headers = signed(BODY)
+        tampered = BODY.replace("U-bot", "U-evil")
+
+        assert client.post("/webhook", content=tampered, headers=headers).status_code == 400
+        assert client.post("/webhook", content=BODY, headers={"Content-Type": "application/json"}).status_code == 400
+        assert queue.stats()["enqueued"] == 0
+
+
+def test_drain_finishes_queued_work_and_stops_accepting():
+    done = []
+
+    def slow_job(n):
+        time.sleep(0.02)
+        done.append(n)
+
+    async def scenario():
+        queue = WebhookQueue(maxsize=10, workers=2)
+        queue.start()
+        for n in range(6):
+            assert await queue.submit(slow_job, n)
+
+        await queue.drain(timeout=5)
+        assert not await queue.submit(slow_job, 99)
+        return queue.stats()
+
+    stats = asyncio.run(scenario())
+    assert sorted(done) == list(range(6))
+    assert stats["processed"] == 6
+    assert stats["rejected"] == 1
+    assert stats["accepting"] is False
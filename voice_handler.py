@@ -1,47 +1,208 @@
+import asyncio
+import hashlib
+import threading
+from dataclasses import dataclass
+from tempfile import SpooledTemporaryFile
+from typing import IO, Optional
+
 import httpx
-from openai import OpenAI
-from config import OPENAI_API_KEY, LINE_CHANNEL_ACCESS_TOKEN
+from config import (
+    LINE_CHANNEL_ACCESS_TOKEN,
+    TRANSCRIPTION_CACHE_MEMORY_SIZE,
+    TRANSCRIPTION_CACHE_MAX_ENTRIES,
+    VOICE_SPOOL_THRESHOLD_BYTES,
+    VOICE_HTTP_TIMEOUT_SECONDS,
+    VOICE_HTTP_MAX_CONNECTIONS,
+    STT_LANGUAGE,
+)
+from services.stt import close_backend, get_backend
+from services.transcription_cache import TranscriptionCache
+
+LINE_CONTENT_URL = "https://api-data.line.me/v2/bot/message/{message_id}/content"
+
+# 相同音檔（轉傳、重試）不重複呼叫語音辨識
+transcription_cache = TranscriptionCache(
+    memory_size=TRANSCRIPTION_CACHE_MEMORY_SIZE,
+    max_entries=TRANSCRIPTION_CACHE_MAX_ENTRIES,
+)
+
+# 共用的 HTTP client（保留連線，避免每則語音都重新 TLS 握手）
+_clients_lock = threading.Lock()
+_http_client: Optional[httpx.Client] = None
+_async_http_client: Optional[httpx.AsyncClient] = None
+
+
+@dataclass
+class DownloadedAudio:
+    """下載的語音：小檔案留在記憶體，超過門檻才寫到暫存檔"""
+    file: IO[bytes]
+    size: int
+    digest: str
+
+    def upload_content(self):
+        """
+        上傳用的內容：還在記憶體時回傳 bytes，已寫到暫存檔時才回傳檔案物件
+        （httpx 會對檔案物件呼叫 fileno() 取得長度，SpooledTemporaryFile 因此被寫到磁碟）
+        是否還在記憶體由下載的大小判斷，不讀取 SpooledTemporaryFile 的內部狀態
+        """
+        self.file.seek(0)
+        if _fits_in_spool(self.size):
+            return self.file.read()
+        return self.file
+
+    def close(self):
+        self.file.close()
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=VOICE_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=VOICE_HTTP_MAX_CONNECTIONS,
+    )
 
 
-def download_audio_from_line(message_id: str) -> bytes:
-    """從 LINE 下載語音檔案"""
-    url = f"https://api-data.line.me/v2/bot/message/{message_id}/content"
-    headers = {
-        "Authorization": f"Bearer {LINE_CHANNEL_ACCESS_TOKEN}"
-    }
+def get_http_client() -> httpx.Client:
+    """取得共用的 LINE 內容下載 client"""
+    global _http_client
+    if _http_client is None:
+        with _clients_lock:
+            if _http_client is None:
+                _http_client = httpx.Client(
+                    headers={"Authorization": f"Bearer {LINE_CHANNEL_ACCESS_TOKEN}"},
+                    timeout=VOICE_HTTP_TIMEOUT_SECONDS,
+                    limits=_http_limits(),
+                )
+    return _http_client
 
-    with httpx.Client() as client:
-        response = client.get(url, headers=headers)
-        response.raise_for_status()
-        return response.content
 
+def get_async_http_client() -> httpx.AsyncClient:
+    """取得共用的非同步 LINE 內容下載 client"""
+    global _async_http_client
+    if _async_http_client is None:
+        _async_http_client = httpx.AsyncClient(
+            headers={"Authorization": f"Bearer {LINE_CHANNEL_ACCESS_TOKEN}"},
+            timeout=VOICE_HTTP_TIMEOUT_SECONDS,
+            limits=_http_limits(),
+        )
+    return _async_http_client
 
-def transcribe_audio(audio_content: bytes) -> str:
-    """使用 Whisper API 將語音轉成文字"""
-    client = OpenAI(api_key=OPENAI_API_KEY)
 
-    # 將 bytes 寫入臨時檔案
-    import tempfile
-    import os
+def _fits_in_spool(size: int) -> bool:
+    """SpooledTemporaryFile 只在內容超過 max_size 時寫到磁碟（max_size 為 0 時永遠留在記憶體）"""
+    return not VOICE_SPOOL_THRESHOLD_BYTES or size <= VOICE_SPOOL_THRESHOLD_BYTES
 
-    with tempfile.NamedTemporaryFile(suffix=".m4a", delete=False) as temp_file:
-        temp_file.write(audio_content)
-        temp_path = temp_file.name
+
+def _new_audio_buffer() -> SpooledTemporaryFile:
+    return SpooledTemporaryFile(max_size=VOICE_SPOOL_THRESHOLD_BYTES)
+
+
+def _finish_download(buffer: SpooledTemporaryFile, size: int, digest) -> DownloadedAudio:
+    buffer.seek(0)
+    return DownloadedAudio(file=buffer, size=size, digest=digest.hexdigest())
+
+
+def download_audio_from_line(message_id: str) -> DownloadedAudio:
+    """從 LINE 串流下載語音檔案，邊下載邊計算雜湊"""
+    url = LINE_CONTENT_URL.format(message_id=message_id)
+    buffer = _new_audio_buffer()
+    digest = hashlib.sha256()
+    size = 0
 
     try:
-        with open(temp_path, "rb") as audio_file:
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                language="zh"
-            )
-        return transcript.text
-    finally:
-        os.unlink(temp_path)
+        with get_http_client().stream("GET", url) as response:
+            response.raise_for_status()
+            for chunk in response.iter_bytes():
+                buffer.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+    except Exception:
+        buffer.close()
+        raise
+
+    return _finish_download(buffer, size, digest)
+
+
+async def download_audio_from_line_async(message_id: str) -> DownloadedAudio:
+    """download_audio_from_line 的非同步版本"""
+    url = LINE_CONTENT_URL.format(message_id=message_id)
+    buffer = _new_audio_buffer()
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        async with get_async_http_client().stream("GET", url) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                buffer.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+    except Exception:
+        buffer.close()
+        raise
+
+    return _finish_download(buffer, size, digest)
+
+
+def transcribe_audio(audio_content) -> str:
+    """
+    使用設定的語音辨識後端將語音轉成文字
+    audio_content 可以是 bytes 或已開啟的檔案物件，直接上傳不經過磁碟
+    """
+    return get_backend().transcribe(audio_content, STT_LANGUAGE)
+
+
+async def transcribe_audio_async(audio_content) -> str:
+    """transcribe_audio 的非同步版本"""
+    return await get_backend().transcribe_async(audio_content, STT_LANGUAGE)
 
 
 def process_voice_message(message_id: str) -> str:
     """處理語音訊息：下載並轉換成文字"""
-    audio_content = download_audio_from_line(message_id)
-    text = transcribe_audio(audio_content)
-    return text
+    audio = download_audio_from_line(message_id)
+    try:
+        backend = get_backend()
+        cache_key = TranscriptionCache.make_key(audio.digest, backend.model, STT_LANGUAGE)
+        text = transcription_cache.get(cache_key, audio.size)
+        if text is not None:
+            return text
+
+        text, model = backend.transcribe_with_model(audio.upload_content(), STT_LANGUAGE)
+        # 備援後端產生的文字不以主要模型的鍵快取，下次仍由主要模型辨識
+        if model == backend.model:
+            transcription_cache.set(cache_key, text, audio.size)
+        return text
+    finally:
+        audio.close()
+
+
+async def process_voice_message_async(message_id: str) -> str:
+    """process_voice_message 的非同步版本（快取查詢在 thread 中執行）"""
+    audio = await download_audio_from_line_async(message_id)
+    try:
+        backend = get_backend()
+        cache_key = TranscriptionCache.make_key(audio.digest, backend.model, STT_LANGUAGE)
+        text = await asyncio.to_thread(transcription_cache.get, cache_key, audio.size)
+        if text is not None:
+            return text
+
+        text, model = await backend.transcribe_with_model_async(audio.upload_content(), STT_LANGUAGE)
+        if model == backend.model:
+            await asyncio.to_thread(transcription_cache.set, cache_key, text, audio.size)
+        return text
+    finally:
+        audio.close()
+
+
+async def close_clients():
+    """關閉共用的 client 與語音辨識後端（應用程式關閉時呼叫）"""
+    global _http_client, _async_http_client
+
+    with _clients_lock:
+        http_client, _http_client = _http_client, None
+    async_http_client, _async_http_client = _async_http_client, None
+
+    if http_client is not None:
+        http_client.close()
+    if async_http_client is not None:
+        await async_http_client.aclose()
+    await close_backend()